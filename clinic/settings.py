@@ -67,6 +67,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'main_app.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -110,12 +111,26 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "idempotency-key",
+    "upload-offset",
+    "chunk-sha256",
+    "range",
+    "if-range",
 ]
+CORS_EXPOSE_HEADERS = ["content-range", "content-disposition", "accept-ranges"]
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=120),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
 }
 
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "clinic@localhost")
+
+REMINDER_WINDOW = timedelta(hours=24)
+REMINDER_BATCH_SIZE = 500
+REMINDER_SMS_BACKEND = os.environ.get("REMINDER_SMS_BACKEND", "main_app.reminders.ConsoleSmsBackend")
+REMINDER_SMS_FILE_PATH = BASE_DIR / "sms_outbox.jsonl"
+
 
 
 WSGI_APPLICATION = "clinic.wsgi.application"
@@ -125,10 +140,31 @@ WSGI_APPLICATION = "clinic.wsgi.application"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 DATABASES = {
-    "default": dj_database_url.config(conn_max_age=600, ssl_require=True)
+    "default": dj_database_url.config(conn_max_age=600, conn_health_checks=True, ssl_require=True)
 }
 
 
+# Cache
+# Shared by every gunicorn worker, so invalidating a schedule or an analytics
+# month in one worker is seen by all. Redis when REDIS_URL is set, otherwise
+# a table in the database (created by ``manage.py createcachetable``).
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -153,9 +189,59 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'main_app.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'main_app.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_FILTER_BACKENDS': (
+        'main_app.tenancy.TenantFilterBackend',
+    ),
 }
 
+REPORT_SNAPSHOT_INTERVAL = 50
+
+AUDIT_ENABLED = True
+AUDIT_FLUSH_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 2.0
+AUDIT_MAX_BUFFER = 50000
+
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Similarity (0-1) from which a new patient is reported as a likely duplicate.
+PATIENT_DUPLICATE_THRESHOLD = 0.85
+
+# Above this many rows (per PostgreSQL's statistics) unfiltered admin lists show an estimated count.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Dyno disks are wiped on restart and not shared, so there is no default: uploads
+# are refused until a durable store reachable from every dyno is configured.
+# LocalAttachmentStorage is for development and tests.
+ATTACHMENT_STORAGE_BACKEND = os.environ.get("ATTACHMENT_STORAGE_BACKEND", "")
+ATTACHMENT_ROOT = os.environ.get("ATTACHMENT_ROOT", BASE_DIR / "attachments")
+ATTACHMENT_CHUNK_SIZE = 8 * 1024 * 1024
+ATTACHMENT_MAX_SIZE = 1024 * 1024 * 1024
+
+# Analytics counts per month: months that ended more than ANALYTICS_SETTLE_DAYS ago are cached longer.
+ANALYTICS_SETTLE_DAYS = 7
+ANALYTICS_CACHE_TIMEOUT = 24 * 60 * 60
+ANALYTICS_RECENT_TIMEOUT = 5 * 60
+ANALYTICS_ROLLING_DAYS = 28
+ANALYTICS_MAX_MONTHS = 60
+
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+
+# Levels picked with `python manage.py benchmark rendering`.
+API_COMPRESSION_MIN_SIZE = 1024
+API_GZIP_LEVEL = 5
+API_BROTLI_QUALITY = 3
+
 
 
 # Internationalization
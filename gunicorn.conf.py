@@ -0,0 +1,22 @@
+# Import the app once in the master so workers fork with Django already loaded,
+# then warm each worker up before it accepts traffic.
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # Connections opened while preloading must not be shared with the children.
+    from django.db import connections
+
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    from main_app.warmup import warm_up
+
+    warm_up()
+
+
+def worker_exit(server, worker):
+    from main_app.audit import flush
+
+    flush()
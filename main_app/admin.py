@@ -1,35 +1,174 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Patient, Appointment, Report
-from .forms import CustomUserCreationForm, CustomUserChangeForm
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from .models import Clinic, User, Patient, Appointment, Report, Room, WaitlistEntry, WorkingHours, ScheduleException
+from .forms import CustomUserCreationForm, CustomUserChangeForm, PatientAdminForm, ReportAdminForm
+from .report_history import record_version
 
 
-class CustomUserAdmin(UserAdmin):
+class EstimatedCountPaginator(Paginator):
+    """
+    Unfiltered changelists of big PostgreSQL tables take their row count from
+    the planner statistics instead of a full ``COUNT(*)``. Filtered and
+    searched lists, and small tables, are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class FixedTenantMixin:
+    """The clinic is chosen when a row is added; moving it later would leave its related rows behind."""
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly = super().get_readonly_fields(request, obj)
+        return (*readonly, "tenant") if obj is not None else readonly
+
+
+class ClinicalAdmin(admin.ModelAdmin):
+    """Changelists that run a fixed number of queries however big the table is."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class TenantAdmin(FixedTenantMixin, ClinicalAdmin):
+    """``ClinicalAdmin`` for tables with their own clinic column."""
+
+
+class CustomUserAdmin(FixedTenantMixin, UserAdmin):
     add_form = CustomUserCreationForm
     form = CustomUserChangeForm
     model = User
 
-    list_display = ("email", "first_name", "last_name", "role", "is_active", "is_staff")
-    list_filter = ("role", "is_staff", "is_active")
+    list_display = ("email", "first_name", "last_name", "role", "tenant", "is_active", "is_staff")
+    list_filter = ("tenant", "role", "is_staff", "is_active")
 
     fieldsets = (
         (None, {"fields": ("email", "password")}),
-        ("Personal info", {"fields": ("first_name", "last_name", "role", "specialization")}),
+        ("Personal info", {"fields": ("tenant", "first_name", "last_name", "role", "specialization")}),
         ("Permissions", {"fields": ("is_staff", "is_active", "is_superuser", "groups", "user_permissions")}),
     )
 
     add_fieldsets = (
         (None, {
             "classes": ("wide",),
-            "fields": ("email", "first_name", "last_name", "role", "password1", "password2", "is_staff", "is_active")}
+            "fields": (
+                "email", "tenant", "first_name", "last_name", "role", "password1", "password2", "is_staff", "is_active",
+            )}
         ),
     )
 
-    search_fields = ("email", "first_name", "last_name", "role")
+    # Prefix and exact matches only, so PostgreSQL can use the indexes from migration 0022.
+    search_fields = ("^email", "^first_name", "^last_name", "=role")
     ordering = ("email",)
 
 
+class PatientAdmin(TenantAdmin):
+    form = PatientAdminForm
+    list_display = ("last_name", "first_name", "date_of_birth", "phone", "doctor", "created_at")
+    list_select_related = ("doctor",)
+    list_filter = ("tenant", "gender")
+    # Prefix and exact matches only, so PostgreSQL can use the indexes from migration 0015.
+    search_fields = ("^last_name", "^first_name", "=phone", "=email")
+    autocomplete_fields = ("doctor",)
+    readonly_fields = ("medical_history_length", "created_at")
+
+
+class AppointmentAdmin(TenantAdmin):
+    list_display = ("__str__", "doctor", "nurse", "room", "status")
+    list_select_related = ("patient", "doctor", "nurse", "room")
+    list_filter = ("tenant", "status")
+    search_fields = ("^patient__last_name", "^patient__first_name", "=patient__phone")
+    autocomplete_fields = ("patient", "doctor", "nurse", "room")
+    date_hierarchy = "date_time"
+    ordering = ("-date_time",)
+    readonly_fields = ("reminder_sent_at", "created_at")
+
+
+class ReportAdmin(TenantAdmin):
+    form = ReportAdminForm
+    list_display = ("__str__", "doctor", "status", "version", "diagnosis_preview")
+    list_select_related = ("patient", "doctor")
+    list_filter = ("tenant", "status")
+    search_fields = ("^patient__last_name", "^patient__first_name")
+    autocomplete_fields = ("patient", "doctor", "nurse", "appointment")
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+    readonly_fields = ("status", "version", "finalized_at", "created_at")
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly = super().get_readonly_fields(request, obj)
+        if obj is not None and obj.status == Report.Status.FINAL:
+            return (*readonly, "diagnosis")
+        return readonly
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change or "diagnosis" in form.changed_data:
+            record_version(obj, form.initial.get("diagnosis"), author=request.user)
+
+
+class WaitlistEntryAdmin(ClinicalAdmin):
+    list_display = ("__str__", "status", "auto_book", "offered_date_time", "created_at")
+    list_select_related = ("patient", "doctor")
+    list_filter = ("patient__tenant", "status")
+    search_fields = ("^patient__last_name", "^patient__first_name", "=patient__phone")
+    autocomplete_fields = ("patient", "doctor", "offered_doctor", "offered_nurse", "appointment")
+    ordering = ("-created_at",)
+
+
+class WorkingHoursAdmin(ClinicalAdmin):
+    list_display = ("__str__", "slot_minutes")
+    list_select_related = ("doctor",)
+    list_filter = ("doctor__tenant", "weekday")
+    search_fields = ("^doctor__last_name", "^doctor__first_name")
+    autocomplete_fields = ("doctor",)
+
+
+class ScheduleExceptionAdmin(ClinicalAdmin):
+    list_display = ("__str__", "start_time", "end_time", "reason")
+    list_select_related = ("doctor",)
+    list_filter = ("doctor__tenant",)
+    search_fields = ("^doctor__last_name", "^doctor__first_name")
+    autocomplete_fields = ("doctor",)
+    date_hierarchy = "date"
+    ordering = ("-date",)
+
+
+class RoomAdmin(admin.ModelAdmin):
+    list_display = ("name", "tenant")
+    list_filter = ("tenant",)
+    search_fields = ("name",)
+
+
+class ClinicAdmin(admin.ModelAdmin):
+    list_display = ("name", "slug", "created_at")
+    search_fields = ("name", "slug")
+    prepopulated_fields = {"slug": ("name",)}
+
+
+admin.site.register(Clinic, ClinicAdmin)
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(Patient)
-admin.site.register(Appointment)
-admin.site.register(Report)
+admin.site.register(Patient, PatientAdmin)
+admin.site.register(Appointment, AppointmentAdmin)
+admin.site.register(Report, ReportAdmin)
+admin.site.register(Room, RoomAdmin)
+admin.site.register(WaitlistEntry, WaitlistEntryAdmin)
+admin.site.register(WorkingHours, WorkingHoursAdmin)
+admin.site.register(ScheduleException, ScheduleExceptionAdmin)
@@ -0,0 +1,347 @@
+"""
+Appointment analytics.
+
+Utilization per doctor, booking heatmaps by weekday and hour, and
+cancellation and no-show rates with rolling trends. Appointments are read
+with one streaming ``values_list`` query of three integer columns (doctor,
+start time in epoch seconds, status code). Local month, day, weekday and
+hour are derived with NumPy and everything is counted CHUNK_SIZE rows at a
+time with ``numpy.bincount``, so memory stays flat however long the history
+is.
+
+Counts are cached per clinic and calendar month and a request only queries the months
+missing from the cache. Months that ended more than ANALYTICS_SETTLE_DAYS
+ago are kept for ANALYTICS_CACHE_TIMEOUT, later ones, whose appointments can
+still be completed, cancelled or missed, for ANALYTICS_RECENT_TIMEOUT.
+Saving or deleting an appointment drops its month, and the month it moved
+out of (see ``signals.py``);
+bulk ``update()`` calls are picked up when the entry expires.
+
+An appointment still ``scheduled`` after its start time counts as a no-show.
+NumPy is optional; without it ``available()`` is false.
+"""
+import calendar
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BigIntegerField, Case, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import User, Appointment
+from .scheduling import day_slots, get_schedules
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CACHE_KEY = "analytics:{}:month:{}-{:02d}"
+CHUNK_SIZE = 50000
+
+STATUSES = ("completed", "cancelled", "no_show", "scheduled")
+COMPLETED, CANCELLED, NO_SHOW, SCHEDULED = range(len(STATUSES))
+# Completed, missed and upcoming appointments all hold a slot.
+BOOKED = [COMPLETED, NO_SHOW, SCHEDULED]
+HOURS = 24
+CELLS = len(STATUSES) * 7 * HOURS
+DAY_CELLS = 31 * len(STATUSES)
+
+
+def available():
+    return np is not None
+
+
+def month_index(month):
+    return month[0] * 12 + month[1] - 1
+
+
+def month_range(first, last):
+    """``(year, month)`` pairs from ``first`` to ``last``, both included."""
+    return [
+        (index // 12, index % 12 + 1)
+        for index in range(month_index(first), month_index(last) + 1)
+    ]
+
+
+def month_start(month):
+    return timezone.make_aware(datetime(month[0], month[1], 1))
+
+
+def month_end(month):
+    year, index = divmod(month_index(month) + 1, 12)
+    return month_start((year, index + 1))
+
+
+def last_day(month):
+    return date(month[0], month[1], calendar.monthrange(*month)[1])
+
+
+class Epoch(Func):
+    """Whole seconds since 1970-01-01 UTC of a datetime."""
+    template = "CAST(FLOOR(EXTRACT(EPOCH FROM %(expressions)s)) AS bigint)"
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS integer)")
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(FLOOR(UNIX_TIMESTAMP(%(expressions)s)) AS SIGNED)")
+
+
+def status_code(now):
+    return Case(
+        When(status=Appointment.Status.COMPLETED, then=Value(COMPLETED)),
+        When(status=Appointment.Status.CANCELLED, then=Value(CANCELLED)),
+        When(date_time__lt=now, then=Value(NO_SHOW)),
+        default=Value(SCHEDULED),
+        output_field=IntegerField(),
+    )
+
+
+def columns(tenant, months, now):
+    """
+    ``(doctor_id, epoch seconds, status)`` rows of the clinic's appointments
+    in ``months``, all integers, streamed from one query over the
+    ``(tenant, date_time)`` index.
+    """
+    ranges = Q()
+    for month in months:
+        ranges |= Q(date_time__gte=month_start(month), date_time__lt=month_end(month))
+    return (
+        Appointment.objects.filter(ranges, tenant=tenant)
+        .annotate(doctor_key=Coalesce("doctor_id", 0), epoch=Epoch("date_time"), code=status_code(now))
+        .values_list("doctor_key", "epoch", "code")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def hour_offsets(start, end):
+    """UTC offset in seconds of the current time zone for every hour from ``start`` to ``end``."""
+    zone = timezone.get_current_timezone()
+    hours = range(int(start.timestamp()) // 3600, int(end.timestamp()) // 3600 + 1)
+    return np.array(
+        [datetime.fromtimestamp(hour * 3600, zone).utcoffset().total_seconds() for hour in hours],
+        dtype=np.int64,
+    )
+
+
+def local_fields(epoch, offsets, first_hour):
+    """Local ``(months since year 0, day of month - 1, weekday, hour)`` of UTC ``epoch`` seconds."""
+    local = epoch + offsets[epoch // 3600 - first_hour]
+    days = (local // 86400).astype("datetime64[D]")
+    months = days.astype("datetime64[M]")
+    return (
+        months.astype(np.int64) + 1970 * 12,
+        (days - months.astype("datetime64[D]")).astype(np.int64),
+        (days.astype(np.int64) + 3) % 7,
+        local % 86400 // 3600,
+    )
+
+
+def count_months(tenant, months, now=None):
+    """
+    ``{month: counts}`` for each of ``months``, from a single query. ``counts``
+    holds a ``heatmap`` (status, weekday, hour), ``daily`` (day, status) and
+    ``doctors``, a pair of doctor ids and their (status,) counts.
+    """
+    now = now or timezone.now()
+    first = month_index(months[0])
+    span = month_index(months[-1]) - first + 1
+    start, end = month_start(months[0]), month_end(months[-1])
+    offsets = hour_offsets(start, end)
+    first_hour = int(start.timestamp()) // 3600
+    heatmap = np.zeros((span, CELLS), dtype=np.int64)
+    daily = np.zeros((span, DAY_CELLS), dtype=np.int64)
+    doctors = {}
+
+    rows = columns(tenant, months, now)
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        data = np.array(chunk, dtype=np.int64)
+        month, day, weekday, hour = local_fields(data[:, 1], offsets, first_hour)
+        month -= first
+        code = data[:, 2]
+        heatmap += np.bincount(
+            month * CELLS + (code * 7 + weekday) * HOURS + hour,
+            minlength=span * CELLS,
+        ).reshape(span, CELLS)
+        daily += np.bincount(
+            month * DAY_CELLS + day * len(STATUSES) + code,
+            minlength=span * DAY_CELLS,
+        ).reshape(span, DAY_CELLS)
+
+        ids, inverse = np.unique(data[:, 0], return_inverse=True)
+        per_doctor = np.bincount(
+            (inverse * span + month) * len(STATUSES) + code,
+            minlength=len(ids) * span * len(STATUSES),
+        ).reshape(len(ids), span, len(STATUSES))
+        for doctor_id, counts in zip(ids.tolist(), per_doctor):
+            doctors[doctor_id] = doctors[doctor_id] + counts if doctor_id in doctors else counts
+
+    ids = np.array(sorted(doctors), dtype=np.int64)
+    per_doctor = np.array([doctors[doctor_id] for doctor_id in ids.tolist()], dtype=np.int64)
+    result = {}
+    for month in months:
+        i = month_index(month) - first
+        days = calendar.monthrange(*month)[1]
+        if len(ids):
+            keep = per_doctor[:, i].any(axis=1)
+            month_doctors = (ids[keep], per_doctor[keep, i])
+        else:
+            month_doctors = (ids, np.zeros((0, len(STATUSES)), dtype=np.int64))
+        result[month] = {
+            "heatmap": heatmap[i].reshape(len(STATUSES), 7, HOURS),
+            "daily": daily[i].reshape(31, len(STATUSES))[:days],
+            "doctors": month_doctors,
+        }
+    return result
+
+
+def settled(month, today):
+    return last_day(month) < today - timedelta(days=settings.ANALYTICS_SETTLE_DAYS)
+
+
+def monthly_counts(tenant, months, now=None):
+    """Counts per month, from the cache where possible (see the module docstring)."""
+    now = now or timezone.now()
+    keys = {CACHE_KEY.format(tenant, *month): month for month in months}
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+    missing = [month for month in months if month not in found]
+    if missing:
+        computed = count_months(tenant, missing, now)
+        today = timezone.localdate(now)
+        for timeout, is_settled in (
+            (settings.ANALYTICS_CACHE_TIMEOUT, True),
+            (settings.ANALYTICS_RECENT_TIMEOUT, False),
+        ):
+            cache.set_many(
+                {
+                    CACHE_KEY.format(tenant, *month): counts for month, counts in computed.items()
+                    if settled(month, today) == is_settled
+                },
+                timeout,
+            )
+        found.update(computed)
+    return [found[month] for month in months]
+
+
+def invalidate(tenant, date_time):
+    local = timezone.localtime(date_time)
+    cache.delete(CACHE_KEY.format(tenant, local.year, local.month))
+
+
+def capacity(doctor_ids, start, end):
+    """Bookable slots per doctor between two dates, from their current schedules."""
+    days = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    # 1970-01-01, day zero, was a Thursday (weekday 3).
+    weekdays = np.bincount((days.astype(np.int64) + 3) % 7, minlength=7)
+
+    slots = {}
+    for doctor_id, schedule in get_schedules(doctor_ids).items():
+        per_weekday = np.array([len(schedule["weekdays"].get(weekday, ())) for weekday in range(7)])
+        total = int(per_weekday @ weekdays)
+        for day in schedule["exceptions"]:
+            if start <= day <= end:
+                total += len(day_slots(schedule, day)) - int(per_weekday[day.weekday()])
+        slots[doctor_id] = total
+    return slots
+
+
+def ratio(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def to_json(values):
+    """Rounded nested lists with ``None`` where a rate is undefined."""
+    values = np.round(values, 4)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def rates(counts):
+    """Cancellation and no-show rates along the last axis of ``counts``."""
+    return {
+        "cancellation_rate": ratio(counts[..., CANCELLED], counts.sum(axis=-1)),
+        "no_show_rate": ratio(counts[..., NO_SHOW], counts[..., NO_SHOW] + counts[..., COMPLETED]),
+    }
+
+
+def rolling(daily, window):
+    """Sums over the last ``window`` days (fewer at the start) for each day."""
+    totals = np.vstack([np.zeros((1, daily.shape[1]), dtype=np.int64), np.cumsum(daily, axis=0)])
+    ends = np.arange(1, len(daily) + 1)
+    return totals[ends] - totals[np.maximum(ends - window, 0)]
+
+
+def summary(tenant, first, last, now=None):
+    """Utilization, heatmaps and trends of one clinic for the months ``first`` to ``last``."""
+    months = month_range(first, last)
+    counts = monthly_counts(tenant, months, now)
+
+    heatmap = np.sum([month["heatmap"] for month in counts], axis=0)
+    daily = np.concatenate([month["daily"] for month in counts])
+    totals = heatmap.sum(axis=(1, 2))
+
+    per_doctor = {}
+    for month in counts:
+        for doctor_id, row in zip(*month["doctors"]):
+            per_doctor[int(doctor_id)] = per_doctor.get(int(doctor_id), 0) + row
+    per_doctor.pop(0, None)
+    doctors = User.objects.filter(tenant=tenant, role="DOCTOR").values_list("id", flat=True)
+    doctor_ids = sorted(set(per_doctor) | set(doctors))
+    doctor_counts = np.array(
+        [per_doctor.get(doctor_id, np.zeros(len(STATUSES), dtype=np.int64)) for doctor_id in doctor_ids],
+        dtype=np.int64,
+    ).reshape(len(doctor_ids), len(STATUSES))
+    slots = capacity(doctor_ids, date(*first, 1), last_day(last))
+    doctor_slots = np.array([slots[doctor_id] for doctor_id in doctor_ids], dtype=float)
+    booked = doctor_counts[:, BOOKED].sum(axis=1)
+    utilization = ratio(booked, doctor_slots)
+    doctor_rates = rates(doctor_counts)
+
+    window = settings.ANALYTICS_ROLLING_DAYS
+    daily_rates = rates(daily)
+    trend_rates = rates(rolling(daily, window))
+    start = date(*first, 1)
+
+    return {
+        "from": f"{first[0]}-{first[1]:02d}",
+        "to": f"{last[0]}-{last[1]:02d}",
+        "totals": {
+            **dict(zip(STATUSES, totals.tolist())),
+            "appointments": int(totals.sum()),
+            **{name: to_json(value) for name, value in rates(totals).items()},
+        },
+        "doctors": [
+            {
+                "doctor": doctor_id,
+                "slots": int(doctor_slots[i]),
+                "booked": int(booked[i]),
+                "utilization": to_json(utilization[i]),
+                **dict(zip(STATUSES, doctor_counts[i].tolist())),
+                **{name: to_json(value[i]) for name, value in doctor_rates.items()},
+            }
+            for i, doctor_id in enumerate(doctor_ids)
+        ],
+        "heatmap": {
+            "booked": heatmap[BOOKED].sum(axis=0).tolist(),
+            "cancelled": heatmap[CANCELLED].tolist(),
+            "no_show_rate": to_json(rates(np.moveaxis(heatmap, 0, -1))["no_show_rate"]),
+        },
+        "trend": {
+            "window": window,
+            "dates": [(start + timedelta(days=i)).isoformat() for i in range(len(daily))],
+            "appointments": daily.sum(axis=1).tolist(),
+            **{name: to_json(value) for name, value in daily_rates.items()},
+            **{f"rolling_{name}": to_json(value) for name, value in trend_rates.items()},
+        },
+    }
@@ -0,0 +1,269 @@
+"""
+Report and patient attachments.
+
+Uploads are resumable: the client creates an ``Attachment`` with the total
+size, then PUTs the content in chunks of at most ATTACHMENT_CHUNK_SIZE
+bytes, each with its ``Upload-Offset`` and ``Chunk-SHA256``. A chunk is
+streamed to a part file of its own and hashed on the way, so memory use does
+not depend on the chunk or file size. Only a chunk whose checksum matches is
+copied into the file; after a dropped connection the client reads
+``received`` from the attachment and carries on from there.
+
+Bytes go through ATTACHMENT_STORAGE_BACKEND; while it is unset, uploads
+are refused. Downloads honour single
+``Range`` requests and are returned as ``FileResponse`` over the stored
+file positioned at the range start, so gunicorn hands them to
+``os.sendfile`` without copying the data through Python.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Attachment
+
+OFFSET_HEADER = "Upload-Offset"
+CHECKSUM_HEADER = "Chunk-SHA256"
+BLOCK_SIZE = 64 * 1024
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UploadError(Exception):
+    def __init__(self, received):
+        super().__init__(received)
+        self.received = received
+
+
+class OffsetMismatch(UploadError):
+    pass
+
+
+class ChecksumMismatch(UploadError):
+    pass
+
+
+class BaseAttachmentStorage:
+    def write(self, key, offset, blocks):
+        """
+        Write ``blocks`` at ``offset`` and cut the stored file off after them.
+        Returns the number of bytes written.
+        """
+        raise NotImplementedError("Subclasses must implement write().")
+
+    def truncate(self, key, size):
+        raise NotImplementedError("Subclasses must implement truncate().")
+
+    def open(self, key):
+        """A binary file object for reading; a real file where possible, for sendfile."""
+        raise NotImplementedError("Subclasses must implement open().")
+
+    def delete(self, key):
+        raise NotImplementedError("Subclasses must implement delete().")
+
+
+class LocalAttachmentStorage(BaseAttachmentStorage):
+    """
+    Files under ATTACHMENT_ROOT, two levels of directories deep. Only for
+    development and tests: the files stay on the one machine that wrote them.
+    """
+
+    def __init__(self, root=None, **kwargs):
+        self.root = str(root or settings.ATTACHMENT_ROOT)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def write(self, key, offset, blocks):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = 0
+        with open(path, "r+b" if os.path.exists(path) else "wb") as fh:
+            fh.seek(offset)
+            for block in blocks:
+                fh.write(block)
+                written += len(block)
+            fh.truncate()
+        return written
+
+    def truncate(self, key, size):
+        path = self.path(key)
+        if os.path.exists(path):
+            os.truncate(path, size)
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+def storage_configured():
+    return bool(settings.ATTACHMENT_STORAGE_BACKEND)
+
+
+def get_storage(backend=None, **kwargs):
+    backend = backend or settings.ATTACHMENT_STORAGE_BACKEND
+    if not backend:
+        raise ImproperlyConfigured("ATTACHMENT_STORAGE_BACKEND is not set.")
+    klass = import_string(backend)
+    return klass(**kwargs)
+
+
+def new_storage_key():
+    return uuid.uuid4().hex
+
+
+def read_blocks(stream, length, digest):
+    """``length`` bytes of ``stream`` in BLOCK_SIZE pieces, fed to ``digest`` on the way."""
+    remaining = length
+    while remaining > 0:
+        block = stream.read(min(BLOCK_SIZE, remaining))
+        if not block:
+            break
+        digest.update(block)
+        remaining -= len(block)
+        yield block
+
+
+def file_sha256(storage, key):
+    digest = hashlib.sha256()
+    with storage.open(key) as fh:
+        for block in iter(lambda: fh.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def receive_chunk(attachment, offset, length, checksum, stream, storage=None):
+    """
+    Append ``length`` bytes of ``stream`` at ``offset``. The chunk is read
+    and checked before the attachment row is locked, so a slow client holds
+    no lock; concurrent retries of the same chunk queue up only to copy it
+    in. When the last chunk is in and the whole file does not match
+    ``Attachment.sha256``, the upload starts over. Returns the updated
+    attachment.
+    """
+    storage = storage or get_storage()
+    if attachment.status == Attachment.Status.COMPLETE or offset != attachment.received:
+        raise OffsetMismatch(attachment.received)
+
+    part = f"{attachment.storage_key}.{new_storage_key()}"
+    restarted = False
+    try:
+        digest = hashlib.sha256()
+        written = storage.write(part, 0, read_blocks(stream, length, digest))
+        if written != length or digest.hexdigest() != checksum.lower():
+            raise ChecksumMismatch(offset)
+
+        with transaction.atomic():
+            attachment = Attachment.objects.select_for_update().get(pk=attachment.pk)
+            if attachment.status == Attachment.Status.COMPLETE or offset != attachment.received:
+                raise OffsetMismatch(attachment.received)
+
+            with storage.open(part) as fh:
+                storage.write(attachment.storage_key, offset, iter(lambda: fh.read(BLOCK_SIZE), b""))
+            attachment.received = offset + written
+            update_fields = ["received"]
+            if attachment.received == attachment.size:
+                if attachment.sha256 and file_sha256(storage, attachment.storage_key) != attachment.sha256:
+                    storage.truncate(attachment.storage_key, 0)
+                    attachment.received = 0
+                    restarted = True
+                else:
+                    attachment.status = Attachment.Status.COMPLETE
+                    attachment.completed_at = timezone.now()
+                    update_fields += ["status", "completed_at"]
+            attachment.save(update_fields=update_fields)
+    finally:
+        storage.delete(part)
+
+    if restarted:
+        raise ChecksumMismatch(0)
+    return attachment
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` (inclusive) for a single-range ``Range`` header, ``None``
+    to send the whole file, or ``False`` when the range cannot be satisfied.
+    """
+    match = RANGE.match(header or "")
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+class RangeFile:
+    """
+    Reads at most ``length`` bytes of ``fh`` from where it is positioned.
+    Keeps ``fileno()`` so a sendfile-capable server still gets the real file.
+    """
+
+    def __init__(self, fh, length):
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fh.fileno()
+
+    def close(self):
+        self.fh.close()
+
+
+def download_response(request, attachment, storage=None):
+    storage = storage or get_storage()
+    size = attachment.size
+    etag = f'"{attachment.sha256 or attachment.storage_key}"'
+
+    byte_range = parse_range(request.headers.get("Range"), size)
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != etag:
+        byte_range = None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    fh = storage.open(attachment.storage_key)
+    fh.seek(start)
+    response = FileResponse(
+        RangeFile(fh, length),
+        status=206 if byte_range else 200,
+        as_attachment=True,
+        filename=attachment.filename,
+        content_type=attachment.content_type or "application/octet-stream",
+    )
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
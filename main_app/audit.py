@@ -0,0 +1,209 @@
+"""
+Access audit log.
+
+Requests only append a tuple to an in-process buffer. The buffer is written
+with one ``bulk_create`` from the ``request_finished`` signal, which fires
+after the response has been handed to the client, once AUDIT_FLUSH_SIZE
+events are waiting or the oldest one is AUDIT_FLUSH_INTERVAL seconds old.
+Gunicorn workers also flush on exit (see ``gunicorn.conf.py``); events
+buffered in a worker that is killed outright are lost.
+"""
+import logging
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+_buffer = []
+_lock = threading.Lock()
+_oldest = None
+
+
+def to_ranges(ids):
+    """Sorted ``[[first, last], ...]`` runs of consecutive ids."""
+    ranges = []
+    for value in sorted(set(ids)):
+        if ranges and value == ranges[-1][1] + 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return ranges
+
+
+def in_ranges(value, ranges):
+    return any(first <= value <= last for first, last in ranges)
+
+
+def record(user, action, model, object_ids, patient_ids=()):
+    """Queue one access event. Cheap enough to call on every request."""
+    global _oldest
+    if not settings.AUDIT_ENABLED:
+        return
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    event = (timezone.now(), user_id, action, model, object_ids, patient_ids)
+
+    with _lock:
+        if not _buffer:
+            _oldest = time.monotonic()
+        _buffer.append(event)
+
+
+def flush_if_due(**kwargs):
+    with _lock:
+        due = _buffer and (
+            len(_buffer) >= settings.AUDIT_FLUSH_SIZE
+            or time.monotonic() - _oldest >= settings.AUDIT_FLUSH_INTERVAL
+        )
+    if due:
+        flush()
+
+
+def build_event(occurred_at, user_id, action, model, object_ids, patient_ids):
+    patients = to_ranges(patient_ids)
+    single = len(patients) == 1 and patients[0][0] == patients[0][1]
+    return AuditEvent(
+        occurred_at=occurred_at,
+        user_id=user_id,
+        action=action,
+        model=model,
+        object_ranges=to_ranges(object_ids),
+        object_count=len(set(object_ids)),
+        patient_id=patients[0][0] if single else None,
+        patient_min=patients[0][0] if patients and not single else None,
+        patient_max=patients[-1][1] if patients and not single else None,
+        patient_ranges=patients if patients and not single else None,
+    )
+
+
+def flush():
+    """Write every buffered event; returns how many were written."""
+    global _buffer
+    with _lock:
+        events, _buffer = _buffer, []
+    if not events:
+        return 0
+    try:
+        AuditEvent.objects.bulk_create(
+            [build_event(*event) for event in events],
+            batch_size=settings.AUDIT_FLUSH_SIZE,
+        )
+    except Exception:
+        logger.exception("Writing %d audit events failed", len(events))
+        with _lock:
+            _buffer[:0] = events[-settings.AUDIT_MAX_BUFFER:]
+        return 0
+    return len(events)
+
+
+
+# Served by audit_patient_span_idx (migration 0023); the JSON ranges then drop events whose gaps hold the id.
+SPANNING_SQL = (
+    "patient_min IS NOT NULL AND int8range(patient_min, patient_max, '[]') @> %s::bigint "
+    "AND jsonb_path_exists(patient_ranges, '$[*] ? (@[0] <= $id && @[1] >= $id)', jsonb_build_object('id', %s::bigint))"
+)
+
+
+def events_for_patient(patient_id):
+    """Events that touched ``patient_id``, newest first."""
+    if connection.vendor == "postgresql":
+        spanning = RawSQL(SPANNING_SQL, [patient_id, patient_id], output_field=BooleanField())
+        return AuditEvent.objects.filter(Q(patient_id=patient_id) | Q(spanning)).order_by("-occurred_at")
+
+    single = AuditEvent.objects.filter(patient_id=patient_id)
+    spanning = [
+        event.pk for event in AuditEvent.objects.filter(
+            patient_min__lte=patient_id, patient_max__gte=patient_id
+        ).only("pk", "patient_ranges")
+        if in_ranges(patient_id, event.patient_ranges)
+    ]
+    return (single | AuditEvent.objects.filter(pk__in=spanning)).order_by("-occurred_at")
+
+
+def events_for_user(user_id):
+    return AuditEvent.objects.filter(user_id=user_id).order_by("-occurred_at")
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (month_start(day) + timedelta(days=32)).replace(day=1)
+
+
+def ensure_partitions(months_ahead=3, today=None):
+    """Create monthly partitions of the audit table up to ``months_ahead`` (PostgreSQL only)."""
+    if connection.vendor != "postgresql":
+        return []
+    table = AuditEvent._meta.db_table
+    created = []
+    start = month_start(today or date.today())
+    for _ in range(months_ahead + 1):
+        end = next_month(start)
+        name = f"{table}_{start:%Y_%m}"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [start.isoformat(), end.isoformat()],
+            )
+        created.append(name)
+        start = end
+    return created
+
+
+class AuditMixin:
+    """Records every successful request on a ModelViewSet as an ``AuditEvent``."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code < 400 and getattr(self, "action", None):
+            object_ids, patient_ids = self.audit_ids(getattr(response, "data", None))
+            if object_ids:
+                record(
+                    request.user,
+                    self.action,
+                    self.queryset.model._meta.model_name,
+                    object_ids,
+                    patient_ids,
+                )
+        return response
+
+    def audit_ids(self, data):
+        if isinstance(data, dict) and isinstance(data.get("results"), list):
+            data = data["results"]
+        rows = data if isinstance(data, list) else [data] if isinstance(data, dict) else []
+        rows = [row for row in rows if isinstance(row, dict) and "id" in row]
+
+        object_ids = [row["id"] for row in rows]
+        pk = str(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, ""))
+        if not object_ids and pk.isdigit():
+            object_ids = [int(pk)]
+
+        model = self.queryset.model
+        if model._meta.model_name == "patient":
+            patient_ids = object_ids
+        elif rows and all("patient" in row for row in rows):
+            patient_ids = [row["patient"] for row in rows if row["patient"] is not None]
+        else:
+            # ``?fields=`` left the patient out of the response, or the body is not the object.
+            patient_ids = patients_of(model, object_ids)
+        return object_ids, patient_ids
+
+
+def patients_of(model, object_ids):
+    """Patient ids of the ``model`` rows ``object_ids``, read from the database."""
+    if not object_ids or not any(field.name == "patient" for field in model._meta.get_fields()):
+        return []
+    return list(
+        model.objects.filter(pk__in=object_ids, patient__isnull=False).values_list("patient_id", flat=True)
+    )
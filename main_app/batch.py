@@ -0,0 +1,103 @@
+"""
+Batched reads.
+
+``POST /api/batch/`` runs several GET requests against the API's own views
+in one round trip. The batch is authenticated once: sub-requests reuse its
+user and token instead of decoding the JWT again, and skip the middleware,
+which already ran for the batch itself. With ``"parallel": true`` they run
+on the process's pool of BATCH_MAX_WORKERS threads, each with its own
+database connection. The pool is shared by every batch, so a worker process
+holds at most BATCH_MAX_WORKERS connections beyond its own, and they are
+kept for CONN_MAX_AGE like the request thread's instead of being opened
+again for every batch.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "/api/"
+BATCH_PATH = "/api/batch/"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def failed(path, status, error):
+    return {"path": path, "status": status, "body": {"error": error}}
+
+
+def build_request(request, path, query):
+    sub = HttpRequest()
+    sub.method = "GET"
+    sub.path = sub.path_info = path
+    sub.META = {
+        **request.META,
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "CONTENT_LENGTH": "0",
+    }
+    sub.META.pop("CONTENT_TYPE", None)
+    sub.GET = QueryDict(query)
+    sub.COOKIES = request.COOKIES
+    sub.user = request.user
+    # DRF's Request uses these instead of running the authenticators again.
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def run(request, path):
+    """``{"path", "status", "body"}`` of one GET sub-request."""
+    parts = urlsplit(path)
+    if not parts.path.startswith(PREFIX) or parts.path == BATCH_PATH or parts.netloc:
+        return failed(path, 400, "Only API paths can be batched.")
+    try:
+        match = resolve(parts.path)
+    except Resolver404:
+        return failed(path, 404, "Not found.")
+
+    sub = build_request(request, parts.path, parts.query)
+    sub.resolver_match = match
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception("Batched request to %s failed", path)
+        return failed(path, 500, "Server error.")
+
+    if not hasattr(response, "data"):
+        return failed(path, 406, "Only JSON responses can be batched.")
+    return {"path": path, "status": response.status_code, "body": response.data}
+
+
+def get_pool():
+    """The process's batch threads, started on first use (after gunicorn has forked)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS, thread_name_prefix="batch")
+        return _pool
+
+
+def run_in_thread(request, path):
+    # As around a request: drop the thread's connection once it is too old or broken, keep it otherwise.
+    close_old_connections()
+    try:
+        return run(request, path)
+    finally:
+        close_old_connections()
+
+
+def run_all(request, paths, parallel=False):
+    """Responses to ``paths``, in order."""
+    if not parallel or len(paths) < 2:
+        return [run(request, path) for path in paths]
+    return list(get_pool().map(lambda path: run_in_thread(request, path), paths))
@@ -0,0 +1,215 @@
+"""
+Duplicate patients.
+
+Candidates are found through blocking keys stored on ``Patient``: phonetic
+first and last name, date of birth, phone and email (see ``matching.py``).
+Two records share a block when they have the same date of birth and first
+or last name sound, the same phone or email, or the same name sounds with
+the date of birth missing on one side. Every block is an indexed lookup,
+led by the clinic, so finding candidates stays a few index scans however
+many patients there are; only the candidates are then scored. Patients are
+only ever matched within their own clinic.
+"""
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .matching import similarity
+from .models import Patient, Appointment, Report, WaitlistEntry, Attachment
+
+MAX_MATCHES = 10
+CANDIDATE_LIMIT = 200
+MERGED_FIELDS = ("date_of_birth", "gender", "phone", "email", "address", "doctor_id")
+
+
+def share_block(a, b):
+    """Whether two patients fall into a common block (see the module docstring)."""
+    if a.last_name_key and a.first_name_key and (a.date_of_birth is None or b.date_of_birth is None):
+        if (a.last_name_key, a.first_name_key) == (b.last_name_key, b.first_name_key):
+            return True
+    if a.date_of_birth and a.date_of_birth == b.date_of_birth:
+        if (a.first_name_key and a.first_name_key == b.first_name_key) or (
+            a.last_name_key and a.last_name_key == b.last_name_key
+        ):
+            return True
+    return bool(
+        (a.phone_key and a.phone_key == b.phone_key) or (a.email_key and a.email_key == b.email_key)
+    )
+
+
+def bucket_keys(patient):
+    keys = [("name", patient.last_name_key, patient.first_name_key), ("born", patient.date_of_birth)]
+    if patient.phone_key:
+        keys.append(("phone", patient.phone_key))
+    if patient.email_key:
+        keys.append(("email", patient.email_key))
+    return keys
+
+
+def pairs(first_field, second_field, values, **extra):
+    return Q(
+        **{f"{first_field}__in": sorted({a for a, _ in values}), f"{second_field}__in": sorted({b for _, b in values})},
+        **extra,
+    )
+
+
+def candidate_query(patients):
+    """
+    One filter covering the blocks of all ``patients``, each an indexed
+    lookup. Pairs of keys are combined with ``__in``, which can match a
+    little more than the blocks themselves; ``share_block`` re-checks.
+    """
+    names, names_without_birth, born_first, born_last = set(), set(), set(), set()
+    phones, emails = set(), set()
+    for patient in patients:
+        first, last, born = patient.first_name_key, patient.last_name_key, patient.date_of_birth
+        if last and first:
+            (names_without_birth if born else names).add((last, first))
+        if born and first:
+            born_first.add((born, first))
+        if born and last:
+            born_last.add((born, last))
+        if patient.phone_key:
+            phones.add(patient.phone_key)
+        if patient.email_key:
+            emails.add(patient.email_key)
+
+    conditions = []
+    if names:
+        conditions.append(pairs("last_name_key", "first_name_key", names))
+    if names_without_birth:
+        conditions.append(pairs("last_name_key", "first_name_key", names_without_birth, date_of_birth__isnull=True))
+    if born_first:
+        conditions.append(pairs("date_of_birth", "first_name_key", born_first))
+    if born_last:
+        conditions.append(pairs("date_of_birth", "last_name_key", born_last))
+    if phones:
+        conditions.append(Q(phone_key__in=sorted(phones)))
+    if emails:
+        conditions.append(Q(email_key__in=sorted(emails)))
+    return reduce(or_, conditions) if conditions else None
+
+
+def find_matches(patients, threshold=None, exclude=()):
+    """
+    ``[(patient, [(candidate, score), ...]), ...]`` for each of ``patients``
+    (unsaved ``Patient`` instances of one clinic with their match keys set),
+    best first.
+    Earlier patients without matches count as candidates for later ones, so
+    duplicates within an import are caught too.
+    """
+    threshold = settings.PATIENT_DUPLICATE_THRESHOLD if threshold is None else threshold
+    query = candidate_query(patients)
+    existing = []
+    if query is not None:
+        existing = Patient.objects.filter(query, tenant=patients[0].tenant_id).exclude(pk__in=exclude).only(
+            "first_name", "last_name", "date_of_birth",
+            "first_name_key", "last_name_key", "phone_key", "email_key",
+        )[:CANDIDATE_LIMIT * len(patients)]
+
+    buckets = defaultdict(list)
+    for candidate in existing:
+        for key in bucket_keys(candidate):
+            buckets[key].append(candidate)
+
+    results = []
+    for patient in patients:
+        seen = set()
+        scored = []
+        for key in bucket_keys(patient):
+            for candidate in buckets.get(key, ()):
+                if id(candidate) in seen or not share_block(patient, candidate):
+                    continue
+                seen.add(id(candidate))
+                score = similarity(patient, candidate)
+                if score >= threshold:
+                    scored.append((candidate, score))
+        scored.sort(key=lambda match: -match[1])
+        results.append((patient, scored[:MAX_MATCHES]))
+        if not scored:
+            for key in bucket_keys(patient):
+                buckets[key].append(patient)
+    return results
+
+
+def find_duplicates(patient, threshold=None):
+    """Likely duplicates of ``patient`` as ``[(candidate, score), ...]``, best first."""
+    patient.set_match_keys()
+    exclude = [patient.pk] if patient.pk else []
+    return find_matches([patient], threshold, exclude)[0][1]
+
+
+def describe(matches):
+    return [
+        {
+            "id": candidate.pk,
+            "first_name": candidate.first_name,
+            "last_name": candidate.last_name,
+            "date_of_birth": candidate.date_of_birth,
+            "score": round(score, 3),
+        }
+        for candidate, score in matches
+    ]
+
+
+def import_patients(patients, allow_duplicates=False):
+    """
+    Save ``patients`` (unsaved instances) that are not likely duplicates,
+    with one candidate query for the whole batch. Returns
+    ``(created, duplicates)`` where ``duplicates`` lists ``(index, matches)``.
+    """
+    for patient in patients:
+        patient.set_match_keys()
+    if allow_duplicates:
+        matches = [(patient, []) for patient in patients]
+    else:
+        matches = find_matches(patients)
+
+    created, duplicates = [], []
+    with transaction.atomic():
+        for index, (patient, found) in enumerate(matches):
+            if found:
+                duplicates.append((index, found))
+            else:
+                patient.save()
+                created.append(patient)
+    return created, duplicates
+
+
+def merge_patients(keep, duplicate):
+    """
+    Move the appointments, reports, waitlist entries and attachments of
+    ``duplicate`` to ``keep``, fill ``keep``'s empty fields from it and delete
+    it, all in one transaction. Returns the updated ``keep``.
+    """
+    if keep.pk == duplicate.pk:
+        raise ValueError("A patient cannot be merged into itself.")
+    if keep.tenant_id != duplicate.tenant_id:
+        raise ValueError("Patients of different clinics cannot be merged.")
+
+    with transaction.atomic():
+        locked = {
+            patient.pk: patient
+            for patient in Patient.objects.select_for_update().filter(pk__in=[keep.pk, duplicate.pk]).order_by("pk")
+        }
+        if len(locked) != 2:
+            raise ValueError("Patient does not exist.")
+        keep, duplicate = locked[keep.pk], locked[duplicate.pk]
+
+        for model in (Appointment, Report, WaitlistEntry, Attachment):
+            model.objects.filter(patient=duplicate).update(patient=keep)
+
+        for field in MERGED_FIELDS:
+            if getattr(keep, field) in (None, "") and getattr(duplicate, field) not in (None, ""):
+                setattr(keep, field, getattr(duplicate, field))
+
+        if duplicate.medical_history and duplicate.medical_history != keep.medical_history:
+            keep.medical_history = "\n\n".join(filter(None, (keep.medical_history, duplicate.medical_history)))
+
+        keep.save()
+        duplicate.delete()
+    return keep
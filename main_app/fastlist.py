@@ -0,0 +1,184 @@
+"""
+Sparse fieldsets and a fast path for list endpoints.
+
+``?fields=first_name,last_name`` limits a response to the named fields
+(``id`` is always included, the audit log relies on it). On list
+pages the rows are read with ``values_list()`` for just the needed columns
+and turned into dicts with per-field converters computed once per
+serializer, instead of building a model instance and walking the
+ModelSerializer field machinery for every row. The output is identical to
+the serializer's; serializers with fields the fast path cannot reproduce
+fall back to the regular path.
+
+Viewsets can set ``list_serializer_class`` to list rows with a narrower
+serializer than the detail endpoints, e.g. a preview instead of a long text.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+# Fields whose to_representation() is a no-op for the values the database returns.
+IDENTITY_FIELDS = (
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+CONVERTED_FIELDS = (
+    serializers.DateField,
+    serializers.DateTimeField,
+    serializers.ChoiceField,
+)
+
+_plans = {}
+_readable = {}
+
+
+class ListPlan:
+    def __init__(self, names, columns, converters):
+        self.names = names
+        self.columns = columns
+        self.converters = converters
+
+    def rows(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def to_dicts(self, rows):
+        names = self.names
+        converted = [
+            (index, convert) for index, convert in enumerate(self.converters) if convert is not None
+        ]
+        data = []
+        for row in rows:
+            if converted:
+                row = list(row)
+                for index, convert in converted:
+                    if row[index] is not None:
+                        row[index] = convert(row[index])
+            data.append(dict(zip(names, row)))
+        return data
+
+
+def readable_fields(serializer_class):
+    if serializer_class not in _readable:
+        _readable[serializer_class] = frozenset(
+            name for name, field in serializer_class().fields.items() if not field.write_only
+        )
+    return _readable[serializer_class]
+
+
+def column_for(model, field):
+    """Column lookup for ``field``, or ``None`` if it cannot be read with values()."""
+    if field.source == "*" or not field.source_attrs:
+        return None
+    if len(field.source_attrs) > 1:
+        return "__".join(field.source_attrs)
+
+    try:
+        model_field = model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    if model_field.is_relation:
+        return model_field.attname if model_field.many_to_one else None
+    return model_field.attname
+
+
+def build_plan(serializer_class, fields=None):
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    names, columns, converters = [], [], []
+
+    for name, field in serializer.fields.items():
+        if field.write_only or (fields is not None and name not in fields):
+            continue
+        if type(field) in IDENTITY_FIELDS:
+            convert = None
+        elif type(field) in CONVERTED_FIELDS:
+            convert = field.to_representation
+        else:
+            return None
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is not None:
+            return None
+
+        column = column_for(model, field)
+        if column is None:
+            return None
+        names.append(name)
+        columns.append(column)
+        converters.append(convert)
+
+    return ListPlan(tuple(names), tuple(columns), tuple(converters))
+
+
+def get_plan(serializer_class, fields=None):
+    """Cached ``ListPlan`` for the serializer and field selection, or ``None`` if unsupported."""
+    key = (serializer_class, fields)
+    if key not in _plans:
+        _plans[key] = build_plan(serializer_class, fields)
+    return _plans[key]
+
+
+def serialize_list(serializer_class, queryset, fields=None):
+    """List representation of ``queryset``, identical to ``serializer_class(queryset, many=True).data``."""
+    plan = get_plan(serializer_class, fields)
+    if plan is None:
+        serializer = serializer_class(queryset, many=True)
+        if fields is not None:
+            restrict_fields(serializer.child, fields)
+        return serializer.data
+    return plan.to_dicts(plan.rows(queryset))
+
+
+def restrict_fields(serializer, fields):
+    for name in list(serializer.fields):
+        if name not in fields:
+            serializer.fields.pop(name)
+
+
+def parse_fields(request, serializer_class):
+    raw = request.query_params.get("fields")
+    if not raw:
+        return None
+    fields = frozenset(name.strip() for name in raw.split(",") if name.strip())
+    unknown = fields.difference(readable_fields(serializer_class))
+    if unknown:
+        raise ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}"})
+    return fields | {"id"}
+
+
+class FastListMixin:
+    """Adds ``?fields=`` to a ModelViewSet and serves ``list`` through the fast path."""
+    list_serializer_class = None
+
+    def get_serializer_class(self):
+        if self.action == "list" and self.list_serializer_class is not None:
+            return self.list_serializer_class
+        return super().get_serializer_class()
+
+    def requested_fields(self):
+        if self.request.method != "GET":
+            return None
+        return parse_fields(self.request, self.get_serializer_class())
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.requested_fields()
+        if fields is not None:
+            restrict_fields(getattr(serializer, "child", serializer), fields)
+        return serializer
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        fields = self.requested_fields()
+        plan = get_plan(serializer_class, fields)
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = plan.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.to_dicts(page))
+        return Response(plan.to_dicts(rows))
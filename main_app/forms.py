@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
-from .models import User
+from .models import User, Patient, Report
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -13,3 +13,36 @@ class CustomUserChangeForm(UserChangeForm):
     class Meta:
         model = User
         fields = ("email", "first_name", "last_name", "role")
+
+
+class SideTextForm(forms.ModelForm):
+    """Edits the texts a model keeps in side tables (see ``SideTextMixin``) like regular fields."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            for name in self.instance.side_texts:
+                if name in self.fields:
+                    self.initial[name] = getattr(self.instance, name)
+
+    def _post_clean(self):
+        super()._post_clean()
+        for name in self.instance.side_texts:
+            if name in self.cleaned_data:
+                setattr(self.instance, name, self.cleaned_data[name])
+
+
+class PatientAdminForm(SideTextForm):
+    medical_history = forms.CharField(widget=forms.Textarea, required=False, empty_value=None)
+
+    class Meta:
+        model = Patient
+        fields = "__all__"
+
+
+class ReportAdminForm(SideTextForm):
+    diagnosis = forms.CharField(widget=forms.Textarea)
+
+    class Meta:
+        model = Report
+        fields = "__all__"
@@ -0,0 +1,114 @@
+"""
+Idempotent creates.
+
+A POST carrying an ``Idempotency-Key`` header runs once per user and key.
+The key row is inserted in the same transaction as the created object, so a
+concurrent duplicate blocks on the key's unique index (not on the rows the
+view touches) until the first request commits, then replays its response.
+Finished responses are also kept in the cache, so a retry storm costs one
+cache read per request. Keys live for IDEMPOTENCY_KEY_TTL; requests that
+raise (validation errors included) leave no key behind and can be retried
+as they are.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+CACHE_KEY = "idempotency:{}:{}"
+
+
+def fingerprint(request):
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def cache_key(user_id, key):
+    return CACHE_KEY.format(user_id, hashlib.sha256(key.encode()).hexdigest())
+
+
+def replay(stored, request_fingerprint):
+    if stored["fingerprint"] != request_fingerprint:
+        return Response(
+            {"error": f"{HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(stored["data"], status=stored["status"])
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def remember(user_id, key, stored, expires_at):
+    timeout = (expires_at - timezone.now()).total_seconds()
+    if timeout > 0:
+        cache.set(cache_key(user_id, key), stored, timeout)
+
+
+def run_once(request, key, view):
+    """Response of ``view()`` for the first request with ``key``, a replay of it for the rest."""
+    request_fingerprint = fingerprint(request)
+    stored = cache.get(cache_key(request.user.pk, key))
+    if stored is not None:
+        return replay(stored, request_fingerprint)
+
+    now = timezone.now()
+    with transaction.atomic():
+        record, created = IdempotencyKey.objects.select_for_update().get_or_create(
+            user=request.user,
+            key=key,
+            defaults={
+                "fingerprint": request_fingerprint,
+                "expires_at": now + settings.IDEMPOTENCY_KEY_TTL,
+            },
+        )
+        if not created and record.expires_at > now:
+            stored = {
+                "fingerprint": record.fingerprint,
+                "status": record.status_code,
+                "data": record.response,
+            }
+            remember(request.user.pk, key, stored, record.expires_at)
+            return replay(stored, request_fingerprint)
+
+        response = view()
+        if response.status_code >= 500:
+            transaction.set_rollback(True)
+            return response
+
+        record.fingerprint = request_fingerprint
+        record.status_code = response.status_code
+        record.response = response.data
+        record.expires_at = now + settings.IDEMPOTENCY_KEY_TTL
+        record.save()
+
+        stored = {"fingerprint": request_fingerprint, "status": response.status_code, "data": response.data}
+        transaction.on_commit(lambda: remember(request.user.pk, key, stored, record.expires_at))
+    return response
+
+
+def purge_expired(now=None):
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
+
+
+class IdempotentCreateMixin:
+    """Makes ``create`` on a ModelViewSet honour the ``Idempotency-Key`` header."""
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > 255:
+            return Response(
+                {"error": f"{HEADER} must be between 1 and 255 characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return run_once(request, key, lambda: super(IdempotentCreateMixin, self).create(request, *args, **kwargs))
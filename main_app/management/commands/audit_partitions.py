@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from main_app.audit import ensure_partitions
+
+
+class Command(BaseCommand):
+    help = "Create monthly audit log partitions ahead of time (PostgreSQL). Run from a daily scheduler."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3)
+
+    def handle(self, *args, **options):
+        created = ensure_partitions(options["months_ahead"])
+        if not created:
+            self.stdout.write("Audit table is not partitioned on this database; nothing to do.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Audit partitions present: {', '.join(created)}"))
@@ -0,0 +1,790 @@
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, time as day_time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from main_app import analytics, audit, idempotency
+from main_app.duplicates import find_duplicates, import_patients
+from main_app.fastlist import get_plan, serialize_list
+from main_app.middleware import CompressionMiddleware, brotli
+from main_app.renderers import ORJSONRenderer
+from main_app.models import (
+    DEFAULT_CLINIC_ID, PREVIEW_LENGTH, Clinic, User, Patient, PatientMedicalHistory, Appointment, Report, ReportDiagnosis,
+    ReportVersion, WorkingHours,
+)
+from main_app.report_history import autosave, text_at
+from main_app.serializers import (
+    PatientSerializer, PatientListSerializer, AppointmentSerializer, ReportSerializer, ReportListSerializer,
+)
+from main_app.scheduling import find_slots
+from main_app.views import PatientViewSet, AppointmentViewSet, ReportViewSet, AttachmentViewSet, MyDayView
+
+
+class Rollback(Exception):
+    pass
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def seed(rows, history="No known allergies. " * 5, diagnosis="Common cold. " * 10):
+    # bulk_create() refuses side texts, so previews go on the rows and bodies into their side tables.
+    doctor = User.objects.create_user(
+        email="bench.doctor@clinic.test", password="bench-pass", first_name="Bench",
+        last_name="Doctor", role="DOCTOR", specialization="General", tenant=DEFAULT_CLINIC_ID,
+    )
+    nurse = User.objects.create_user(
+        email="bench.nurse@clinic.test", password="bench-pass", first_name="Bench",
+        last_name="Nurse", role="NURSE", tenant=DEFAULT_CLINIC_ID,
+    )
+    patients = Patient.objects.bulk_create(
+        Patient(
+            first_name=f"Patient{i}", last_name="Bench", gender="F" if i % 2 else "M",
+            phone=f"06{i:07d}", address="Bench street 1",
+            medical_history_preview=history[:PREVIEW_LENGTH], medical_history_length=len(history),
+            doctor=doctor, tenant_id=DEFAULT_CLINIC_ID,
+        )
+        for i in range(rows)
+    )
+    PatientMedicalHistory.objects.bulk_create(
+        PatientMedicalHistory(patient=patient, text=history) for patient in patients
+    )
+    start = timezone.now()
+    appointments = Appointment.objects.bulk_create(
+        Appointment(
+            patient=patient, doctor=doctor, nurse=nurse, tenant_id=DEFAULT_CLINIC_ID,
+            date_time=start + timedelta(minutes=30 * i),
+        )
+        for i, patient in enumerate(patients)
+    )
+    reports = Report.objects.bulk_create(
+        Report(
+            patient=appointment.patient, doctor=doctor, nurse=nurse, tenant_id=DEFAULT_CLINIC_ID,
+            appointment=appointment, diagnosis_preview=diagnosis[:PREVIEW_LENGTH],
+            diagnosis_length=len(diagnosis),
+        )
+        for appointment in appointments
+    )
+    ReportDiagnosis.objects.bulk_create(
+        ReportDiagnosis(report=report, text=diagnosis) for report in reports
+    )
+    # Suites use these rather than querying, so rows already in the database don't get in the way.
+    return doctor, nurse, patients, reports
+
+
+def bench_serializers(command, rows, repeat):
+    seed(rows)
+    for serializer_class, queryset in (
+        (PatientListSerializer, Patient.objects.order_by("id")),
+        (AppointmentSerializer, Appointment.objects.select_related("report").order_by("id")),
+        (ReportListSerializer, Report.objects.order_by("id")),
+    ):
+        slow = timed(lambda: serializer_class(queryset.all(), many=True).data, repeat)
+        fast = timed(lambda: serialize_list(serializer_class, queryset.all()), repeat)
+        command.stdout.write(
+            f"{serializer_class.__name__:<24} "
+            f"ModelSerializer {rows / slow:>10,.0f} rows/s   "
+            f"fast path {rows / fast:>10,.0f} rows/s   "
+            f"x{slow / fast:.1f}"
+        )
+
+
+def bench_rendering(command, rows, repeat):
+    seed(rows)
+    data = serialize_list(PatientListSerializer, Patient.objects.order_by("id"))
+    stdlib = JSONRenderer().render(data)
+    fast = ORJSONRenderer().render(data)
+    command.stdout.write(f"Patient list, {rows} rows, {len(stdlib):,} bytes uncompressed")
+    command.stdout.write(
+        f"  render  json {timed(lambda: JSONRenderer().render(data), repeat) * 1000:8.1f} ms   "
+        f"orjson {timed(lambda: ORJSONRenderer().render(data), repeat) * 1000:8.1f} ms"
+    )
+
+    for level in (1, 3, 5, 6, 9):
+        elapsed = timed(lambda: gzip.compress(fast, compresslevel=level), repeat)
+        size = len(gzip.compress(fast, compresslevel=level))
+        command.stdout.write(f"  gzip-{level:<3} {size:>10,} bytes {elapsed * 1000:8.1f} ms")
+    if brotli is not None:
+        for quality in (1, 3, 4, 5, 6, 9, 11):
+            elapsed = timed(lambda: brotli.compress(fast, quality=quality), repeat)
+            size = len(brotli.compress(fast, quality=quality))
+            command.stdout.write(f"  br-{quality:<5} {size:>10,} bytes {elapsed * 1000:8.1f} ms")
+
+    user = User.objects.get(email="bench.doctor@clinic.test")
+    factory = APIRequestFactory()
+    for name, viewset in (
+        ("patients", PatientViewSet),
+        ("appointments", AppointmentViewSet),
+        ("reports", ReportViewSet),
+    ):
+        view = viewset.as_view({"get": "list"})
+        for encoding in ("identity", "gzip", "br"):
+            def request_once():
+                request = factory.get(f"/api/{name}/", HTTP_ACCEPT_ENCODING=encoding)
+                force_authenticate(request, user=user)
+                return CompressionMiddleware(lambda r: view(r).render())(request)
+
+            cpu = None
+            for _ in range(repeat):
+                start = time.process_time()
+                response = request_once()
+                elapsed = time.process_time() - start
+                cpu = elapsed if cpu is None else min(cpu, elapsed)
+            command.stdout.write(
+                f"  GET /api/{name}/ {encoding:<8} {len(response.content):>10,} bytes on the wire "
+                f"{cpu * 1000:8.1f} ms CPU"
+            )
+
+
+COLD_START_CHILD = """
+import io, json, os, sys, time
+start = time.perf_counter()
+from clinic.wsgi import application
+loaded = time.perf_counter()
+if os.environ["BENCH_WARM"] == "1":
+    from main_app.warmup import warm_up
+    warm_up()
+ready = time.perf_counter()
+
+statuses = []
+def start_response(status, headers, exc_info=None):
+    statuses.append(status)
+
+environ = {
+    "REQUEST_METHOD": "GET", "PATH_INFO": "/api/patients/", "QUERY_STRING": "",
+    "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost",
+    "HTTP_AUTHORIZATION": "Bearer " + os.environ["BENCH_TOKEN"],
+    "wsgi.url_scheme": "http", "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr,
+    "wsgi.version": (1, 0), "wsgi.multithread": False, "wsgi.multiprocess": True,
+    "wsgi.run_once": False,
+}
+timings = []
+for _ in range(2):
+    before = time.perf_counter()
+    b"".join(application(environ, start_response))
+    timings.append(time.perf_counter() - before)
+
+print(json.dumps({
+    "load": loaded - start, "warm_up": ready - loaded,
+    "first_request": timings[0], "second_request": timings[1], "status": statuses[0],
+}))
+"""
+
+
+def run_child(args, env, **kwargs):
+    return subprocess.run(
+        [sys.executable, *args], env=env, cwd=settings.BASE_DIR,
+        capture_output=True, text=True, check=True, **kwargs
+    )
+
+
+def bench_cold_start(command, rows, repeat):
+    user = User.objects.filter(is_active=True).order_by("id").first()
+    if user is None:
+        raise CommandError("The cold start benchmark needs at least one active user in the database.")
+
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ["DJANGO_SETTINGS_MODULE"]}
+
+    importtime = run_child(["-X", "importtime", "-c", "import clinic.wsgi"], env).stderr
+    by_package = {}
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            package = name.strip().split(".")[0]
+            by_package[package] = by_package.get(package, 0) + int(own)
+    command.stdout.write(
+        f"-X importtime: {sum(by_package.values()) / 1000:.0f} ms importing clinic.wsgi, by package:"
+    )
+    for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:12]:
+        command.stdout.write(f"  {us / 1000:8.1f} ms  {package}")
+
+    env["BENCH_TOKEN"] = str(AccessToken.for_user(user))
+    for warm in ("0", "1"):
+        env["BENCH_WARM"] = warm
+        runs = []
+        for _ in range(repeat):
+            spawned = time.perf_counter()
+            result = json.loads(run_child(["-c", COLD_START_CHILD], env).stdout.splitlines()[-1])
+            result["wall"] = time.perf_counter() - spawned
+            runs.append(result)
+        best = min(runs, key=lambda r: r["wall"])
+        command.stdout.write(
+            f"{'warm-up' if warm == '1' else 'lazy   '}  load {best['load'] * 1000:6.0f} ms  "
+            f"warm-up {best['warm_up'] * 1000:6.0f} ms  "
+            f"first request {best['first_request'] * 1000:6.1f} ms ({best['status']})  "
+            f"second {best['second_request'] * 1000:5.1f} ms  "
+            f"spawn to first response {best['wall'] * 1000:6.0f} ms"
+        )
+
+
+def bench_report_history(command, rows, repeat):
+    """``rows`` autosaves of a few characters each on a ~3 KB report."""
+    report = seed(1)[3][0]
+    rng = random.Random(0)
+    words = "patient reports mild fever cough fatigue headache prescribed rest fluids".split()
+    report.diagnosis = " ".join(rng.choice(words) for _ in range(400))
+    report.version = 0
+    report.save()
+    autosave(report, 0, [])
+
+    full_copies = 0
+    start = time.perf_counter()
+    for version in range(1, rows + 1):
+        text = ReportDiagnosis.objects.values_list("text", flat=True).get(pk=report.pk)
+        position = rng.randrange(len(text))
+        if rng.random() < 0.7:
+            ops = [[position, position, rng.choice(words) + " "]]
+        else:
+            ops = [[position, min(position + rng.randint(1, 8), len(text)), ""]]
+        _, text = autosave(report, version, ops)
+        full_copies += len(text.encode())
+    elapsed = time.perf_counter() - start
+
+    report.refresh_from_db()
+    stored = sum(len(data) for data in ReportVersion.objects.filter(report=report).values_list("data", flat=True))
+    command.stdout.write(
+        f"{rows} edits: {elapsed / rows * 1000:.2f} ms per autosave, "
+        f"history {stored:,} bytes vs {full_copies:,} bytes as full copies "
+        f"({full_copies / stored:.0f}x smaller)"
+    )
+
+    numbers = [rng.randint(1, report.version) for _ in range(50)]
+    start = time.perf_counter()
+    for number in numbers:
+        text_at(report, number)
+    command.stdout.write(
+        f"rebuild a random version: {(time.perf_counter() - start) / len(numbers) * 1000:.2f} ms"
+    )
+
+
+def bench_audit(command, rows, repeat):
+    seed(rows)
+    user = User.objects.get(email="bench.doctor@clinic.test")
+    viewset = PatientViewSet(kwargs={}, action="list")
+    page = serialize_list(PatientListSerializer, Patient.objects.order_by("id"))
+    audit.flush()
+
+    def capture_list():
+        object_ids, patient_ids = viewset.audit_ids(page)
+        audit.record(user, "list", "patient", object_ids, patient_ids)
+
+    def capture_detail():
+        object_ids, patient_ids = viewset.audit_ids(page[0])
+        audit.record(user, "retrieve", "patient", object_ids, patient_ids)
+
+    list_cost = timed(capture_list, repeat)
+    detail_cost = timed(capture_detail, repeat)
+    audit.flush()
+
+    for _ in range(1000):
+        capture_detail()
+    start = time.perf_counter()
+    written = audit.flush()
+    flush_cost = time.perf_counter() - start
+
+    command.stdout.write(f"capture, list of {rows} patients: {list_cost * 1000:.3f} ms per request")
+    command.stdout.write(f"capture, single patient:        {detail_cost * 1000:.3f} ms per request")
+    command.stdout.write(
+        f"flush: {written} events in {flush_cost * 1000:.1f} ms "
+        f"({written / flush_cost:,.0f} events/s, off the request path)"
+    )
+
+
+def bench_clinical_text(command, rows, repeat):
+    """List pages with ~4 KB histories and diagnoses: previews vs. the full texts."""
+    rng = random.Random(0)
+    words = "patient reports chronic asthma allergy hypertension prescribed inhaler follow-up".split()
+    seed(
+        rows,
+        history=" ".join(rng.choice(words) for _ in range(500)),
+        diagnosis=" ".join(rng.choice(words) for _ in range(500)),
+    )
+
+    for model, side, list_serializer, detail_serializer, accessor in (
+        (Patient, PatientMedicalHistory, PatientListSerializer, PatientSerializer, "medical_history_body"),
+        (Report, ReportDiagnosis, ReportListSerializer, ReportSerializer, "diagnosis_body"),
+    ):
+        queryset = model.objects.order_by("id")
+        columns = get_plan(list_serializer).columns
+        hot = timed(lambda: list(queryset.values_list(*columns)), repeat)
+        with_text = timed(lambda: list(queryset.values_list(*columns, f"{accessor}__text")), repeat)
+        previews = ORJSONRenderer().render(serialize_list(list_serializer, queryset.all()))
+        full = ORJSONRenderer().render(
+            detail_serializer(queryset.select_related(accessor), many=True).data
+        )
+        text_size = sum(map(len, side.objects.values_list("text", flat=True).iterator()))
+        stored = side.objects.aggregate(size=Sum(Length("text")))["size"]
+        command.stdout.write(
+            f"{model.__name__:<8} list query {hot * 1000:7.1f} ms vs {with_text * 1000:7.1f} ms with the text   "
+            f"payload {len(previews):>11,} bytes vs {len(full):>11,} bytes   "
+            f"side table {stored:,} bytes for {text_size:,} bytes of text"
+        )
+
+
+def bench_idempotency(command, rows, repeat):
+    """A booking followed by ``rows`` retries, with and without an Idempotency-Key."""
+    doctor, nurse, (patient,), _ = seed(1)
+    booking = {
+        "doctor_id": doctor.id, "nurse_id": nurse.id, "patient_id": patient.id,
+        "date_time": timezone.localtime(timezone.now() + timedelta(days=400))
+        .replace(hour=10, minute=0, second=0, microsecond=0).isoformat(),
+    }
+    factory = APIRequestFactory()
+    view = AppointmentViewSet.as_view({"post": "create"})
+
+    def post(key=None):
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        request = factory.post("/api/appointments/", booking, format="json", **headers)
+        force_authenticate(request, user=doctor)
+        return view(request)
+
+    def storm(label, retry, before_each=None):
+        with CaptureQueriesContext(connection) as queries:
+            statuses = set()
+            start = time.perf_counter()
+            for _ in range(rows):
+                if before_each:
+                    before_each()
+                statuses.add(retry().status_code)
+            elapsed = time.perf_counter() - start
+        command.stdout.write(
+            f"{label:<34} {elapsed / rows * 1000:6.3f} ms per retry   "
+            f"{len(queries) / rows:4.1f} queries per retry   status {sorted(statuses)}"
+        )
+
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        first = post("bench-key")
+        elapsed = time.perf_counter() - start
+    command.stdout.write(
+        f"{'first request':<34} {elapsed * 1000:6.3f} ms             "
+        f"{len(queries):4d} queries              status [{first.status_code}]"
+    )
+    storm("retry without a key", post)
+    storm(
+        "retry, key from the database",
+        lambda: post("bench-key"),
+        lambda: cache.delete(idempotency.cache_key(doctor.pk, "bench-key")),
+    )
+    storm("retry, key from the cache", lambda: post("bench-key"))
+
+
+FIRST_NAMES = (
+    "Ana Marija Jelena Milica Ivana Jovana Tijana Dragana Snežana Marko Nikola Stefan Luka "
+    "Miloš Đorđe Nemanja Aleksandar Dušan Vladimir Petar Milan Zoran Dragan Goran"
+).split()
+LAST_NAMES = (
+    "Jovanović Petrović Nikolić Marković Đorđević Stojanović Ilić Stanković Pavlović Milošević "
+    "Popović Đokić Kostić Lazić Todorović Savić Ristić Živković Golović Mitrović Radović Vasić"
+).split()
+
+
+def typo(rng, text):
+    if len(text) < 2:
+        return text + rng.choice("aeiou")
+    position = rng.randrange(1, len(text))
+    return rng.choice((
+        lambda: text[:position] + text[position + 1:],
+        lambda: text[:position] + rng.choice("aeiou") + text[position:],
+        lambda: text[:position - 1] + text[position] + text[position - 1] + text[position + 1:],
+    ))()
+
+
+def bench_duplicates(command, rows, repeat):
+    """Duplicate lookups with typos against ``rows`` patients, and a 500-row import."""
+    rng = random.Random(0)
+    start = time.perf_counter()
+    seeded = []
+    for offset in range(0, rows, 5000):
+        batch = []
+        for _ in range(offset, min(rows, offset + 5000)):
+            patient = Patient(
+                first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                date_of_birth=timezone.datetime(1940, 1, 1).date() + timedelta(days=rng.randrange(30000)),
+                phone=f"06{rng.randrange(10 ** 8):08d}", tenant_id=DEFAULT_CLINIC_ID,
+            )
+            patient.set_match_keys()
+            batch.append(patient)
+        seeded += Patient.objects.bulk_create(batch)
+    command.stdout.write(f"seeded {rows:,} patients in {time.perf_counter() - start:.1f} s")
+
+    # Probes come from the seeded rows only, whatever else the database holds.
+    originals = rng.sample(seeded, min(200, len(seeded)))
+    probes = []
+    for original in originals:
+        probe = Patient(
+            first_name=original.first_name, last_name=original.last_name,
+            date_of_birth=original.date_of_birth, phone=original.phone, tenant_id=DEFAULT_CLINIC_ID,
+        )
+        field = rng.choice(("first_name", "last_name", "phone"))
+        if field == "phone":
+            probe.phone = "+381 " + original.phone[1:]
+        else:
+            setattr(probe, field, typo(rng, getattr(original, field)))
+        probes.append((original, probe))
+
+    found = 0
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for original, probe in probes:
+            found += original.pk in {candidate.pk for candidate, _ in find_duplicates(probe)}
+        elapsed = time.perf_counter() - start
+    command.stdout.write(
+        f"lookup with one typo: {elapsed / len(probes) * 1000:.2f} ms, "
+        f"{len(queries) / len(probes):.0f} query each, {found}/{len(probes)} originals found"
+    )
+
+    imported = [
+        Patient(
+            first_name=rng.choice(FIRST_NAMES), last_name=f"Import{i}", phone=f"07{i:08d}",
+            tenant_id=DEFAULT_CLINIC_ID,
+        )
+        for i in range(450)
+    ] + [probe for _, probe in probes[:50]]
+    start = time.perf_counter()
+    created, duplicates = import_patients(imported)
+    command.stdout.write(
+        f"import of {len(imported)} rows: {(time.perf_counter() - start) * 1000:.0f} ms, "
+        f"{len(created)} created, {len(duplicates)} held back as duplicates"
+    )
+
+
+def bench_attachments(command, rows, repeat):
+    """A ``rows`` x 16 KiB upload in 1 MiB and 8 MiB chunks, then full and ranged downloads."""
+    doctor, _, (patient,), _ = seed(1)
+    size = rows * 16 * 1024
+    content = os.urandom(size)
+    factory = APIRequestFactory()
+    create = AttachmentViewSet.as_view({"post": "create"})
+    upload = AttachmentViewSet.as_view({"put": "content"})
+    download = AttachmentViewSet.as_view({"get": "download"})
+    root = tempfile.mkdtemp()
+
+    def call(view, request, **kwargs):
+        force_authenticate(request, user=doctor)
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        response = view(request, **kwargs)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+            response.file_to_stream.close()
+        return response, tracemalloc.get_traced_memory()[1] - before
+
+    tracemalloc.start()
+    try:
+        for chunk_size in (1024 * 1024, 8 * 1024 * 1024):
+            with override_settings(
+                ATTACHMENT_STORAGE_BACKEND="main_app.attachments.LocalAttachmentStorage",
+                ATTACHMENT_ROOT=root, ATTACHMENT_CHUNK_SIZE=chunk_size,
+            ):
+                request = factory.post("/api/attachments/", {
+                    "patient": patient.id, "filename": "bench.bin", "size": size,
+                    "sha256": hashlib.sha256(content).hexdigest(),
+                }, format="json")
+                pk = call(create, request)[0].data["id"]
+
+                peak = 0
+                start = time.perf_counter()
+                for offset in range(0, size, chunk_size):
+                    chunk = content[offset:offset + chunk_size]
+                    request = factory.put(
+                        f"/api/attachments/{pk}/content/", chunk, content_type="application/octet-stream",
+                        HTTP_UPLOAD_OFFSET=str(offset), HTTP_CHUNK_SHA256=hashlib.sha256(chunk).hexdigest(),
+                    )
+                    response, used = call(upload, request, pk=pk)
+                    peak = max(peak, used)
+                elapsed = time.perf_counter() - start
+                label = f"upload, {chunk_size // 1024 // 1024} MiB chunks"
+                command.stdout.write(
+                    f"{label:<34} {size / elapsed / 1e6:8.1f} MB/s   "
+                    f"peak {peak / 1024:8.1f} KiB   status {response.data['status']}"
+                )
+
+                for label, headers in (
+                    ("download, whole file", {}),
+                    ("download, 1 MiB range", {"HTTP_RANGE": f"bytes={size // 2}-{size // 2 + 1024 * 1024 - 1}"}),
+                ):
+                    request = factory.get(f"/api/attachments/{pk}/download/", **headers)
+                    start = time.perf_counter()
+                    response, used = call(download, request, pk=pk)
+                    elapsed = time.perf_counter() - start
+                    command.stdout.write(
+                        f"{label:<34} {elapsed * 1000:8.1f} ms     peak {used / 1024:8.1f} KiB   "
+                        f"status {response.status_code}"
+                    )
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_analytics(command, rows, repeat):
+    """``rows`` appointments of 50 doctors over three years: row-by-row counting vs. analytics."""
+    if not analytics.available():
+        raise CommandError("The analytics suite needs NumPy.")
+    rng = random.Random(41)
+    doctors = User.objects.bulk_create(
+        User(
+            email=f"bench.stats{i}@clinic.test", role="DOCTOR", first_name="Bench", last_name=f"Stats{i}",
+            tenant_id=DEFAULT_CLINIC_ID,
+        )
+        for i in range(50)
+    )
+    today = timezone.localdate()
+    last = (today.year, today.month)
+    first = analytics.month_range((today.year - 3, today.month), last)[1]
+    start = analytics.month_start(first)
+    minutes = int((analytics.month_end(last) - start).total_seconds() // 60)
+    statuses = ["completed"] * 80 + ["cancelled"] * 12 + ["scheduled"] * 8
+
+    seeding = time.perf_counter()
+    for offset in range(0, rows, 10000):
+        Appointment.objects.bulk_create(
+            Appointment(
+                doctor=rng.choice(doctors), status=rng.choice(statuses), tenant_id=DEFAULT_CLINIC_ID,
+                date_time=start + timedelta(minutes=rng.randrange(minutes // 30) * 30),
+            )
+            for _ in range(min(10000, rows - offset))
+        )
+    command.stdout.write(f"seeded {rows} appointments in {time.perf_counter() - seeding:.1f} s")
+
+    def row_by_row():
+        now = timezone.now()
+        per_doctor, heatmap, daily = {}, {}, {}
+        for appointment in Appointment.objects.only("doctor_id", "date_time", "status").iterator(chunk_size=2000):
+            status = appointment.status
+            if status == "scheduled" and appointment.date_time < now:
+                status = "no_show"
+            local = timezone.localtime(appointment.date_time)
+            for counter, key in (
+                (per_doctor, (appointment.doctor_id, status)),
+                (heatmap, (status, local.weekday(), local.hour)),
+                (daily, (local.date(), status)),
+            ):
+                counter[key] = counter.get(key, 0) + 1
+
+    def fresh():
+        cache.clear()
+        analytics.summary(DEFAULT_CLINIC_ID, first, last)
+
+    def incremental():
+        analytics.invalidate(DEFAULT_CLINIC_ID, timezone.now())
+        analytics.summary(DEFAULT_CLINIC_ID, first, last)
+
+    fresh()
+    for label, func in (
+        ("row by row (ORM objects)", row_by_row),
+        ("analytics, nothing cached", fresh),
+        ("analytics, current month changed", incremental),
+        ("analytics, all months cached", lambda: analytics.summary(DEFAULT_CLINIC_ID, first, last)),
+    ):
+        command.stdout.write(f"{label:<34} {timed(func, repeat) * 1000:10.1f} ms")
+
+
+def bench_batch(command, rows, repeat):
+    """The frontend's page-load reads as separate requests vs. one batch, through all middleware."""
+    seed(min(rows, 200))
+    doctor = User.objects.get(email="bench.doctor@clinic.test")
+    client = Client(HTTP_HOST="localhost", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(doctor)}")
+    date_time = timezone.localtime(timezone.now() + timedelta(days=400)).replace(hour=10, minute=0)
+    paths = [
+        "/api/me/", "/api/users/", "/api/patients/", "/api/appointments/",
+        f"/api/available-doctors/?date_time={date_time:%Y-%m-%dT%H:%M}",
+    ]
+
+    def separate(paths):
+        for path in paths:
+            assert client.get(path).status_code == 200
+
+    def batched(paths):
+        response = client.post("/api/batch/", {"requests": paths}, content_type="application/json")
+        assert [sub["status"] for sub in response.json()["responses"]] == [200] * len(paths)
+
+    # In-process, so only per-request overhead shows; each request saved also saves a network round trip.
+    for name, batch_paths in (("page load", paths), ("20 x /api/me/", ["/api/me/"] * 20)):
+        for label, func in (("separate requests", separate), ("one batch", batched)):
+            elapsed = timed(lambda: func(batch_paths), repeat)
+            command.stdout.write(f"{name + ', ' + label:<34} {elapsed * 1000:8.2f} ms")
+
+
+WORKER_MEMORY_CHILD = """
+import json, resource
+from clinic.wsgi import application
+from main_app.warmup import warm_up
+warm_up()
+print(json.dumps(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+"""
+
+
+def seed_clinic(index, rows, rng):
+    """A clinic with 5 doctors working weekdays 8-16, 2 nurses, an admin, ``rows // 5`` patients and ``rows`` appointments."""
+    clinic = Clinic.objects.create(name=f"Bench clinic {index}", slug=f"bench-{index}")
+    staff = User.objects.bulk_create(
+        User(email=f"bench{index}.{role.lower()}{i}@clinic.test", tenant=clinic, role=role,
+             first_name="Bench", last_name=f"{role.title()}{i}", specialization="General")
+        for role, count in (("DOCTOR", 5), ("NURSE", 2), ("ADMIN", 1))
+        for i in range(count)
+    )
+    doctors, nurses = staff[:5], staff[5:7]
+    WorkingHours.objects.bulk_create(
+        WorkingHours(doctor=doctor, weekday=weekday, start_time=day_time(8), end_time=day_time(16))
+        for doctor in doctors
+        for weekday in range(5)
+    )
+    patients = []
+    for i in range(max(rows // 5, 1)):
+        patient = Patient(
+            tenant=clinic, first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+            phone=f"06{rng.randrange(10 ** 8):08d}",
+        )
+        patient.set_match_keys()
+        patients.append(patient)
+    patients = Patient.objects.bulk_create(patients, batch_size=5000)
+    today = timezone.make_aware(datetime.combine(timezone.localdate(), day_time(8)))
+    Appointment.objects.bulk_create(
+        (
+            Appointment(
+                tenant=clinic, patient=rng.choice(patients), doctor=rng.choice(doctors),
+                nurse=rng.choice(nurses),
+                date_time=today + timedelta(days=rng.randrange(-60, 60), minutes=30 * rng.randrange(16)),
+            )
+            for _ in range(rows)
+        ),
+        batch_size=5000,
+    )
+    return clinic, staff[7], patients
+
+
+def bench_tenancy(command, rows, repeat):
+    """One clinic's requests on its own, then with 49 more clinics of ``rows`` appointments in the same tables."""
+    rng = random.Random(43)
+    factory = APIRequestFactory()
+    clinic, admin, patients = seed_clinic(0, rows, rng)
+    probe = patients[len(patients) // 2]
+    today = timezone.localdate()
+
+    def get(view):
+        request = factory.get("/")
+        force_authenticate(request, user=admin)
+        response = view(request)
+        assert response.status_code == 200
+        return response
+
+    operations = [
+        ("patient list, admin", lambda: get(PatientViewSet.as_view({"get": "list"}))),
+        ("today's appointments, admin", lambda: get(MyDayView.as_view())),
+        ("find 5 slots in a week", lambda: find_slots(clinic.pk, today, today + timedelta(days=6))),
+        ("duplicate lookup", lambda: find_duplicates(
+            Patient(tenant=clinic, first_name=probe.first_name, last_name=probe.last_name, phone=probe.phone)
+        )),
+    ]
+    if analytics.available():
+        def fresh_analytics():
+            cache.clear()
+            analytics.summary(clinic.pk, (today.year, today.month), (today.year, today.month))
+        operations.append(("analytics, nothing cached", fresh_analytics))
+
+    def measure():
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return [timed(func, repeat) for _, func in operations]
+
+    alone = measure()
+    seeding = time.perf_counter()
+    for index in range(1, 50):
+        seed_clinic(index, rows, rng)
+    command.stdout.write(
+        f"seeded 49 more clinics, {Appointment.objects.count():,} appointments in all, "
+        f"in {time.perf_counter() - seeding:.1f} s"
+    )
+    shared = measure()
+
+    for (label, _), own, together in zip(operations, alone, shared):
+        command.stdout.write(
+            f"{label:<30} alone {own * 1000:8.2f} ms   among 50 clinics {together * 1000:8.2f} ms   "
+            f"x{together / own:.2f}"
+        )
+
+    day = timezone.make_aware(datetime.combine(today, day_time()))
+    plan = (
+        Appointment.objects.for_user(admin)
+        .filter(date_time__gte=day, date_time__lt=day + timedelta(days=1))
+        .explain()
+    )
+    indexes = sorted(set(re.findall(r"\w+_idx", plan)))
+    command.stdout.write(f"today's appointments query uses {', '.join(indexes) or plan}")
+
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ["DJANGO_SETTINGS_MODULE"]}
+    worker_kb = min(
+        json.loads(run_child(["-c", WORKER_MEMORY_CHILD], env).stdout.splitlines()[-1]) for _ in range(repeat)
+    )
+    command.stdout.write(
+        f"a warmed-up worker holds {worker_kb / 1024:.0f} MB: 50 single-clinic deployments idle at "
+        f"{50 * worker_kb / 1024:,.0f} MB and 50 databases, the shared one at {worker_kb / 1024:.0f} MB and one"
+    )
+
+
+SUITES = {
+    "serializers": bench_serializers,
+    "rendering": bench_rendering,
+    "coldstart": bench_cold_start,
+    "reporthistory": bench_report_history,
+    "audit": bench_audit,
+    "clinicaltext": bench_clinical_text,
+    "idempotency": bench_idempotency,
+    "duplicates": bench_duplicates,
+    "attachments": bench_attachments,
+    "analytics": bench_analytics,
+    "batch": bench_batch,
+    "tenancy": bench_tenancy,
+}
+
+
+class Command(BaseCommand):
+    help = "Run a benchmark suite against seeded data. Everything is rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument("suite", choices=sorted(SUITES))
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        if options["rows"] < 1:
+            raise CommandError("--rows must be positive")
+        try:
+            with transaction.atomic():
+                SUITES[options["suite"]](self, options["rows"], options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main_app.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys. Run from a daily scheduler."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency key(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main_app.reminders import send_due_reminders
+
+
+class Command(BaseCommand):
+    help = "Send email/SMS reminders for appointments inside REMINDER_WINDOW. Safe to run from several schedulers at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        reminded = send_due_reminders(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Reminded {reminded} appointment(s)."))
@@ -0,0 +1,127 @@
+"""
+Patient matching keys and similarity.
+
+Pure functions, no database access: ``models.Patient`` stores the keys
+computed here in indexed columns and ``duplicates.py`` uses them to find and
+score candidate duplicates.
+"""
+import unicodedata
+
+PHONE_KEY_DIGITS = 8
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+# Letters NFKD does not decompose.
+FOLDED_LETTERS = str.maketrans({"đ": "dj", "ß": "ss", "æ": "ae", "ø": "o", "ł": "l"})
+
+
+def fold(text):
+    """Lowercase ASCII letters of ``text`` (Golović -> golovic, Đorđe -> djordje)."""
+    text = unicodedata.normalize("NFKD", (text or "").lower().translate(FOLDED_LETTERS))
+    return "".join(char for char in text if "a" <= char <= "z")
+
+
+def soundex(name):
+    letters = fold(name)
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], "")
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, "")
+        if digit and digit != previous:
+            code += digit
+        if letter not in "hw":
+            previous = digit
+    return (code + "000")[:4]
+
+
+def phone_key(phone):
+    """Last PHONE_KEY_DIGITS digits, so +381 60 123 4567 and 060/123-4567 agree."""
+    digits = "".join(char for char in phone or "" if char.isdigit())
+    return digits[-PHONE_KEY_DIGITS:] if len(digits) >= PHONE_KEY_DIGITS else ""
+
+
+def email_key(email):
+    local, _, domain = (email or "").strip().lower().partition("@")
+    if not local or not domain:
+        return ""
+    return f"{local.split('+')[0]}@{domain}"
+
+
+def match_keys(first_name, last_name, phone, email):
+    return {
+        "first_name_key": soundex(first_name),
+        "last_name_key": soundex(last_name),
+        "phone_key": phone_key(phone),
+        "email_key": email_key(email),
+    }
+
+
+def jaro_winkler(a, b):
+    """Jaro-Winkler similarity in [0, 1]."""
+    if a == b:
+        return 1.0 if a else 0.0
+    if not a or not b:
+        return 0.0
+
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    a_matched = [False] * len(a)
+    b_matched = [False] * len(b)
+    matches = 0
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not b_matched[j] and b[j] == char:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    b_chars = [char for char, matched in zip(b, b_matched) if matched]
+    a_chars = [char for char, matched in zip(a, a_matched) if matched]
+    transpositions = sum(x != y for x, y in zip(a_chars, b_chars)) / 2
+    jaro = (matches / len(a) + matches / len(b) + (matches - transpositions) / matches) / 3
+
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+# How much each agreeing field counts; fields missing on either side are left out.
+WEIGHTS = {"name": 5, "date_of_birth": 3, "phone": 2, "email": 2}
+
+
+def similarity(a, b):
+    """
+    Score in [0, 1] that two patients are the same person. ``a`` and ``b``
+    are ``Patient`` instances with their match keys set. Names are compared
+    with Jaro-Winkler on folded text, also with first and last name swapped.
+    """
+    first_a, last_a = fold(a.first_name), fold(a.last_name)
+    first_b, last_b = fold(b.first_name), fold(b.last_name)
+    name = max(
+        0.4 * jaro_winkler(first_a, first_b) + 0.6 * jaro_winkler(last_a, last_b),
+        0.4 * jaro_winkler(first_a, last_b) + 0.6 * jaro_winkler(last_a, first_b),
+    )
+
+    agreement = {"name": name}
+    if a.date_of_birth and b.date_of_birth:
+        agreement["date_of_birth"] = float(a.date_of_birth == b.date_of_birth)
+    if a.phone_key and b.phone_key:
+        agreement["phone"] = float(a.phone_key == b.phone_key)
+    if a.email_key and b.email_key:
+        agreement["email"] = float(a.email_key == b.email_key)
+
+    total = sum(WEIGHTS[field] for field in agreement)
+    return sum(WEIGHTS[field] * value for field, value in agreement.items()) / total
@@ -0,0 +1,74 @@
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPE = "application/json"
+
+_q_zero = _lazy_re_compile(r"^\s*q\s*=\s*0(\.0*)?\s*$")
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if coding and not _q_zero.match(params):
+            accepted.add(coding)
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Brotli or gzip for API responses, negotiated from Accept-Encoding.
+
+    Only buffered JSON responses of at least API_COMPRESSION_MIN_SIZE bytes
+    are compressed. HTML is never compressed: admin pages carry the CSRF token
+    next to reflected input, which compression would leak (BREACH). The API
+    authenticates with bearer tokens, which no response body echoes back.
+    Static files are left to WhiteNoise, which serves them precompressed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPE)
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < settings.API_COMPRESSION_MIN_SIZE:
+            return response
+
+        accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if brotli is not None and "br" in accepted:
+            compressed = brotli.compress(response.content, quality=settings.API_BROTLI_QUALITY)
+            encoding = "br"
+        elif "gzip" in accepted:
+            compressed = gzip.compress(response.content, compresslevel=settings.API_GZIP_LEVEL, mtime=0)
+            encoding = "gzip"
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
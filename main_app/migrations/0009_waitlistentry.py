@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-19 18:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_appointment_reminder_sent_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialization', models.CharField(blank=True, max_length=200, null=True)),
+                ('auto_book', models.BooleanField(default=True, help_text='Book a freed slot straight away instead of offering it first.')),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('offered', 'Offered'), ('booked', 'Booked'), ('cancelled', 'Cancelled')], default='waiting', max_length=20)),
+                ('offered_date_time', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('appointment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='main_app.appointment')),
+                ('doctor', models.ForeignKey(blank=True, help_text='Leave empty to accept any doctor with the given specialization.', limit_choices_to={'role': 'DOCTOR'}, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+                ('offered_doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('offered_nurse', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='main_app.patient')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['doctor', 'created_at', 'id'], name='waitlist_doctor_queue_idx'), models.Index(condition=models.Q(('doctor__isnull', True), ('status', 'waiting')), fields=['specialization', 'created_at', 'id'], name='waitlist_spec_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.9 on 2026-10-19 18:45
+
+from datetime import date, timedelta
+
+from django.db import migrations, models
+
+TABLE = "main_app_auditevent"
+
+POSTGRES_SQL = [
+    f"""
+    CREATE TABLE "{TABLE}" (
+        "id" bigint GENERATED BY DEFAULT AS IDENTITY,
+        "occurred_at" timestamp with time zone NOT NULL,
+        "user_id" bigint NULL,
+        "action" varchar(30) NOT NULL,
+        "model" varchar(30) NOT NULL,
+        "object_ranges" jsonb NOT NULL,
+        "object_count" integer NOT NULL CHECK ("object_count" >= 0),
+        "patient_id" bigint NULL,
+        "patient_min" bigint NULL,
+        "patient_max" bigint NULL,
+        "patient_ranges" jsonb NULL,
+        PRIMARY KEY ("id", "occurred_at")
+    ) PARTITION BY RANGE ("occurred_at")
+    """,
+    f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT',
+    f'CREATE INDEX "audit_user_idx" ON "{TABLE}" ("user_id", "occurred_at")',
+    f'CREATE INDEX "audit_patient_idx" ON "{TABLE}" ("patient_id", "occurred_at")',
+    f'CREATE INDEX "audit_patient_range_idx" ON "{TABLE}" ("patient_min", "patient_max")',
+    f'CREATE INDEX "audit_occurred_at_idx" ON "{TABLE}" ("occurred_at")',
+    f"""
+    CREATE FUNCTION "{TABLE}_append_only"() RETURNS trigger AS $$
+    BEGIN
+        RAISE EXCEPTION 'audit events are append-only';
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE TRIGGER "{TABLE}_append_only" BEFORE UPDATE OR DELETE ON "{TABLE}"
+    FOR EACH ROW EXECUTE FUNCTION "{TABLE}_append_only"()
+    """,
+]
+
+
+def create_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.create_model(apps.get_model("main_app", "AuditEvent"))
+        return
+
+    for statement in POSTGRES_SQL:
+        schema_editor.execute(statement)
+
+    start = date.today().replace(day=1)
+    for _ in range(4):
+        end = (start + timedelta(days=32)).replace(day=1)
+        schema_editor.execute(
+            f'CREATE TABLE "{TABLE}_{start:%Y_%m}" PARTITION OF "{TABLE}" '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        start = end
+
+
+def drop_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.delete_model(apps.get_model("main_app", "AuditEvent"))
+        return
+    schema_editor.execute(f'DROP TABLE "{TABLE}" CASCADE')
+    schema_editor.execute(f'DROP FUNCTION "{TABLE}_append_only"()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0012_report_versions'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='AuditEvent',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('occurred_at', models.DateTimeField()),
+                        ('user_id', models.BigIntegerField(null=True)),
+                        ('action', models.CharField(max_length=30)),
+                        ('model', models.CharField(max_length=30)),
+                        ('object_ranges', models.JSONField()),
+                        ('object_count', models.PositiveIntegerField()),
+                        ('patient_id', models.BigIntegerField(null=True)),
+                        ('patient_min', models.BigIntegerField(null=True)),
+                        ('patient_max', models.BigIntegerField(null=True)),
+                        ('patient_ranges', models.JSONField(null=True)),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['user_id', 'occurred_at'], name='audit_user_idx'), models.Index(fields=['patient_id', 'occurred_at'], name='audit_patient_idx'), models.Index(fields=['patient_min', 'patient_max'], name='audit_patient_range_idx'), models.Index(fields=['occurred_at'], name='audit_occurred_at_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_table, drop_table),
+    ]
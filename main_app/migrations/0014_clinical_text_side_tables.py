@@ -0,0 +1,122 @@
+# Generated by Django 5.2.9 on 2026-10-19 18:50
+
+import django.db.models.deletion
+import main_app.models
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 1000
+PREVIEW_LENGTH = 200
+
+TEXTS = (
+    ("Patient", "medical_history", "PatientMedicalHistory", "patient_id"),
+    ("Report", "diagnosis", "ReportDiagnosis", "report_id"),
+)
+
+
+def batches(queryset, *columns):
+    """``(pk, *columns)`` rows in primary key order, BATCH_SIZE at a time."""
+    last_pk = None
+    while True:
+        rows = queryset.order_by("pk")
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        rows = list(rows.values_list("pk", *columns)[:BATCH_SIZE])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1][0]
+
+
+def move_to_side_tables(apps, schema_editor):
+    for model_name, name, side_name, owner in TEXTS:
+        model = apps.get_model("main_app", model_name)
+        side = apps.get_model("main_app", side_name)
+        for rows in batches(model.objects.all(), name):
+            with transaction.atomic():
+                side.objects.bulk_create(
+                    [side(**{owner: pk, "text": text}) for pk, text in rows if text is not None],
+                    ignore_conflicts=True,
+                )
+                model.objects.bulk_update(
+                    [
+                        model(pk=pk, **{
+                            f"{name}_preview": (text or "")[:PREVIEW_LENGTH],
+                            f"{name}_length": len(text or ""),
+                        })
+                        for pk, text in rows
+                    ],
+                    [f"{name}_preview", f"{name}_length"],
+                )
+
+
+def move_back(apps, schema_editor):
+    for model_name, name, side_name, owner in TEXTS:
+        model = apps.get_model("main_app", model_name)
+        side = apps.get_model("main_app", side_name)
+        for rows in batches(side.objects.all(), "text"):
+            with transaction.atomic():
+                model.objects.bulk_update(
+                    [model(pk=pk, **{name: text}) for pk, text in rows], [name]
+                )
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own so large tables are not locked for the whole copy.
+    atomic = False
+
+    dependencies = [
+        ('main_app', '0013_auditevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientMedicalHistory',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='medical_history_body', serialize=False, to='main_app.patient')),
+                ('text', main_app.models.CompressedTextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReportDiagnosis',
+            fields=[
+                ('report', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='diagnosis_body', serialize=False, to='main_app.report')),
+                ('text', main_app.models.CompressedTextField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='medical_history_length',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='medical_history_preview',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='diagnosis_length',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='diagnosis_preview',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(move_to_side_tables, move_back),
+        # Lets the column be re-added to a non-empty table when migrating backwards.
+        migrations.AlterField(
+            model_name='report',
+            name='diagnosis',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='patient',
+            name='medical_history',
+        ),
+        migrations.RemoveField(
+            model_name='report',
+            name='diagnosis',
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.9 on 2026-10-19 18:55
+
+from django.db import migrations, models
+
+# Case-insensitive search lookups compile to UPPER(column::text) on
+# PostgreSQL; these expression indexes serve the admin's prefix (^) and
+# exact (=) searches. text_pattern_ops makes LIKE 'prefix%' indexable
+# under any collation.
+SEARCH_INDEXES = [
+    ("patient_last_name_search_idx", 'UPPER("last_name"::text) text_pattern_ops'),
+    ("patient_first_name_search_idx", 'UPPER("first_name"::text) text_pattern_ops'),
+    ("patient_phone_search_idx", 'UPPER("phone"::text)'),
+    ("patient_email_search_idx", 'UPPER("email"::text)'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, expression in SEARCH_INDEXES:
+        schema_editor.execute(f'CREATE INDEX "{name}" ON "main_app_patient" ({expression})')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0014_clinical_text_side_tables'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date_time'], name='appointment_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['created_at'], name='report_created_at_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
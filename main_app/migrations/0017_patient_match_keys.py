@@ -0,0 +1,80 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:00
+
+from django.db import migrations, models, transaction
+
+from main_app.matching import match_keys
+
+BATCH_SIZE = 1000
+KEY_FIELDS = ["first_name_key", "last_name_key", "phone_key", "email_key"]
+
+
+def fill_match_keys(apps, schema_editor):
+    Patient = apps.get_model("main_app", "Patient")
+    last_pk = 0
+    while True:
+        rows = list(
+            Patient.objects.filter(pk__gt=last_pk).order_by("pk")
+            .values_list("pk", "first_name", "last_name", "phone", "email")[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        with transaction.atomic():
+            Patient.objects.bulk_update(
+                [Patient(pk=pk, **match_keys(first, last, phone, email)) for pk, first, last, phone, email in rows],
+                KEY_FIELDS,
+            )
+        last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own so large tables are not locked for the whole backfill.
+    atomic = False
+
+    dependencies = [
+        ('main_app', '0016_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='email_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='first_name_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=4),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='last_name_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=4),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='phone_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(fill_match_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_name_key', 'first_name_key', 'date_of_birth'], name='patient_name_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['date_of_birth', 'first_name_key'], name='patient_birth_first_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['date_of_birth', 'last_name_key'], name='patient_birth_last_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['phone_key'], name='patient_phone_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['email_key'], name='patient_email_key_idx'),
+        ),
+    ]
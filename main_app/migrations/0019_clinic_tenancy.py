@@ -0,0 +1,137 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:50
+
+import django.db.models.deletion
+from django.core.management.color import no_style
+from django.db import migrations, models
+
+DEFAULT_CLINIC_ID = 1
+
+
+def create_default_clinic(apps, schema_editor):
+    """Existing rows become the first clinic, with the primary key the tenant fields default to."""
+    Clinic = apps.get_model("main_app", "Clinic")
+    Clinic.objects.get_or_create(pk=DEFAULT_CLINIC_ID, defaults={"name": "Clinic", "slug": "default"})
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Clinic]):
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main_app', '0018_attachments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Clinic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(create_default_clinic, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_scheduled_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patient_name_key_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patient_birth_first_key_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patient_birth_last_key_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patient_phone_key_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patient_email_key_idx',
+        ),
+        migrations.AlterField(
+            model_name='room',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        # A constant default fills existing rows without rewriting the tables on PostgreSQL 11+.
+        migrations.AddField(
+            model_name='appointment',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, default=1, on_delete=django.db.models.deletion.PROTECT, related_name='appointments', to='main_app.clinic'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, default=1, on_delete=django.db.models.deletion.PROTECT, related_name='patients', to='main_app.clinic'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, default=1, on_delete=django.db.models.deletion.PROTECT, related_name='reports', to='main_app.clinic'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, default=1, on_delete=django.db.models.deletion.PROTECT, related_name='rooms', to='main_app.clinic'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, default=1, on_delete=django.db.models.deletion.PROTECT, related_name='users', to='main_app.clinic'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['tenant', 'date_time'], name='appointment_tenant_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'scheduled')), fields=['tenant', 'date_time'], name='appointment_scheduled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'id'], name='patient_tenant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'last_name_key', 'first_name_key', 'date_of_birth'], name='patient_name_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'date_of_birth', 'first_name_key'], name='patient_birth_first_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'date_of_birth', 'last_name_key'], name='patient_birth_last_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'phone_key'], name='patient_phone_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'email_key'], name='patient_email_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['tenant', 'created_at'], name='report_tenant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['tenant', 'role'], name='user_tenant_role_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='room',
+            constraint=models.UniqueConstraint(fields=('tenant', 'name'), name='room_tenant_name_unique'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+import json
+import zlib
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def pack(value):
+    """Same encoding as ``report_history.pack``, frozen here for the migration."""
+    raw = json.dumps(value, separators=(",", ":")).encode()
+    compressed = zlib.compress(raw, 6)
+    return b"z" + compressed if len(compressed) < len(raw) else b"j" + raw
+
+
+def snapshot_unversioned_reports(apps, schema_editor):
+    """Reports written before versioning get their current text as version 1, so edits diff against it."""
+    Report = apps.get_model("main_app", "Report")
+    ReportDiagnosis = apps.get_model("main_app", "ReportDiagnosis")
+    ReportVersion = apps.get_model("main_app", "ReportVersion")
+
+    while True:
+        rows = list(Report.objects.filter(version=0).order_by("pk").values_list("pk", "doctor_id")[:BATCH_SIZE])
+        if not rows:
+            return
+        texts = dict(
+            ReportDiagnosis.objects.filter(report_id__in=[pk for pk, _ in rows]).values_list("report_id", "text")
+        )
+        with transaction.atomic():
+            ReportVersion.objects.bulk_create(
+                [
+                    ReportVersion(report_id=pk, number=1, kind="snapshot", data=pack(texts.get(pk) or ""), author_id=doctor)
+                    for pk, doctor in rows
+                ],
+                ignore_conflicts=True,
+            )
+            Report.objects.filter(pk__in=[pk for pk, _ in rows]).update(version=1)
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own so large tables are not locked for the whole backfill.
+    atomic = False
+
+    dependencies = [
+        ('main_app', '0019_clinic_tenancy'),
+    ]
+
+    operations = [
+        migrations.RunPython(snapshot_unversioned_reports, migrations.RunPython.noop),
+    ]
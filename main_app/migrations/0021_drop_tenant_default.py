@@ -0,0 +1,39 @@
+# Generated by Django 5.2.9 on 2026-10-19 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0020_report_initial_versions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='appointments', to='main_app.clinic'),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='patients', to='main_app.clinic'),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='reports', to='main_app.clinic'),
+        ),
+        migrations.AlterField(
+            model_name='room',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='rooms', to='main_app.clinic'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='users', to='main_app.clinic'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# Expression indexes for the user admin's prefix (^) searches, as in
+# migration 0015 for patients. There are only a few roles, so the exact (=)
+# role search needs none.
+SEARCH_INDEXES = [
+    ("user_email_search_idx", 'UPPER("email"::text) text_pattern_ops'),
+    ("user_first_name_search_idx", 'UPPER("first_name"::text) text_pattern_ops'),
+    ("user_last_name_search_idx", 'UPPER("last_name"::text) text_pattern_ops'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, expression in SEARCH_INDEXES:
+        schema_editor.execute(f'CREATE INDEX "{name}" ON "main_app_user" ({expression})')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0021_drop_tenant_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+TABLE = "main_app_auditevent"
+
+# A B-tree on (patient_min, patient_max) can only bound patient_min, so a
+# lookup for a high patient id scans nearly every list event. A GiST index
+# over the span as a range finds the events whose span holds the id.
+# Partial, as single-patient events have no span and would match every id.
+CREATE_INDEX = (
+    f'CREATE INDEX "audit_patient_span_idx" ON "{TABLE}" '
+    "USING gist (int8range(patient_min, patient_max, '[]')) WHERE patient_min IS NOT NULL"
+)
+
+
+def create_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(CREATE_INDEX)
+
+
+def drop_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS "audit_patient_span_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0022_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_span_index, drop_span_index),
+    ]
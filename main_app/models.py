@@ -1,7 +1,36 @@
-from django.db import models
+import zlib
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser,BaseUserManager
 
+from .matching import match_keys
+
+
+# Created by migration 0019, which moved every row from before tenancy into it.
+DEFAULT_CLINIC_ID = 1
+
+
+class Clinic(models.Model):
+    """A tenant: one clinic of a shared deployment. Every user and record belongs to exactly one."""
+    name = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
 
+def tenant_field(related_name):
+    # No default: a row saved without its clinic must fail, not land in another clinic.
+    # Not indexed on its own: every table leads its composite indexes with it instead.
+    return models.ForeignKey(
+        Clinic,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name=related_name,
+    )
 
 
 
@@ -11,6 +40,12 @@ class UserManager(BaseUserManager):
         if not email:
             raise ValueError("Email is required")
         email = self.normalize_email(email)
+        # createsuperuser passes the clinic's primary key.
+        tenant = extra_fields.pop("tenant", None)
+        if tenant is not None:
+            extra_fields["tenant_id"] = getattr(tenant, "pk", tenant)
+        if extra_fields.get("tenant_id") is None:
+            raise ValueError("Clinic is required")
         user = self.model(email=email, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
@@ -33,6 +68,7 @@ class User(AbstractUser):
 
     username = None
     email = models.EmailField(unique=True)
+    tenant = tenant_field("users")
 
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -49,27 +85,165 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
 
     USERNAME_FIELD = "email"
-    REQUIRED_FIELDS = ["first_name", "last_name", "role"]
+    REQUIRED_FIELDS = ["first_name", "last_name", "role", "tenant"]
 
     
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["tenant", "role"], name="user_tenant_role_idx"),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.role})"
 
 
-class Patient(models.Model):
+PREVIEW_LENGTH = 200
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text column stored zlib-compressed; reads and writes ``str``. Short texts
+    that would not shrink are kept as UTF-8 behind a one-byte marker.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        value = bytes(value)
+        body = zlib.decompress(value[1:]) if value[:1] == b"z" else value[1:]
+        return body.decode()
+
+    def to_python(self, value):
+        return value
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, str):
+            raw = value.encode()
+            compressed = zlib.compress(raw, 6)
+            value = b"z" + compressed if len(compressed) < len(raw) else b"t" + raw
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+def side_text(name):
+    """
+    Property for a long text kept in a one-to-one side table (see
+    ``SideTextMixin``). The body is read on first access; assigning it keeps
+    ``<name>_preview`` and ``<name>_length`` on the main row in step.
+    """
+    cache = f"_{name}_text"
+
+    def get_text(self):
+        if cache not in self.__dict__:
+            body = None
+            if self.pk is not None:
+                try:
+                    body = getattr(self, self.side_texts[name]).text
+                except ObjectDoesNotExist:
+                    pass
+            self.__dict__[cache] = body
+        return self.__dict__[cache]
+
+    def set_text(self, value):
+        self.__dict__[cache] = value
+        setattr(self, f"{name}_preview", (value or "")[:PREVIEW_LENGTH])
+        setattr(self, f"{name}_length", len(value or ""))
+        self.__dict__.setdefault("_dirty_texts", set()).add(name)
+
+    return property(get_text, set_text)
+
+
+class SideTextMixin:
+    """
+    Keeps long texts out of the main row. ``side_texts`` maps each text to the
+    reverse accessor of its side table; list queries only ever touch the
+    preview and length columns, and ``save()`` writes changed bodies in the
+    same transaction as the row. ``bulk_create()`` does not, so it refuses
+    instances with texts set (see ``SideTextQuerySet``).
+    """
+    side_texts = {}
+
+    def save(self, *args, **kwargs):
+        dirty = self.__dict__.get("_dirty_texts", set())
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            texts = update_fields.intersection(self.side_texts)
+            dirty = dirty & texts
+            for name in texts:
+                update_fields.discard(name)
+                update_fields.update((f"{name}_preview", f"{name}_length"))
+            kwargs["update_fields"] = update_fields
+
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+            for name in dirty:
+                self.save_side_text(name)
+        self.__dict__.get("_dirty_texts", set()).difference_update(dirty)
+
+    def save_side_text(self, name):
+        relation = self._meta.get_field(self.side_texts[name])
+        side = relation.related_model
+        text = self.__dict__[f"_{name}_text"]
+        if relation.is_cached(self):
+            relation.delete_cached_value(self)
+        if text is None:
+            side.objects.filter(pk=self.pk).delete()
+        elif not side.objects.filter(pk=self.pk).update(text=text):
+            side.objects.create(pk=self.pk, text=text)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        for name in self.side_texts:
+            self.__dict__.pop(f"_{name}_text", None)
+        self.__dict__.pop("_dirty_texts", None)
+
+
+class SideTextQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Raises rather than silently dropping side texts; bulk-create the side table rows alongside instead."""
+        objs = list(objs)
+        if any(obj.__dict__.get("_dirty_texts") for obj in objs):
+            raise ValueError(
+                f"bulk_create() does not write {self.model.__name__} side texts; "
+                "create their side table rows separately."
+            )
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class PatientQuerySet(SideTextQuerySet):
+    def for_user(self, user):
+        """Admins see every patient of their clinic, doctors their own and booked ones, nurses their assigned ones."""
+        if user.is_superuser:
+            return self
+        if user.role == User.Roles.ADMIN:
+            return self.filter(tenant=user.tenant_id)
+        if user.role == User.Roles.DOCTOR:
+            booked = Appointment.objects.filter(doctor=user).values("patient_id")
+            return self.filter(models.Q(doctor=user) | models.Q(id__in=booked))
+        if user.role == User.Roles.NURSE:
+            return self.filter(id__in=Appointment.objects.filter(nurse=user).values("patient_id"))
+        return self.none()
+
+
+class Patient(SideTextMixin, models.Model):
     class Gender(models.TextChoices):
         MALE = "M", "Male"
         FEMALE = "F", "Female"
 
+    tenant = tenant_field("patients")
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
     phone = models.CharField(max_length=50, blank=True, null=True)
     address = models.CharField(max_length=200, blank=True, null=True)
-    medical_history = models.TextField(blank=True, null=True)
+    medical_history_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default="", editable=False)
+    medical_history_length = models.PositiveIntegerField(default=0, editable=False)
 
     doctor = models.ForeignKey(
         User,
@@ -89,15 +263,144 @@ class Patient(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Blocking keys for duplicate detection, kept in step by save() (see matching.py).
+    first_name_key = models.CharField(max_length=4, blank=True, default="", editable=False)
+    last_name_key = models.CharField(max_length=4, blank=True, default="", editable=False)
+    phone_key = models.CharField(max_length=20, blank=True, default="", editable=False)
+    email_key = models.CharField(max_length=254, blank=True, default="", editable=False)
+
+    objects = PatientQuerySet.as_manager()
+
+    side_texts = {"medical_history": "medical_history_body"}
+    medical_history = side_text("medical_history")
+
+    MATCH_SOURCES = {"first_name", "last_name", "phone", "email"}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tenant", "id"], name="patient_tenant_idx"),
+            models.Index(
+                fields=["tenant", "last_name_key", "first_name_key", "date_of_birth"], name="patient_name_key_idx"
+            ),
+            models.Index(fields=["tenant", "date_of_birth", "first_name_key"], name="patient_birth_first_key_idx"),
+            models.Index(fields=["tenant", "date_of_birth", "last_name_key"], name="patient_birth_last_key_idx"),
+            models.Index(fields=["tenant", "phone_key"], name="patient_phone_key_idx"),
+            models.Index(fields=["tenant", "email_key"], name="patient_email_key_idx"),
+        ]
+
+    def set_match_keys(self):
+        for name, value in match_keys(self.first_name, self.last_name, self.phone, self.email).items():
+            setattr(self, name, value)
+
+    def save(self, *args, **kwargs):
+        self.set_match_keys()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.MATCH_SOURCES.intersection(update_fields):
+            kwargs["update_fields"] = {*update_fields, "first_name_key", "last_name_key", "phone_key", "email_key"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+
+class PatientMedicalHistory(models.Model):
+    patient = models.OneToOneField(
+        Patient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="medical_history_body"
+    )
+    text = CompressedTextField()
+
+class WorkingHours(models.Model):
+    class Weekday(models.IntegerChoices):
+        MONDAY = 0, "Monday"
+        TUESDAY = 1, "Tuesday"
+        WEDNESDAY = 2, "Wednesday"
+        THURSDAY = 3, "Thursday"
+        FRIDAY = 4, "Friday"
+        SATURDAY = 5, "Saturday"
+        SUNDAY = 6, "Sunday"
+
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        limit_choices_to={"role": "DOCTOR"},
+        related_name="working_hours"
+    )
+
+    weekday = models.PositiveSmallIntegerField(choices=Weekday.choices)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        ordering = ["doctor", "weekday", "start_time"]
+
+    def __str__(self):
+        return f"{self.doctor} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+
+class ScheduleException(models.Model):
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        limit_choices_to={"role": "DOCTOR"},
+        related_name="schedule_exceptions"
+    )
+
+    date = models.DateField()
+    start_time = models.TimeField(
+        blank=True,
+        null=True,
+        help_text="Leave start and end empty for a whole day off."
+    )
+    end_time = models.TimeField(blank=True, null=True)
+    reason = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "date"], name="schedule_exception_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} off on {self.date}"
+
+
+class Room(models.Model):
+    tenant = tenant_field("rooms")
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tenant", "name"], name="room_tenant_name_unique"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def for_user(self, user):
+        if user.is_superuser:
+            return self
+        if user.role == User.Roles.ADMIN:
+            return self.filter(tenant=user.tenant_id)
+        if user.role == User.Roles.DOCTOR:
+            return self.filter(doctor=user)
+        if user.role == User.Roles.NURSE:
+            return self.filter(nurse=user)
+        return self.none()
+
+
 class Appointment(models.Model):
     class Status(models.TextChoices):
         SCHEDULED = "scheduled", "Scheduled"
         COMPLETED = "completed", "Completed"
         CANCELLED = "cancelled", "Cancelled"
 
+    tenant = tenant_field("appointments")
+
     patient = models.ForeignKey(
         Patient,
         on_delete=models.CASCADE,
@@ -122,6 +425,14 @@ class Appointment(models.Model):
         related_name="nurse_appointments"
     )
 
+    room = models.ForeignKey(
+        Room,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="appointments"
+    )
+
     date_time = models.DateTimeField()
 
     status = models.CharField(
@@ -131,12 +442,41 @@ class Appointment(models.Model):
     )
     
 
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AppointmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "date_time"], name="appointment_doctor_time_idx"),
+            models.Index(fields=["nurse", "date_time"], name="appointment_nurse_time_idx"),
+            models.Index(fields=["tenant", "date_time"], name="appointment_tenant_time_idx"),
+            # Unscoped, for the admin site's date hierarchy across clinics.
+            models.Index(fields=["date_time"], name="appointment_date_time_idx"),
+            models.Index(
+                fields=["tenant", "date_time"],
+                name="appointment_scheduled_idx",
+                condition=models.Q(status="scheduled"),
+            ),
+            models.Index(
+                fields=["date_time"],
+                name="appointment_reminder_due_idx",
+                condition=models.Q(status="scheduled", reminder_sent_at__isnull=True),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.patient} - {self.date_time}"
 
-class Report(models.Model):
+class Report(SideTextMixin, models.Model):
+    class Status(models.TextChoices):
+        DRAFT = "draft", "Draft"
+        FINAL = "final", "Final"
+
+    tenant = tenant_field("reports")
+
     patient = models.ForeignKey(
         Patient,
         on_delete=models.CASCADE,
@@ -162,11 +502,304 @@ class Report(models.Model):
     )
 
    
-    diagnosis = models.TextField()
+    diagnosis_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default="", editable=False)
+    diagnosis_length = models.PositiveIntegerField(default=0, editable=False)
     appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, related_name="report",null = True)
 
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.DRAFT
+    )
+    version = models.PositiveIntegerField(default=0)
+    finalized_at = models.DateTimeField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
+    side_texts = {"diagnosis": "diagnosis_body"}
+    diagnosis = side_text("diagnosis")
+
+    objects = SideTextQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tenant", "created_at"], name="report_tenant_created_idx"),
+            models.Index(fields=["created_at"], name="report_created_at_idx"),
+        ]
+
     def __str__(self):
         return f"Report for {self.patient} ({self.created_at.date()})"
 
+
+class ReportDiagnosis(models.Model):
+    report = models.OneToOneField(
+        Report,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="diagnosis_body"
+    )
+    text = CompressedTextField()
+
+
+class ReportVersion(models.Model):
+    """
+    One saved state of ``Report.diagnosis``. Snapshots hold the full text,
+    deltas the splices against the previous version; both zlib-compressed.
+    """
+    class Kind(models.TextChoices):
+        SNAPSHOT = "snapshot", "Snapshot"
+        DELTA = "delta", "Delta"
+
+    report = models.ForeignKey(
+        Report,
+        on_delete=models.CASCADE,
+        related_name="versions"
+    )
+    number = models.PositiveIntegerField()
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    data = models.BinaryField()
+
+    author = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["report", "number"], name="report_version_number_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.report} v{self.number}"
+
+
+class AttachmentQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """Attachments of the patients the user can see, plus those on their own reports."""
+        if user.is_superuser:
+            return self
+        if user.role == User.Roles.ADMIN:
+            return self.filter(patient__tenant=user.tenant_id)
+        visible = Patient.objects.for_user(user).values("id")
+        return self.filter(models.Q(patient__in=visible) | models.Q(report__doctor=user))
+
+
+class Attachment(models.Model):
+    """
+    A file attached to a patient or one of their reports, uploaded in chunks
+    (see ``attachments.py``). ``received`` counts the bytes stored so far.
+    """
+    class Status(models.TextChoices):
+        UPLOADING = "uploading", "Uploading"
+        COMPLETE = "complete", "Complete"
+
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="attachments"
+    )
+
+    report = models.ForeignKey(
+        Report,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="attachments"
+    )
+
+    uploaded_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+    received = models.PositiveBigIntegerField(default=0)
+    storage_key = models.CharField(max_length=64, unique=True, editable=False)
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.UPLOADING
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = AttachmentQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(patient__isnull=False) | models.Q(report__isnull=False),
+                name="attachment_has_owner",
+            ),
+        ]
+
+    def __str__(self):
+        return self.filename
+
+
+class WaitlistEntry(models.Model):
+    class Status(models.TextChoices):
+        WAITING = "waiting", "Waiting"
+        OFFERED = "offered", "Offered"
+        BOOKED = "booked", "Booked"
+        CANCELLED = "cancelled", "Cancelled"
+
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name="waitlist_entries"
+    )
+
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        limit_choices_to={"role": "DOCTOR"},
+        related_name="waitlist_entries",
+        help_text="Leave empty to accept any doctor with the given specialization."
+    )
+
+    specialization = models.CharField(max_length=200, blank=True, null=True)
+
+    auto_book = models.BooleanField(
+        default=True,
+        help_text="Book a freed slot straight away instead of offering it first."
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.WAITING
+    )
+
+    offered_doctor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    offered_date_time = models.DateTimeField(null=True, blank=True)
+    offered_nurse = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    appointment = models.OneToOneField(
+        Appointment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="waitlist_entry"
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["doctor", "created_at", "id"],
+                name="waitlist_doctor_queue_idx",
+                condition=models.Q(status="waiting"),
+            ),
+            models.Index(
+                fields=["specialization", "created_at", "id"],
+                name="waitlist_spec_queue_idx",
+                condition=models.Q(status="waiting", doctor__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} waiting for {self.doctor or self.specialization}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client-chosen ``Idempotency-Key`` and the response its request got,
+    replayed to retries until ``expires_at`` (see ``idempotency.py``).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="idempotency_key_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotency_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
+
+
+class AuditEvent(models.Model):
+    """
+    Append-only record of who read or changed clinical records.
+
+    User and patient ids are plain integers rather than foreign keys so the
+    log outlives deleted rows. List reads are stored as id ranges
+    (``[[first, last], ...]``). Events about exactly one patient set
+    ``patient_id``; events spanning several patients set ``patient_min`` /
+    ``patient_max`` and ``patient_ranges`` instead. On PostgreSQL the table is
+    partitioned by month on ``occurred_at`` (see migration 0013) and the spans
+    have a GiST index (see migration 0023).
+    """
+    occurred_at = models.DateTimeField()
+    user_id = models.BigIntegerField(null=True)
+    action = models.CharField(max_length=30)
+    model = models.CharField(max_length=30)
+    object_ranges = models.JSONField()
+    object_count = models.PositiveIntegerField()
+    patient_id = models.BigIntegerField(null=True)
+    patient_min = models.BigIntegerField(null=True)
+    patient_max = models.BigIntegerField(null=True)
+    patient_ranges = models.JSONField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_id", "occurred_at"], name="audit_user_idx"),
+            models.Index(fields=["patient_id", "occurred_at"], name="audit_patient_idx"),
+            models.Index(fields=["patient_min", "patient_max"], name="audit_patient_range_idx"),
+            models.Index(fields=["occurred_at"], name="audit_occurred_at_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Audit events are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Audit events are append-only.")
+
+    def __str__(self):
+        return f"{self.user_id} {self.action} {self.model} ({self.object_count})"
@@ -0,0 +1,194 @@
+"""
+Appointment reminders.
+
+Emails go through Django's EMAIL_BACKEND, text messages through
+REMINDER_SMS_BACKEND. Appointments are claimed in batches by stamping
+``reminder_sent_at`` before anything is sent, so a reminder goes out at most
+once even with several schedulers running.
+"""
+import json
+import logging
+import sys
+import threading
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Appointment
+
+logger = logging.getLogger(__name__)
+
+
+class SmsMessage:
+    def __init__(self, to, body):
+        self.to = to
+        self.body = body
+
+    def as_dict(self):
+        return {"to": self.to, "body": self.body}
+
+
+class BaseSmsBackend:
+    def __init__(self, fail_silently=False, **kwargs):
+        self.fail_silently = fail_silently
+
+    def send_messages(self, messages):
+        raise NotImplementedError("Subclasses must implement send_messages().")
+
+
+class ConsoleSmsBackend(BaseSmsBackend):
+    def __init__(self, stream=None, **kwargs):
+        super().__init__(**kwargs)
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def send_messages(self, messages):
+        with self._lock:
+            for message in messages:
+                self.stream.write(f"SMS to {message.to}: {message.body}\n")
+            self.stream.flush()
+        return len(messages)
+
+
+class FileSmsBackend(BaseSmsBackend):
+    """Appends one JSON line per message to REMINDER_SMS_FILE_PATH."""
+
+    def __init__(self, file_path=None, **kwargs):
+        super().__init__(**kwargs)
+        self.file_path = file_path or settings.REMINDER_SMS_FILE_PATH
+
+    def send_messages(self, messages):
+        with open(self.file_path, "a", encoding="utf-8") as fh:
+            for message in messages:
+                fh.write(json.dumps(message.as_dict()) + "\n")
+        return len(messages)
+
+
+sms_outbox = []
+
+
+class LocmemSmsBackend(BaseSmsBackend):
+    """Keeps messages in ``sms_outbox``; meant for tests."""
+
+    def send_messages(self, messages):
+        sms_outbox.extend(messages)
+        return len(messages)
+
+
+def get_sms_connection(backend=None, **kwargs):
+    klass = import_string(backend or settings.REMINDER_SMS_BACKEND)
+    return klass(**kwargs)
+
+
+def due_appointments(now=None):
+    """Scheduled, not yet reminded appointments starting within the reminder window."""
+    now = now or timezone.now()
+    return Appointment.objects.filter(
+        status=Appointment.Status.SCHEDULED,
+        reminder_sent_at__isnull=True,
+        date_time__gte=now,
+        date_time__lt=now + settings.REMINDER_WINDOW,
+    ).order_by("date_time")
+
+
+def claim_batch(now=None, batch_size=None):
+    """
+    Stamp the next batch of due appointments as reminded and return their ids.
+
+    Rows locked by another scheduler are skipped, so concurrent runs never
+    claim the same appointment twice.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+
+    with transaction.atomic():
+        ids = list(
+            due_appointments(now)
+            .select_for_update(skip_locked=True)
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if ids:
+            Appointment.objects.filter(
+                id__in=ids, reminder_sent_at__isnull=True
+            ).update(reminder_sent_at=now)
+    return ids
+
+
+def reminder_text(appointment):
+    when = timezone.localtime(appointment.date_time).strftime("%d.%m.%Y %H:%M")
+    doctor = appointment.doctor
+    with_doctor = f" with Dr. {doctor.first_name} {doctor.last_name}" if doctor else ""
+    return f"Reminder: you have an appointment{with_doctor} on {when}."
+
+
+def build_messages(appointments):
+    emails, sms = [], []
+    for appointment in appointments:
+        patient = appointment.patient
+        if patient is None:
+            continue
+        body = reminder_text(appointment)
+        if patient.email:
+            emails.append(EmailMessage(
+                subject="Appointment reminder",
+                body=body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[patient.email],
+            ))
+        if patient.phone:
+            sms.append(SmsMessage(patient.phone, body))
+    return emails, sms
+
+
+def notify_patient(patient, subject, body):
+    """Send a one-off message to a patient over every channel they have."""
+    if patient.email:
+        EmailMessage(
+            subject=subject,
+            body=body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[patient.email],
+        ).send(fail_silently=True)
+    if patient.phone:
+        get_sms_connection(fail_silently=True).send_messages([SmsMessage(patient.phone, body)])
+
+
+def send_due_reminders(now=None, batch_size=None):
+    """Send reminders for every due appointment; returns the number of appointments reminded."""
+    now = now or timezone.now()
+    email_connection = get_connection()
+    sms_connection = get_sms_connection()
+    reminded = 0
+
+    while True:
+        ids = claim_batch(now, batch_size)
+        if not ids:
+            break
+
+        appointments = (
+            Appointment.objects.filter(id__in=ids)
+            .select_related("patient", "doctor")
+            .only(
+                "date_time",
+                "patient__email", "patient__phone",
+                "doctor__first_name", "doctor__last_name",
+            )
+        )
+        emails, sms = build_messages(appointments)
+
+        try:
+            if emails:
+                email_connection.send_messages(emails)
+            if sms:
+                sms_connection.send_messages(sms)
+        except Exception:
+            # Claims stay in place: a lost reminder beats a duplicate one.
+            logger.exception("Sending reminders failed for appointments %s", ids)
+            continue
+
+        reminded += len(ids)
+
+    return reminded
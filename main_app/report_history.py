@@ -0,0 +1,153 @@
+"""
+Versioned report text.
+
+Every change to ``Report.diagnosis`` appends a ``ReportVersion``. Versions
+are stored as splices ``[start, end, text]`` against the previous text,
+with a full snapshot every REPORT_SNAPSHOT_INTERVAL versions, so rebuilding
+any version replays at most that many small deltas. Autosave clients send
+the splices themselves and the server never has to diff.
+"""
+import difflib
+import json
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Report, ReportVersion
+
+
+class ReportLocked(Exception):
+    pass
+
+
+class VersionConflict(Exception):
+    def __init__(self, current_version):
+        super().__init__(f"Report is at version {current_version}.")
+        self.current_version = current_version
+
+
+def pack(value):
+    """JSON, zlib-compressed unless that makes it bigger (typical for one-keystroke deltas)."""
+    raw = json.dumps(value, separators=(",", ":")).encode()
+    compressed = zlib.compress(raw, 6)
+    return b"z" + compressed if len(compressed) < len(raw) else b"j" + raw
+
+
+def unpack(data):
+    data = bytes(data)
+    body = zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:]
+    return json.loads(body)
+
+
+def diff(old, new):
+    """Splices turning ``old`` into ``new``."""
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    return [
+        [i1, i2, new[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def validate_splices(text, splices):
+    """Raise ``ValueError`` unless ``splices`` are sorted, non-overlapping and inside ``text``."""
+    if not isinstance(splices, list):
+        raise ValueError("ops must be a list of [start, end, text] items.")
+    position = 0
+    for splice in splices:
+        if (
+            not isinstance(splice, list) or len(splice) != 3
+            or not isinstance(splice[0], int) or not isinstance(splice[1], int)
+            or not isinstance(splice[2], str)
+        ):
+            raise ValueError("Each op must be [start, end, text].")
+        start, end, _ = splice
+        if start < position or end < start or end > len(text):
+            raise ValueError("ops must be sorted, non-overlapping and within the base text.")
+        position = end
+
+
+def apply_splices(text, splices):
+    parts = []
+    position = 0
+    for start, end, insert in splices:
+        parts.append(text[position:start])
+        parts.append(insert)
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def record_version(report, old_text, author=None, splices=None):
+    """
+    Store ``report.diagnosis`` as the next version. ``splices`` may be given
+    when they are already known; otherwise they are diffed from ``old_text``.
+    """
+    number = report.version + 1
+    if number == 1 or (number - 1) % settings.REPORT_SNAPSHOT_INTERVAL == 0:
+        kind, data = ReportVersion.Kind.SNAPSHOT, pack(report.diagnosis)
+    else:
+        if splices is None:
+            splices = diff(old_text, report.diagnosis)
+        kind, data = ReportVersion.Kind.DELTA, pack(splices)
+
+    ReportVersion.objects.create(report=report, number=number, kind=kind, data=data, author=author)
+    report.version = number
+    Report.objects.filter(pk=report.pk).update(version=number)
+    return number
+
+
+def autosave(report, base_version, splices, author=None):
+    """Apply ``splices`` made against ``base_version``; returns ``(new version, new text)``."""
+    with transaction.atomic():
+        report = Report.objects.select_for_update().get(pk=report.pk)
+        if report.status == Report.Status.FINAL:
+            raise ReportLocked
+        if report.version != base_version:
+            raise VersionConflict(report.version)
+
+        validate_splices(report.diagnosis, splices)
+        old_text = report.diagnosis
+        report.diagnosis = apply_splices(old_text, splices)
+        report.save(update_fields=["diagnosis"])
+        return record_version(report, old_text, author, splices), report.diagnosis
+
+
+def replace_text(report, text, author=None):
+    """Replace the whole diagnosis with ``text`` under the report's row lock; returns the locked report."""
+    with transaction.atomic():
+        report = Report.objects.select_for_update().get(pk=report.pk)
+        old_text = report.diagnosis
+        if text == old_text:
+            return report
+        if report.status == Report.Status.FINAL:
+            raise ReportLocked
+
+        report.diagnosis = text
+        report.save(update_fields=["diagnosis"])
+        record_version(report, old_text, author)
+        return report
+
+
+def text_at(report, number):
+    """Diagnosis text as of version ``number``, or ``None`` if there is no such version."""
+    snapshot = (
+        report.versions.filter(number__lte=number, kind=ReportVersion.Kind.SNAPSHOT)
+        .order_by("-number")
+        .values_list("number", "data")
+        .first()
+    )
+    if snapshot is None or number > report.version:
+        return None
+
+    base_number, data = snapshot
+    text = unpack(data)
+    deltas = (
+        report.versions.filter(number__gt=base_number, number__lte=number)
+        .order_by("number")
+        .values_list("data", flat=True)
+    )
+    for delta in deltas:
+        text = apply_splices(text, unpack(delta))
+    return text
@@ -0,0 +1,374 @@
+"""
+Doctor schedules and slot search.
+
+A doctor's ``WorkingHours`` and upcoming ``ScheduleException`` rows are
+compiled once into per-weekday slot templates and kept in the cache until the
+schedule changes (see ``signals.py``). Doctors without working hours get the
+clinic default of 08:00-20:00 in 30 minute slots, every day.
+
+Availability is the day's template minus bookings. Days are represented as
+integer bitmasks over the minutes of the day: bit ``m`` set means a slot
+starts at minute ``m``. Doctors, nurses and rooms are then combined with
+plain bitwise AND/OR, using a single query for all bookings in a date range.
+A booking lasts as long as its doctor's slot, so nurses and rooms, which are
+shared between doctors with different slot lengths, are busy for every minute
+it covers.
+"""
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import User, Appointment, Room, WorkingHours, ScheduleException
+
+WORKDAY_START = time(8, 0)
+WORKDAY_END = time(20, 0)
+SLOT_MINUTES = 30
+MIN_SLOT_MINUTES = 5
+MAX_SLOT_MINUTES = 240
+
+MINUTES_PER_DAY = 24 * 60
+FULL_DAY = (1 << MINUTES_PER_DAY) - 1
+
+CACHE_KEY = "doctor-schedule:{}"
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def minute_of(value):
+    return value.hour * 60 + value.minute
+
+
+def slot_template(start, end, slot_minutes):
+    slots = []
+    minute = minute_of(start)
+    while minute + slot_minutes <= minute_of(end):
+        slots.append((minute, slot_minutes))
+        minute += slot_minutes
+    return slots
+
+
+def default_weekdays():
+    template = tuple(slot_template(WORKDAY_START, WORKDAY_END, SLOT_MINUTES))
+    return {weekday: template for weekday in range(7)}
+
+
+def compile_schedules(doctor_ids):
+    """
+    Build ``{doctor_id: {"weekdays": {weekday: ((start, length), ...)},
+    "exceptions": {date: ((start, end), ...)}}}`` with two queries.
+    """
+    weekdays = {doctor_id: {} for doctor_id in doctor_ids}
+    hours = WorkingHours.objects.filter(doctor_id__in=doctor_ids).values_list(
+        "doctor_id", "weekday", "start_time", "end_time", "slot_minutes"
+    )
+    for doctor_id, weekday, start, end, slot_minutes in hours:
+        weekdays[doctor_id].setdefault(weekday, []).extend(slot_template(start, end, slot_minutes))
+
+    exceptions = {doctor_id: {} for doctor_id in doctor_ids}
+    rows = ScheduleException.objects.filter(
+        doctor_id__in=doctor_ids,
+        date__gte=timezone.localdate() - timedelta(days=1),
+    ).values_list("doctor_id", "date", "start_time", "end_time")
+    for doctor_id, day, start, end in rows:
+        blocked = (
+            minute_of(start) if start else 0,
+            minute_of(end) if end else MINUTES_PER_DAY,
+        )
+        exceptions[doctor_id].setdefault(day, []).append(blocked)
+
+    schedules = {}
+    for doctor_id in doctor_ids:
+        if weekdays[doctor_id]:
+            compiled = {wd: tuple(sorted(slots)) for wd, slots in weekdays[doctor_id].items()}
+        else:
+            compiled = default_weekdays()
+        schedules[doctor_id] = {
+            "weekdays": compiled,
+            "exceptions": {day: tuple(blocks) for day, blocks in exceptions[doctor_id].items()},
+        }
+    return schedules
+
+
+def get_schedules(doctor_ids):
+    """Compiled schedules for ``doctor_ids``, served from the cache where possible."""
+    doctor_ids = list(doctor_ids)
+    keys = {CACHE_KEY.format(doctor_id): doctor_id for doctor_id in doctor_ids}
+    cached = cache.get_many(keys)
+    schedules = {keys[key]: value for key, value in cached.items()}
+
+    missing = [doctor_id for doctor_id in doctor_ids if doctor_id not in schedules]
+    if missing:
+        compiled = compile_schedules(missing)
+        cache.set_many(
+            {CACHE_KEY.format(doctor_id): value for doctor_id, value in compiled.items()},
+            CACHE_TIMEOUT,
+        )
+        schedules.update(compiled)
+    return schedules
+
+
+def invalidate_schedule(doctor_id):
+    cache.delete(CACHE_KEY.format(doctor_id))
+
+
+def day_slots(schedule, day):
+    """``(start, length)`` slots for ``day`` after removing exceptions."""
+    slots = schedule["weekdays"].get(day.weekday(), ())
+    blocks = schedule["exceptions"].get(day)
+    if not blocks:
+        return slots
+    return tuple(
+        (start, length) for start, length in slots
+        if not any(start < block_end and start + length > block_start
+                   for block_start, block_end in blocks)
+    )
+
+
+def slot_length(slots, minute):
+    """Length of the slot starting at ``minute``, or ``None`` if no slot starts then."""
+    index = bisect_right(slots, (minute, MINUTES_PER_DAY)) - 1
+    if index >= 0 and slots[index][0] == minute:
+        return slots[index][1]
+    return None
+
+
+def containing_slot(slots, minute):
+    """Start of the slot covering ``minute``, or ``None``."""
+    index = bisect_right(slots, (minute, MINUTES_PER_DAY)) - 1
+    if index >= 0 and minute < slots[index][0] + slots[index][1]:
+        return slots[index][0]
+    return None
+
+
+def free_mask(slots, booked_minutes):
+    """Template minus bookings, as a bitmask of free slot starts."""
+    taken = {containing_slot(slots, minute) for minute in booked_minutes}
+    mask = 0
+    for start, _ in slots:
+        if start not in taken:
+            mask |= 1 << start
+    return mask
+
+
+def iter_minutes(mask):
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        yield bit.bit_length() - 1
+
+
+def to_datetime(day, minute):
+    return timezone.make_aware(datetime.combine(day, time(minute // 60, minute % 60)))
+
+
+def local_minute(dt):
+    """``(date, minute of day)`` of ``dt``, or ``(date, None)`` if not on a whole minute."""
+    local = timezone.localtime(dt)
+    if local.second or local.microsecond:
+        return local.date(), None
+    return local.date(), minute_of(local)
+
+
+def open_mask(day, now):
+    """Minutes of ``day`` that are still in the future."""
+    today = timezone.localdate(now)
+    if day < today:
+        return 0
+    if day > today:
+        return FULL_DAY
+    first_open = minute_of(timezone.localtime(now)) + 1
+    return FULL_DAY & ~((1 << first_open) - 1)
+
+
+def doctor_slot(doctor_id, date_time):
+    """``(start, end)`` of the doctor's slot beginning at ``date_time``, or ``None``."""
+    day, minute = local_minute(date_time)
+    if minute is None:
+        return None
+    length = slot_length(day_slots(get_schedules([doctor_id])[doctor_id], day), minute)
+    if length is None:
+        return None
+    return date_time, date_time + timedelta(minutes=length)
+
+
+def booking_end(doctor_id, date_time):
+    """End of a booking: its doctor's slot, or SLOT_MINUTES if it is not on one."""
+    slot = doctor_slot(doctor_id, date_time) if doctor_id else None
+    return slot[1] if slot else date_time + timedelta(minutes=SLOT_MINUTES)
+
+
+def overlaps(bookings, start, end):
+    """Whether one of the scheduled ``bookings`` (a queryset) overlaps ``start`` to ``end``."""
+    rows = bookings.filter(
+        status=Appointment.Status.SCHEDULED,
+        date_time__gt=start - timedelta(minutes=MAX_SLOT_MINUTES),
+        date_time__lt=end,
+    ).values_list("doctor_id", "date_time")
+    return any(booking_end(doctor_id, booked_at) > start for doctor_id, booked_at in rows)
+
+
+def free_doctor_slots(doctor_id, day):
+    """Free slot start times of one doctor on ``day``."""
+    slots = day_slots(get_schedules([doctor_id])[doctor_id], day)
+    booked = Appointment.objects.filter(
+        doctor_id=doctor_id,
+        date_time__gte=to_datetime(day, 0),
+        date_time__lt=to_datetime(day + timedelta(days=1), 0),
+        status=Appointment.Status.SCHEDULED,
+    ).values_list("date_time", flat=True)
+    booked_minutes = [minute for _, minute in map(local_minute, booked) if minute is not None]
+    return [time(m // 60, m % 60) for m in iter_minutes(free_mask(slots, booked_minutes))]
+
+
+def free_doctors_at(doctor_ids, date_time):
+    """
+    ``(working, free)``: doctors with a slot starting at ``date_time`` and,
+    of those, the ones with no booking inside that slot.
+    """
+    day, minute = local_minute(date_time)
+    if minute is None:
+        return [], []
+
+    schedules = get_schedules(doctor_ids)
+    lengths = {}
+    for doctor_id in doctor_ids:
+        length = slot_length(day_slots(schedules[doctor_id], day), minute)
+        if length is not None:
+            lengths[doctor_id] = length
+    if not lengths:
+        return [], []
+
+    booked = Appointment.objects.filter(
+        doctor_id__in=lengths,
+        date_time__gte=date_time,
+        date_time__lt=date_time + timedelta(minutes=max(lengths.values())),
+        status=Appointment.Status.SCHEDULED,
+    ).values_list("doctor_id", "date_time")
+    busy = {
+        doctor_id for doctor_id, booked_at in booked
+        if booked_at < date_time + timedelta(minutes=lengths[doctor_id])
+    }
+    working = list(lengths)
+    return working, [doctor_id for doctor_id in working if doctor_id not in busy]
+
+
+def booking_masks(tenant, start, end):
+    """
+    ``(doctor, nurse, room)`` dicts mapping ``(resource_id, date)`` to a bitmask,
+    built from one pass over the clinic's scheduled appointments. Doctor masks
+    hold booking start minutes; nurse and room masks every minute a booking
+    covers.
+    """
+    doctors, nurses, rooms = {}, {}, {}
+    rows = list(Appointment.objects.filter(
+        tenant=tenant,
+        status=Appointment.Status.SCHEDULED,
+        date_time__gte=start,
+        date_time__lt=end,
+    ).values_list("doctor_id", "nurse_id", "room_id", "date_time"))
+    schedules = get_schedules({doctor_id for doctor_id, *_ in rows if doctor_id is not None})
+
+    for doctor_id, nurse_id, room_id, date_time in rows:
+        day, minute = local_minute(date_time)
+        if minute is None:
+            continue
+        length = None
+        if doctor_id is not None:
+            length = slot_length(day_slots(schedules[doctor_id], day), minute)
+        covered = span(minute, length or SLOT_MINUTES)
+        for masks, resource_id, minutes in (
+            (doctors, doctor_id, 1 << minute), (nurses, nurse_id, covered), (rooms, room_id, covered),
+        ):
+            if resource_id is not None:
+                masks[(resource_id, day)] = masks.get((resource_id, day), 0) | minutes
+    return doctors, nurses, rooms
+
+
+def span(minute, length):
+    """Bitmask of the ``length`` minutes from ``minute`` on, cut off at midnight."""
+    return (((1 << length) - 1) << minute) & FULL_DAY
+
+
+def first_free(resource_ids, busy, day, minutes):
+    for resource_id in resource_ids:
+        if not busy.get((resource_id, day), 0) & minutes:
+            return resource_id
+    return None
+
+
+def any_free(resource_ids, busy, day):
+    """Bitmask of minutes in which at least one of ``resource_ids`` has nothing booked."""
+    mask = 0
+    for resource_id in resource_ids:
+        mask |= FULL_DAY & ~busy.get((resource_id, day), 0)
+        if mask == FULL_DAY:
+            break
+    return mask
+
+
+def find_slots(tenant, date_from, date_to, count=5, specialization=None, with_room=False, now=None):
+    """
+    Earliest ``count`` slots between ``date_from`` and ``date_to`` (inclusive)
+    where a doctor, a nurse and, if ``with_room``, a room of the clinic
+    ``tenant`` are all free.
+    """
+    now = now or timezone.now()
+
+    doctor_qs = User.objects.filter(tenant=tenant, role="DOCTOR", is_active=True)
+    if specialization:
+        doctor_qs = doctor_qs.filter(specialization__iexact=specialization)
+    doctor_ids = list(doctor_qs.order_by("id").values_list("id", flat=True))
+    nurse_ids = list(
+        User.objects.filter(tenant=tenant, role="NURSE", is_active=True).order_by("id").values_list("id", flat=True)
+    )
+    room_ids = list(Room.objects.filter(tenant=tenant).order_by("id").values_list("id", flat=True)) if with_room else []
+
+    if not doctor_ids or not nurse_ids or (with_room and not room_ids):
+        return []
+
+    schedules = get_schedules(doctor_ids)
+    booked_doctors, booked_nurses, booked_rooms = booking_masks(
+        tenant,
+        to_datetime(date_from, 0), to_datetime(date_to + timedelta(days=1), 0)
+    )
+
+    found = []
+    day = date_from
+    while day <= date_to and len(found) < count:
+        slots = {doctor_id: day_slots(schedules[doctor_id], day) for doctor_id in doctor_ids}
+        doctor_free = {
+            doctor_id: free_mask(slots[doctor_id], iter_minutes(booked_doctors.get((doctor_id, day), 0)))
+            for doctor_id in doctor_ids
+        }
+        free = open_mask(day, now)
+        any_doctor = 0
+        for mask in doctor_free.values():
+            any_doctor |= mask
+        free &= any_doctor
+        free &= any_free(nurse_ids, booked_nurses, day)
+        if with_room:
+            free &= any_free(room_ids, booked_rooms, day)
+
+        # ``free`` only checks start minutes; the nurse and room must stay free for the whole slot.
+        for minute in iter_minutes(free):
+            if len(found) == count:
+                break
+            bit = 1 << minute
+            for doctor_id in doctor_ids:
+                if not doctor_free[doctor_id] & bit:
+                    continue
+                minutes = span(minute, slot_length(slots[doctor_id], minute))
+                nurse_id = first_free(nurse_ids, booked_nurses, day, minutes)
+                room_id = first_free(room_ids, booked_rooms, day, minutes) if with_room else None
+                if nurse_id is not None and (room_id is not None or not with_room):
+                    found.append({
+                        "date_time": to_datetime(day, minute),
+                        "doctor_id": doctor_id,
+                        "nurse_id": nurse_id,
+                        "room_id": room_id,
+                    })
+                    break
+        day += timedelta(days=1)
+
+    return found
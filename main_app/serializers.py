@@ -1,5 +1,12 @@
+import re
+
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from .models import User, Patient, Appointment, Report
+from .models import User, Patient, Appointment, Report, ReportVersion, WaitlistEntry, WorkingHours, ScheduleException, Attachment, Room
+from .scheduling import MAX_SLOT_MINUTES, MIN_SLOT_MINUTES, doctor_slot, overlaps
+from .report_history import ReportLocked, record_version, replace_text
+from .tenancy import check_in_tenant, serializer_tenant
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 
@@ -9,8 +16,8 @@ class UserSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = User
-        fields = ["id", "email", "first_name", "last_name", "role", "specialization"]
-        read_only_fields = ["id", "email"]
+        fields = ["id", "email", "first_name", "last_name", "role", "specialization", "tenant"]
+        read_only_fields = ["id", "email", "tenant"]
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
@@ -48,6 +55,7 @@ class AvailableDoctorSerializer(serializers.ModelSerializer):
 
 
 class PatientSerializer(serializers.ModelSerializer):
+    medical_history = serializers.CharField(required=False, allow_blank=True, allow_null=True)
 
     class Meta:
         model = Patient
@@ -64,6 +72,31 @@ class PatientSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "created_at"]
 
+    def validate_doctor(self, value):
+        tenant = serializer_tenant(self)
+        if value is not None and tenant is not None and value.tenant_id != tenant:
+            raise serializers.ValidationError("Doctor does not exist.")
+        return value
+
+
+class PatientListSerializer(PatientSerializer):
+    """List rows carry a preview of the medical history; the full text is on the detail endpoint."""
+    medical_history = None
+
+    class Meta(PatientSerializer.Meta):
+        fields = [
+            "id",
+            "first_name", "last_name",
+            "date_of_birth",
+            "gender",
+            "phone",
+            "address",
+            "medical_history_preview",
+            "medical_history_length",
+            "doctor",
+            "created_at",
+        ]
+
 
 
 
@@ -71,41 +104,61 @@ class AppointmentSerializer(serializers.ModelSerializer):
     doctor_id = serializers.IntegerField(write_only=True)
     nurse_id = serializers.IntegerField(write_only=True)
     patient_id = serializers.IntegerField(write_only=True)
+    room_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
     report_id = serializers.IntegerField(source="report.id", read_only=True)
 
     class Meta:
         model = Appointment
         fields = [
             "id",
-            "doctor", "nurse", "patient",
-            "doctor_id", "nurse_id", "patient_id",
+            "doctor", "nurse", "patient", "room",
+            "doctor_id", "nurse_id", "patient_id", "room_id",
             "date_time",
             "status",
             "report_id"
             
 
         ]
-        read_only_fields = ["id", "doctor", "nurse", "patient","report_id"]
+        read_only_fields = ["id", "doctor", "nurse", "patient", "room", "report_id"]
 
     def get_has_report(self, obj):
         return hasattr(obj, "report")
 
     def validate(self, attrs):
-        doctor_id = attrs.get('doctor_id')
-        date_time = attrs.get('date_time')
+        check_in_tenant(self, User, attrs.get("doctor_id"), "Doctor", role="DOCTOR")
+        check_in_tenant(self, User, attrs.get("nurse_id"), "Nurse", role="NURSE")
+        check_in_tenant(self, Patient, attrs.get("patient_id"), "Patient")
+        check_in_tenant(self, Room, attrs.get("room_id"), "Room")
+
+        # A partial update is checked against the appointment as it will be saved.
+        booking = ("doctor_id", "nurse_id", "room_id", "date_time")
+        if not any(name in attrs for name in booking):
+            return attrs
+        doctor_id, nurse_id, room_id, date_time = (
+            attrs[name] if name in attrs else getattr(self.instance, name, None) for name in booking
+        )
+        status = attrs.get("status", getattr(self.instance, "status", Appointment.Status.SCHEDULED))
+        if date_time is None or status != Appointment.Status.SCHEDULED:
+            return attrs
 
-       
-        if not (8 <= date_time.hour < 20):
-            raise serializers.ValidationError("Appointment must be between 08:00 and 20:00.")
+        slot = doctor_slot(doctor_id, date_time) if doctor_id else None
+        if slot is None:
+            raise serializers.ValidationError("Appointment must start at one of the doctor's slots within working hours.")
 
        
-        if Appointment.objects.filter(
-            doctor_id=doctor_id,
-            date_time=date_time,
-            status="scheduled"
-        ).exists():
+        booked = Appointment.objects.filter(status="scheduled")
+        if self.instance is not None:
+            booked = booked.exclude(pk=self.instance.pk)
+
+        if booked.filter(doctor_id=doctor_id, date_time__gte=slot[0], date_time__lt=slot[1]).exists():
             raise serializers.ValidationError("Doctor already has an appointment at this time.")
 
+        if nurse_id and overlaps(booked.filter(nurse_id=nurse_id), *slot):
+            raise serializers.ValidationError("Nurse already has an appointment at this time.")
+
+        if room_id and overlaps(booked.filter(room_id=room_id), *slot):
+            raise serializers.ValidationError("Room is already booked at this time.")
+
         return attrs
 
     def create(self, validated_data):
@@ -121,11 +174,18 @@ class AppointmentSerializer(serializers.ModelSerializer):
         )
         return appointment
 
+    def update(self, instance, validated_data):
+        new_date_time = validated_data.get("date_time")
+        if new_date_time and new_date_time != instance.date_time:
+            instance.reminder_sent_at = None
+        return super().update(instance, validated_data)
+
 
 
 
 class ReportSerializer(serializers.ModelSerializer):
     appointment_id = serializers.IntegerField(write_only=True)
+    diagnosis = serializers.CharField()
     nurse_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
 
     class Meta:
@@ -138,9 +198,12 @@ class ReportSerializer(serializers.ModelSerializer):
             "doctor",
             "nurse",
             "patient",
+            "status",
+            "version",
+            "finalized_at",
             "created_at",
         ]
-        read_only_fields = ["id", "doctor", "patient", "nurse","created_at"]
+        read_only_fields = ["id", "doctor", "patient", "nurse", "status", "version", "finalized_at", "created_at"]
 
     def validate_appointment_id(self, value):
      
@@ -164,6 +227,10 @@ class ReportSerializer(serializers.ModelSerializer):
 
         return value
 
+    def validate_nurse_id(self, value):
+        check_in_tenant(self, User, value, "Nurse", role="NURSE")
+        return value
+
     def create(self, validated_data):
         appointment = Appointment.objects.get(id=validated_data.pop("appointment_id"))
 
@@ -173,13 +240,202 @@ class ReportSerializer(serializers.ModelSerializer):
             nurse = User.objects.get(id=nurse_id, role="NURSE")
 
         report = Report.objects.create(
+            tenant_id=appointment.tenant_id,
             appointment=appointment,
             doctor=self.context["request"].user,
             patient=appointment.patient,
             nurse=nurse,
             **validated_data
         )
+        record_version(report, None, author=report.doctor)
         appointment.status = Appointment.Status.COMPLETED  
         appointment.save(update_fields=["status"])
 
         return report
+
+    def update(self, instance, validated_data):
+        text = validated_data.pop("diagnosis", None)
+        with transaction.atomic():
+            if text is not None:
+                try:
+                    instance = replace_text(instance, text, author=self.context["request"].user)
+                except ReportLocked:
+                    raise serializers.ValidationError("Finalized reports cannot be edited.")
+            return super().update(instance, validated_data)
+
+
+class ReportListSerializer(ReportSerializer):
+    """List rows carry a preview of the diagnosis; the full text is on the detail endpoint."""
+    diagnosis = None
+
+    class Meta(ReportSerializer.Meta):
+        fields = [
+            "id",
+            "appointment_id",
+            "diagnosis_preview",
+            "diagnosis_length",
+            "nurse_id",
+            "doctor",
+            "nurse",
+            "patient",
+            "status",
+            "version",
+            "finalized_at",
+            "created_at",
+        ]
+
+
+class AttachmentSerializer(serializers.ModelSerializer):
+    """Creating one starts an upload; the content follows in chunks (see ``attachments.py``)."""
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Attachment
+        fields = [
+            "id",
+            "patient",
+            "report",
+            "filename",
+            "content_type",
+            "size",
+            "sha256",
+            "received",
+            "chunk_size",
+            "status",
+            "uploaded_by",
+            "created_at",
+            "completed_at",
+        ]
+        read_only_fields = ["id", "received", "status", "uploaded_by", "created_at", "completed_at"]
+
+    def get_chunk_size(self, obj):
+        return settings.ATTACHMENT_CHUNK_SIZE
+
+    def validate_size(self, value):
+        if value > settings.ATTACHMENT_MAX_SIZE:
+            raise serializers.ValidationError(f"Attachments can be at most {settings.ATTACHMENT_MAX_SIZE} bytes.")
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and not re.fullmatch(r"[0-9a-f]{64}", value):
+            raise serializers.ValidationError("Must be a hex SHA-256 digest.")
+        return value
+
+    def validate(self, attrs):
+        user = self.context["request"].user
+        report = attrs.get("report")
+        patient = attrs.get("patient")
+        if report is not None:
+            if report.doctor_id != user.id and not Patient.objects.for_user(user).filter(pk=report.patient_id).exists():
+                raise serializers.ValidationError("Report does not exist.")
+            if patient is not None and patient.pk != report.patient_id:
+                raise serializers.ValidationError("Report belongs to a different patient.")
+            attrs["patient"] = report.patient
+        elif patient is None:
+            raise serializers.ValidationError("Either patient or report is required.")
+        elif not Patient.objects.for_user(user).filter(pk=patient.pk).exists():
+            raise serializers.ValidationError("Patient does not exist.")
+        return attrs
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    patient_id = serializers.IntegerField(write_only=True)
+    doctor_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = [
+            "id",
+            "patient", "doctor",
+            "patient_id", "doctor_id",
+            "specialization",
+            "auto_book",
+            "status",
+            "offered_doctor", "offered_date_time",
+            "appointment",
+            "created_at",
+        ]
+        read_only_fields = [
+            "id", "patient", "doctor", "status",
+            "offered_doctor", "offered_date_time", "appointment", "created_at",
+        ]
+
+    def validate(self, attrs):
+        check_in_tenant(self, Patient, attrs.get("patient_id"), "Patient")
+        doctor_id = attrs.get("doctor_id")
+        if doctor_id:
+            check_in_tenant(self, User, doctor_id, "Doctor", role="DOCTOR")
+        elif not attrs.get("specialization"):
+            raise serializers.ValidationError("Either doctor_id or specialization is required.")
+        return attrs
+
+
+class WorkingHoursSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkingHours
+        fields = ["id", "doctor", "weekday", "start_time", "end_time", "slot_minutes"]
+        read_only_fields = ["id"]
+
+    def validate_slot_minutes(self, value):
+        if not MIN_SLOT_MINUTES <= value <= MAX_SLOT_MINUTES:
+            raise serializers.ValidationError(
+                f"Slot length must be between {MIN_SLOT_MINUTES} and {MAX_SLOT_MINUTES} minutes."
+            )
+        return value
+
+    def validate(self, attrs):
+        start = attrs.get("start_time", getattr(self.instance, "start_time", None))
+        end = attrs.get("end_time", getattr(self.instance, "end_time", None))
+        if start and end and start >= end:
+            raise serializers.ValidationError("start_time must be before end_time.")
+        return attrs
+
+
+class ScheduleExceptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleException
+        fields = ["id", "doctor", "date", "start_time", "end_time", "reason"]
+        read_only_fields = ["id"]
+
+    def validate(self, attrs):
+        start = attrs.get("start_time", getattr(self.instance, "start_time", None))
+        end = attrs.get("end_time", getattr(self.instance, "end_time", None))
+        if (start is None) != (end is None):
+            raise serializers.ValidationError("Give both start_time and end_time, or neither for a whole day off.")
+        if start and start >= end:
+            raise serializers.ValidationError("start_time must be before end_time.")
+        return attrs
+
+
+class ReportAutosaveSerializer(serializers.Serializer):
+    base_version = serializers.IntegerField(min_value=0)
+    ops = serializers.ListField(
+        child=serializers.ListField(),
+        help_text="Splices [start, end, text] against the base version, sorted and non-overlapping."
+    )
+
+
+class ReportVersionSerializer(serializers.ModelSerializer):
+    size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportVersion
+        fields = ["number", "kind", "author", "size", "created_at"]
+
+    def get_size(self, obj):
+        return len(obj.data)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = serializers.ListField(
+        child=serializers.CharField(max_length=2000),
+        allow_empty=False,
+        help_text="API paths to GET, query strings included."
+    )
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f"A batch can hold at most {settings.BATCH_MAX_REQUESTS} requests.")
+        return value
@@ -0,0 +1,53 @@
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from . import analytics
+from .attachments import get_storage
+from .audit import flush_if_due
+
+from .models import WorkingHours, ScheduleException, Attachment, Appointment
+from .scheduling import invalidate_schedule
+
+
+@receiver(post_init, sender=WorkingHours)
+@receiver(post_init, sender=ScheduleException)
+def schedule_loaded(sender, instance, **kwargs):
+    """Remembers the doctor as loaded, so moving the row to another doctor also drops the old schedule."""
+    instance._loaded_doctor_id = instance.__dict__.get("doctor_id")
+
+
+@receiver([post_save, post_delete], sender=WorkingHours)
+@receiver([post_save, post_delete], sender=ScheduleException)
+def schedule_changed(sender, instance, **kwargs):
+    invalidate_schedule(instance.doctor_id)
+    loaded = instance._loaded_doctor_id
+    if loaded is not None and loaded != instance.doctor_id:
+        invalidate_schedule(loaded)
+    instance._loaded_doctor_id = instance.doctor_id
+
+
+@receiver(post_init, sender=Appointment)
+def appointment_loaded(sender, instance, **kwargs):
+    """Remembers the start time as loaded, so moving the appointment also drops its old month."""
+    instance._loaded_date_time = instance.__dict__.get("date_time")
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def appointment_changed(sender, instance, **kwargs):
+    analytics.invalidate(instance.tenant_id, instance.date_time)
+    loaded = instance._loaded_date_time
+    if loaded is not None and loaded != instance.date_time:
+        analytics.invalidate(instance.tenant_id, loaded)
+    instance._loaded_date_time = instance.date_time
+
+
+@receiver(post_delete, sender=Attachment)
+def attachment_deleted(sender, instance, **kwargs):
+    """Also fires for cascades from patients and reports; the file goes once the delete commits."""
+    key = instance.storage_key
+    transaction.on_commit(lambda: get_storage().delete(key))
+
+
+request_finished.connect(flush_if_due, dispatch_uid="main_app.audit.flush_if_due")
@@ -0,0 +1,54 @@
+"""
+Multi-clinic tenancy.
+
+Every user, patient, appointment, report and room belongs to one ``Clinic``
+and one deployment serves them all from shared tables. ``TenantFilterBackend``
+comes first in DEFAULT_FILTER_BACKENDS, so every generic view only lists and
+looks up rows of the requesting user's clinic, found through the view's
+``tenant_field`` (``"tenant"`` unless the model reaches its clinic through a
+relation). Views that are not generic call ``scope()`` themselves. Every
+table's indexes lead with ``tenant_id``, so a clinic's queries stay as fast
+as in a database of its own. Superusers are not scoped.
+"""
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+def scope(queryset, user, field="tenant"):
+    """``queryset`` narrowed to the rows of ``user``'s clinic."""
+    if user.is_superuser:
+        return queryset
+    return queryset.filter(**{field: user.tenant_id})
+
+
+class TenantFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        return scope(queryset, request.user, getattr(view, "tenant_field", "tenant"))
+
+
+class TenantCreateMixin:
+    """Creates rows in the requesting user's clinic."""
+
+    def perform_create(self, serializer):
+        serializer.save(tenant_id=self.request.user.tenant_id)
+
+
+def serializer_tenant(serializer):
+    """Clinic the serializer's object belongs to, or will be created in; ``None`` outside a request."""
+    tenant = getattr(serializer.instance, "tenant_id", None)
+    if tenant is not None:
+        return tenant
+    request = serializer.context.get("request")
+    return request.user.tenant_id if request is not None else None
+
+
+def check_in_tenant(serializer, model, pk, label, **filters):
+    """Rejects ``pk`` unless it is a row of the serializer's clinic."""
+    if pk is None:
+        return
+    rows = model.objects.filter(pk=pk, **filters)
+    tenant = serializer_tenant(serializer)
+    if tenant is not None:
+        rows = rows.filter(tenant=tenant)
+    if not rows.exists():
+        raise serializers.ValidationError(f"{label} does not exist.")
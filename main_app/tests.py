@@ -1,3 +1,984 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from unittest import skipUnless
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase, APITransactionTestCase
+from django.utils import timezone
+
+from . import analytics, audit, reminders
+from .fastlist import get_plan, serialize_list
+from .matching import jaro_winkler, phone_key, soundex
+from .renderers import ORJSONRenderer
+from .warmup import STEPS, warm_up
+from .report_history import replace_text, text_at
+from .serializers import PatientListSerializer, AppointmentSerializer, ReportListSerializer
+from .models import DEFAULT_CLINIC_ID, Clinic, User, Patient, PatientMedicalHistory, Appointment, Report, AuditEvent, WaitlistEntry, Room, WorkingHours, ScheduleException, Attachment
+from .scheduling import find_slots, free_doctor_slots, free_doctors_at
+from .views import AppointmentViewSet
+from .waitlist import backfill_slot, accept_offer
+
+
+def make_user(email, role, **extra):
+    extra.setdefault("tenant", DEFAULT_CLINIC_ID)
+    return User.objects.create_user(
+        email=email, password="secret123", first_name=email.split("@")[0],
+        last_name="Test", role=role, **extra
+    )
+
+
+@override_settings(REMINDER_SMS_BACKEND="main_app.reminders.LocmemSmsBackend")
+class ReminderTests(TestCase):
+    def setUp(self):
+        reminders.sms_outbox.clear()
+        self.doctor = make_user("doc@clinic.test", "DOCTOR")
+        self.patient = Patient.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            first_name="Ana", last_name="Anic", email="ana@mail.test", phone="+38160000000"
+        )
+        self.now = timezone.now()
+
+    def book(self, delta, **extra):
+        return Appointment.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            patient=self.patient, doctor=self.doctor, date_time=self.now + delta, **extra
+        )
+
+    def test_sends_once_for_appointments_in_window(self):
+        due = self.book(timedelta(hours=2))
+        self.book(timedelta(days=3))
+        self.book(timedelta(hours=3), status=Appointment.Status.CANCELLED)
+
+        self.assertEqual(reminders.send_due_reminders(now=self.now), 1)
+        self.assertEqual(reminders.send_due_reminders(now=self.now), 0)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["ana@mail.test"])
+        self.assertEqual(len(reminders.sms_outbox), 1)
+        due.refresh_from_db()
+        self.assertEqual(due.reminder_sent_at, self.now)
+
+    def test_batches_cover_every_due_appointment(self):
+        for minutes in range(5):
+            self.book(timedelta(minutes=30 + minutes))
+        self.assertEqual(reminders.send_due_reminders(now=self.now, batch_size=2), 5)
+        self.assertEqual(len(mail.outbox), 5)
+
+
+@override_settings(REMINDER_SMS_BACKEND="main_app.reminders.LocmemSmsBackend")
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user("card@clinic.test", "DOCTOR", specialization="Cardiology")
+        self.nurse = make_user("nurse@clinic.test", "NURSE")
+        self.first = Patient.objects.create(first_name="Prvi", last_name="P", tenant_id=DEFAULT_CLINIC_ID)
+        self.second = Patient.objects.create(first_name="Drugi", last_name="D", tenant_id=DEFAULT_CLINIC_ID)
+        self.appointment = Appointment.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            patient=self.first, doctor=self.doctor, nurse=self.nurse,
+            date_time=timezone.now() + timedelta(days=1),
+        )
+
+    def cancel(self):
+        self.appointment.status = Appointment.Status.CANCELLED
+        self.appointment.save()
+        return backfill_slot(self.appointment)
+
+    def test_oldest_entry_across_doctor_and_specialization_queues_is_booked(self):
+        oldest = WaitlistEntry.objects.create(patient=self.second, specialization="Cardiology")
+        WaitlistEntry.objects.create(patient=self.first, doctor=self.doctor)
+
+        entry = self.cancel()
+
+        self.assertEqual(entry, oldest)
+        self.assertEqual(entry.status, WaitlistEntry.Status.BOOKED)
+        self.assertEqual(entry.appointment.date_time, self.appointment.date_time)
+        self.assertEqual(entry.appointment.nurse, self.nurse)
+
+    def test_offer_is_booked_on_accept(self):
+        entry = WaitlistEntry.objects.create(patient=self.second, doctor=self.doctor, auto_book=False)
+
+        self.cancel()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.Status.OFFERED)
+
+        appointment = accept_offer(entry)
+        self.assertEqual(appointment.patient, self.second)
+        self.assertIsNone(accept_offer(entry))
+
+    def test_accepted_offer_leaves_off_a_nurse_booked_meanwhile(self):
+        entry = WaitlistEntry.objects.create(patient=self.second, doctor=self.doctor, auto_book=False)
+        self.cancel()
+        other_doctor = make_user("other.card@clinic.test", "DOCTOR")
+        Appointment.objects.create(
+            doctor=other_doctor, nurse=self.nurse, date_time=self.appointment.date_time, tenant_id=DEFAULT_CLINIC_ID
+        )
+
+        appointment = accept_offer(entry)
+        self.assertEqual((appointment.doctor, appointment.nurse), (self.doctor, None))
+
+    def test_only_the_update_that_cancels_backfills(self):
+        WaitlistEntry.objects.create(patient=self.second, doctor=self.doctor, auto_book=False)
+        WaitlistEntry.objects.create(patient=self.second, specialization="Cardiology", auto_book=False)
+        stale = Appointment.objects.get(pk=self.appointment.pk)
+        self.cancel()
+
+        serializer = AppointmentSerializer(stale, data={"status": "cancelled"}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        AppointmentViewSet().perform_update(serializer)
+        self.assertEqual(WaitlistEntry.objects.filter(status=WaitlistEntry.Status.OFFERED).count(), 1)
+
+
+class FindSlotsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.day = date(2030, 1, 7)
+        self.doctor = make_user("derm@clinic.test", "DOCTOR", specialization="Dermatology")
+        self.nurse = make_user("sestra@clinic.test", "NURSE")
+        self.room = Room.objects.create(name="101", tenant_id=DEFAULT_CLINIC_ID)
+        self.now = timezone.make_aware(datetime(2030, 1, 1))
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day, datetime.min.time()).replace(hour=hour, minute=minute))
+
+    def test_slot_requires_doctor_nurse_and_room_free(self):
+        other_doctor = make_user("other@clinic.test", "DOCTOR", specialization="Dermatology")
+        Appointment.objects.create(
+            doctor=other_doctor, nurse=self.nurse, date_time=self.at(8), tenant_id=DEFAULT_CLINIC_ID
+        )
+        Appointment.objects.create(
+            doctor=other_doctor, room=self.room, date_time=self.at(8, 30), tenant_id=DEFAULT_CLINIC_ID
+        )
+
+        slots = find_slots(DEFAULT_CLINIC_ID, self.day, self.day, count=2, specialization="dermatology",
+                           with_room=True, now=self.now)
+
+        self.assertEqual([s["date_time"] for s in slots], [self.at(9), self.at(9, 30)])
+        self.assertEqual(slots[0]["doctor_id"], self.doctor.id)
+        self.assertEqual(slots[0]["nurse_id"], self.nurse.id)
+        self.assertEqual(slots[0]["room_id"], self.room.id)
+
+    def test_cancelled_appointments_do_not_block(self):
+        Appointment.objects.create(doctor=self.doctor, nurse=self.nurse, date_time=self.at(8),
+                                   status=Appointment.Status.CANCELLED, tenant_id=DEFAULT_CLINIC_ID)
+        slots = find_slots(DEFAULT_CLINIC_ID, self.day, self.day, count=1, now=self.now)
+        self.assertEqual(slots[0]["date_time"], self.at(8))
+
+    def test_nurse_is_busy_for_the_whole_booked_slot(self):
+        surgeon = make_user("surgeon@clinic.test", "DOCTOR", specialization="Surgery")
+        WorkingHours.objects.create(doctor=surgeon, weekday=0, start_time="09:00", end_time="12:00", slot_minutes=45)
+        Appointment.objects.create(
+            doctor=surgeon, nurse=self.nurse, room=self.room, date_time=self.at(9), tenant_id=DEFAULT_CLINIC_ID
+        )
+
+        slots = find_slots(DEFAULT_CLINIC_ID, self.day, self.day, count=3, specialization="dermatology",
+                           with_room=True, now=self.now)
+        self.assertEqual([s["date_time"] for s in slots], [self.at(8), self.at(8, 30), self.at(10)])
+
+        patient = Patient.objects.create(first_name="Over", last_name="Lap", tenant_id=DEFAULT_CLINIC_ID)
+        booking = {"doctor_id": self.doctor.id, "nurse_id": self.nurse.id, "patient_id": patient.id,
+                   "date_time": self.at(9, 30)}
+        self.assertFalse(AppointmentSerializer(data=booking).is_valid())
+        self.assertTrue(AppointmentSerializer(data={**booking, "date_time": self.at(10)}).is_valid())
+
+    def book(self, doctor, nurse, hour):
+        return Appointment.objects.create(doctor=doctor, nurse=nurse, date_time=self.at(hour), tenant_id=DEFAULT_CLINIC_ID)
+
+    def test_partial_updates_are_checked_as_saved(self):
+        second = make_user("second@clinic.test", "DOCTOR")
+        third = make_user("third@clinic.test", "DOCTOR")
+        other_nurse = make_user("other.nurse@clinic.test", "NURSE")
+        self.book(self.doctor, self.nurse, 9)
+        later = self.book(second, self.nurse, 10)
+        elsewhere = self.book(third, other_nurse, 9)
+
+        def valid(appointment, data):
+            return AppointmentSerializer(appointment, data=data, partial=True).is_valid()
+
+        self.assertFalse(valid(later, {"date_time": self.at(9)}))
+        self.assertTrue(valid(later, {"date_time": self.at(11)}))
+        self.assertFalse(valid(elsewhere, {"nurse_id": self.nurse.id}))
+        self.assertTrue(valid(elsewhere, {"nurse_id": other_nurse.id}))
+
+
+class WorkingHoursTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user("ped@clinic.test", "DOCTOR")
+        self.monday = date(2030, 1, 7)
+
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime(day.year, day.month, day.day, hour, minute))
+
+    def test_default_template_without_working_hours(self):
+        slots = free_doctor_slots(self.doctor.id, self.monday)
+        self.assertEqual(len(slots), 24)
+        self.assertEqual(slots[0].strftime("%H:%M"), "08:00")
+
+    def test_template_minus_bookings_and_exceptions(self):
+        WorkingHours.objects.create(doctor=self.doctor, weekday=0, start_time="09:00",
+                                    end_time="11:15", slot_minutes=45)
+        ScheduleException.objects.create(doctor=self.doctor, date=self.monday,
+                                         start_time="10:30", end_time="11:00")
+        Appointment.objects.create(
+            doctor=self.doctor, date_time=self.at(self.monday, 9), tenant_id=DEFAULT_CLINIC_ID
+        )
+
+        slots = [s.strftime("%H:%M") for s in free_doctor_slots(self.doctor.id, self.monday)]
+        self.assertEqual(slots, ["09:45"])
+        self.assertEqual(free_doctor_slots(self.doctor.id, self.monday + timedelta(days=1)), [])
+
+    def test_schedule_change_invalidates_cache(self):
+        self.assertEqual(free_doctors_at([self.doctor.id], self.at(self.monday, 8)),
+                         ([self.doctor.id], [self.doctor.id]))
+        ScheduleException.objects.create(doctor=self.doctor, date=self.monday)
+        self.assertEqual(free_doctors_at([self.doctor.id], self.at(self.monday, 8)), ([], []))
+
+    def test_moving_hours_to_another_doctor_refreshes_both(self):
+        other = make_user("ped.two@clinic.test", "DOCTOR")
+        hours = WorkingHours.objects.create(doctor=self.doctor, weekday=0, start_time="09:00", end_time="10:00")
+        self.assertEqual(len(free_doctor_slots(self.doctor.id, self.monday)), 2)
+        self.assertEqual(len(free_doctor_slots(other.id, self.monday)), 24)
+
+        hours = WorkingHours.objects.get(pk=hours.pk)
+        hours.doctor = other
+        hours.save()
+        self.assertEqual(len(free_doctor_slots(self.doctor.id, self.monday)), 24)
+        self.assertEqual(len(free_doctor_slots(other.id, self.monday)), 2)
+
+
+class RoleScopingTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_user("dr.one@clinic.test", "DOCTOR")
+        self.other_doctor = make_user("dr.two@clinic.test", "DOCTOR")
+        self.nurse = make_user("nurse.one@clinic.test", "NURSE")
+        self.admin = make_user("admin@clinic.test", "ADMIN")
+
+        audit.flush()
+        self.addCleanup(audit.flush)
+        self.own = Patient.objects.create(
+            first_name="Own", last_name="P", doctor=self.doctor, tenant_id=DEFAULT_CLINIC_ID
+        )
+        self.booked = Patient.objects.create(first_name="Booked", last_name="P", tenant_id=DEFAULT_CLINIC_ID)
+        self.foreign = Patient.objects.create(
+            first_name="Foreign", last_name="P", doctor=self.other_doctor, tenant_id=DEFAULT_CLINIC_ID
+        )
+
+        self.today = Appointment.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            patient=self.booked, doctor=self.doctor, nurse=self.nurse, date_time=timezone.now()
+        )
+        Appointment.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            patient=self.foreign, doctor=self.other_doctor, date_time=timezone.now()
+        )
+
+    def ids(self, url, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return {row["id"] for row in response.data}
+
+    def test_patients_are_scoped_by_role(self):
+        self.assertEqual(self.ids("/api/patients/", self.doctor), {self.own.id, self.booked.id})
+        self.assertEqual(self.ids("/api/patients/", self.nurse), {self.booked.id})
+        self.assertEqual(len(self.ids("/api/patients/", self.admin)), 3)
+        self.assertEqual(self.ids("/api/me/patients/", self.doctor), {self.own.id, self.booked.id})
+
+    def test_appointments_are_scoped_by_role(self):
+        self.assertEqual(self.ids("/api/appointments/", self.nurse), {self.today.id})
+        self.assertEqual(self.ids("/api/me/today/", self.doctor), {self.today.id})
+        self.assertEqual(len(self.ids("/api/appointments/", self.admin)), 2)
+
+
+class TenancyTests(APITestCase):
+    def setUp(self):
+        audit.flush()
+        self.addCleanup(audit.flush)
+        self.other_clinic = Clinic.objects.create(name="Other", slug="other")
+        self.doctor = make_user("dr.home@clinic.test", "DOCTOR")
+        self.admin = make_user("admin.other@clinic.test", "ADMIN", tenant=self.other_clinic)
+        self.other_doctor = make_user("dr.other@clinic.test", "DOCTOR", tenant=self.other_clinic)
+        self.home_patient = Patient.objects.create(
+            first_name="Ana", last_name="Home", phone="0601234567", tenant_id=DEFAULT_CLINIC_ID
+        )
+        self.other_patient = Patient.objects.create(first_name="Iva", last_name="Other", tenant=self.other_clinic)
+        Appointment.objects.create(
+            patient=self.home_patient, doctor=self.doctor, date_time=timezone.now(), tenant_id=DEFAULT_CLINIC_ID
+        )
+        self.client.force_authenticate(self.admin)
+
+    def test_admins_only_see_their_clinic(self):
+        response = self.client.get("/api/patients/")
+        self.assertEqual([row["id"] for row in response.data], [self.other_patient.id])
+        self.assertEqual(self.client.get("/api/appointments/").data, [])
+        self.assertEqual(
+            {row["id"] for row in self.client.get("/api/users/").data}, {self.admin.id, self.other_doctor.id}
+        )
+        self.assertEqual(self.client.get(f"/api/patients/{self.home_patient.id}/").status_code, 404)
+
+    def test_creates_stay_in_the_clinic(self):
+        response = self.client.post(
+            "/api/patients/", {"first_name": "Ana", "last_name": "Home", "phone": "0601234567"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Patient.objects.get(pk=response.data["id"]).tenant, self.other_clinic)
+
+        response = self.client.post("/api/appointments/", {
+            "doctor_id": self.doctor.id, "nurse_id": self.doctor.id, "patient_id": self.other_patient.id,
+            "date_time": timezone.now().isoformat(),
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Doctor does not exist.", str(response.data))
+
+    def test_rows_without_a_clinic_are_refused(self):
+        with self.assertRaises(ValueError):
+            User.objects.create_user(email="nowhere@clinic.test", password="secret123", role="DOCTOR")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Patient.objects.create(first_name="No", last_name="Clinic")
+
+
+class FastListTests(APITestCase):
+    """The fast list path must match the ModelSerializer output exactly."""
+
+    def setUp(self):
+        self.doctor = make_user("golden.dr@clinic.test", "DOCTOR")
+        self.nurse = make_user("golden.nurse@clinic.test", "NURSE")
+        full = Patient.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            first_name="Full", last_name="Row", date_of_birth=date(1990, 5, 17), gender="F",
+            phone="064", address="Ulica 1", medical_history="Asthma", doctor=self.doctor,
+        )
+        Patient.objects.create(first_name="Empty", last_name="Row", tenant_id=DEFAULT_CLINIC_ID)
+        with_report = Appointment.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            patient=full, doctor=self.doctor, nurse=self.nurse,
+            date_time=timezone.make_aware(datetime(2030, 1, 7, 9, 30)),
+        )
+        Appointment.objects.create(
+            patient=full, doctor=self.doctor, date_time=timezone.now(), tenant_id=DEFAULT_CLINIC_ID
+        )
+        Report.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            patient=full, doctor=self.doctor, nurse=self.nurse, diagnosis="Flu", appointment=with_report
+        )
+        Report.objects.create(patient=None, doctor=self.doctor, diagnosis="", tenant_id=DEFAULT_CLINIC_ID)
+
+    def test_matches_model_serializers(self):
+        for serializer_class, model in (
+            (PatientListSerializer, Patient),
+            (AppointmentSerializer, Appointment),
+            (ReportListSerializer, Report),
+        ):
+            queryset = model.objects.order_by("id")
+            self.assertIsNotNone(get_plan(serializer_class))
+            self.assertEqual(
+                serialize_list(serializer_class, queryset),
+                list(serializer_class(queryset, many=True).data),
+            )
+
+    def test_sparse_fieldset(self):
+        self.client.force_authenticate(self.doctor)
+        response = self.client.get("/api/patients/?fields=id,date_of_birth")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({tuple(row) for row in response.data}, {("id", "date_of_birth")})
+
+        response = self.client.get("/api/patients/?fields=id,secret")
+        self.assertEqual(response.status_code, 400)
+
+
+class ClinicalTextTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_user("text.dr@clinic.test", "DOCTOR")
+        self.client.force_authenticate(self.doctor)
+        self.history = ("Seasonal asthma, treated with inhalers since 2015. " * 100).strip()
+
+    def test_lists_carry_a_preview_and_detail_the_full_text(self):
+        response = self.client.post(
+            "/api/patients/",
+            {"first_name": "Long", "last_name": "History", "medical_history": self.history, "doctor": self.doctor.id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        url = f"/api/patients/{response.data['id']}/"
+
+        row, = self.client.get("/api/patients/").data
+        self.assertNotIn("medical_history", row)
+        self.assertEqual(row["medical_history_preview"], self.history[:200])
+        self.assertEqual(row["medical_history_length"], len(self.history))
+        self.assertEqual(self.client.get(url).data["medical_history"], self.history)
+
+        self.client.patch(url, {"medical_history": "Healthy"}, format="json")
+        self.assertEqual(self.client.get(url).data["medical_history"], "Healthy")
+        self.assertEqual(self.client.get("/api/patients/").data[0]["medical_history_length"], 7)
+
+    def test_bodies_are_stored_compressed(self):
+        patient = Patient.objects.create(
+            first_name="C", last_name="Z", medical_history=self.history, tenant_id=DEFAULT_CLINIC_ID
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT text FROM {PatientMedicalHistory._meta.db_table} WHERE patient_id = %s", [patient.id]
+            )
+            stored, = cursor.fetchone()
+        self.assertLess(len(stored), len(self.history) / 10)
+        self.assertEqual(Patient.objects.get(pk=patient.pk).medical_history, self.history)
+
+        patient.medical_history = None
+        patient.save()
+        self.assertFalse(PatientMedicalHistory.objects.filter(pk=patient.pk).exists())
+        self.assertIsNone(Patient.objects.get(pk=patient.pk).medical_history)
+
+    def test_bulk_create_refuses_side_texts(self):
+        with self.assertRaises(ValueError):
+            Patient.objects.bulk_create([
+                Patient(first_name="B", last_name="Ulk", medical_history="Lost", tenant_id=DEFAULT_CLINIC_ID)
+            ])
+        Patient.objects.bulk_create([Patient(first_name="B", last_name="Ulk", tenant_id=DEFAULT_CLINIC_ID)])
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email="root@clinic.test", password="secret123", first_name="Root", last_name="Admin",
+            tenant=DEFAULT_CLINIC_ID,
+        )
+        self.doctor = make_user("admin.dr@clinic.test", "DOCTOR")
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for i in range(count):
+            patient = Patient.objects.create(
+                first_name=f"P{i}", last_name="Admin", doctor=self.doctor, tenant_id=DEFAULT_CLINIC_ID
+            )
+            appointment = Appointment.objects.create(
+                tenant_id=DEFAULT_CLINIC_ID,
+                patient=patient, doctor=self.doctor, date_time=timezone.now() + timedelta(days=i)
+            )
+            Report.objects.create(
+                patient=patient, doctor=self.doctor, appointment=appointment, diagnosis="Flu", tenant_id=DEFAULT_CLINIC_ID
+            )
+            WaitlistEntry.objects.create(patient=patient, doctor=self.doctor)
+            WorkingHours.objects.create(doctor=self.doctor, weekday=i % 7, start_time="08:00", end_time="12:00")
+            ScheduleException.objects.create(doctor=self.doctor, date=date(2030, 1, 1) + timedelta(days=i))
+
+    def query_counts(self):
+        counts = []
+        for model in ("patient", "appointment", "report", "waitlistentry", "workinghours", "scheduleexception"):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f"/admin/main_app/{model}/")
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        return counts
+
+    def test_changelists_run_a_constant_number_of_queries(self):
+        self.add_rows(2)
+        few = self.query_counts()
+        self.add_rows(20)
+        self.assertEqual(self.query_counts(), few)
+
+        entry = WaitlistEntry.objects.first()
+        form = self.client.get(f"/admin/main_app/waitlistentry/{entry.id}/change/")
+        self.assertContains(form, "admin-autocomplete")
+        self.assertNotContains(form, "P21 Admin")
+
+    def test_medical_history_is_editable(self):
+        patient = Patient.objects.create(
+            first_name="Edit", last_name="Me", medical_history="Old", tenant_id=DEFAULT_CLINIC_ID
+        )
+        url = f"/admin/main_app/patient/{patient.id}/change/"
+        self.assertContains(self.client.get(url), "Old")
+        response = self.client.post(url, {"first_name": "Edit", "last_name": "Me", "medical_history": "New"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Patient.objects.get(pk=patient.pk).medical_history, "New")
+
+    def test_final_diagnoses_are_read_only(self):
+        self.add_rows(1)
+        report = Report.objects.get()
+        Report.objects.filter(pk=report.pk).update(status=Report.Status.FINAL)
+        url = f"/admin/main_app/report/{report.id}/change/"
+        self.assertNotContains(self.client.get(url), 'name="diagnosis"')
+        response = self.client.post(url, {
+            "doctor": self.doctor.id, "patient": report.patient_id, "appointment": report.appointment_id,
+            "diagnosis": "Changed",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Report.objects.get(pk=report.pk).diagnosis, "Flu")
+
+    def test_user_search_matches_prefixes(self):
+        response = self.client.get("/admin/main_app/user/", {"q": "admin.d"})
+        self.assertContains(response, "admin.dr@clinic.test")
+        self.assertNotContains(self.client.get("/admin/main_app/user/", {"q": "dr@clinic"}), "admin.dr@clinic.test")
+
+
+class IdempotencyTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user("idem.dr@clinic.test", "DOCTOR")
+        self.nurse = make_user("idem.nurse@clinic.test", "NURSE")
+        self.patient = Patient.objects.create(first_name="I", last_name="Dem", tenant_id=DEFAULT_CLINIC_ID)
+        self.client.force_authenticate(self.doctor)
+        self.booking = {
+            "doctor_id": self.doctor.id, "nurse_id": self.nurse.id, "patient_id": self.patient.id,
+            "date_time": timezone.make_aware(datetime(2030, 1, 7, 10, 0)).isoformat(),
+        }
+
+    def post(self, url, data, key):
+        return self.client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.post("/api/appointments/", self.booking, "booking-1")
+        self.assertEqual(first.status_code, 201)
+        retry = self.post("/api/appointments/", self.booking, "booking-1")
+        cache.clear()
+        from_db = self.post("/api/appointments/", self.booking, "booking-1")
+
+        for response in (retry, from_db):
+            self.assertEqual((response.status_code, response.data), (201, first.data))
+            self.assertEqual(response["Idempotent-Replayed"], "true")
+        self.assertEqual(Appointment.objects.count(), 1)
+
+        report = {"appointment_id": first.data["id"], "diagnosis": "Flu"}
+        self.assertEqual(self.post("/api/reports/", report, "report-1").status_code, 201)
+        self.assertEqual(self.post("/api/reports/", report, "report-1").status_code, 201)
+        self.assertEqual(Report.objects.count(), 1)
+
+    def test_key_reuse_for_another_request_and_failed_requests(self):
+        invalid = {**self.booking, "date_time": timezone.make_aware(datetime(2030, 1, 7, 10, 10)).isoformat()}
+        self.assertEqual(self.post("/api/appointments/", invalid, "booking-2").status_code, 400)
+        self.assertEqual(self.post("/api/appointments/", self.booking, "booking-2").status_code, 201)
+
+        moved = {**self.booking, "date_time": timezone.make_aware(datetime(2030, 1, 7, 11, 0)).isoformat()}
+        self.assertEqual(self.post("/api/appointments/", moved, "booking-2").status_code, 422)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+class DuplicatePatientTests(APITestCase):
+    def setUp(self):
+        self.admin = make_user("dup.admin@clinic.test", "ADMIN")
+        self.doctor = make_user("dup.dr@clinic.test", "DOCTOR")
+        self.existing = Patient.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            first_name="Đorđe", last_name="Golović", date_of_birth=date(1980, 3, 2),
+            phone="+381 60 123 4567", medical_history="Asthma",
+        )
+        self.client.force_authenticate(self.admin)
+
+    def test_matching_keys_and_similarity(self):
+        self.assertEqual(soundex("Golović"), soundex("Golovic"))
+        self.assertEqual(soundex("Robert"), "R163")
+        self.assertEqual(phone_key("+381 60 123 4567"), phone_key("060/123-4567"))
+        self.assertAlmostEqual(jaro_winkler("martha", "marhta"), 0.961, places=3)
+
+    def test_create_refuses_likely_duplicates(self):
+        typo = {"first_name": "Djordje", "last_name": "Golovich", "date_of_birth": "1980-03-02"}
+        response = self.client.post("/api/patients/", typo, format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([match["id"] for match in response.data["duplicates"]], [self.existing.id])
+
+        moved = {"first_name": "Đorđe", "last_name": "Golović", "date_of_birth": "1975-01-01"}
+        self.assertEqual(self.client.post("/api/patients/", moved, format="json").status_code, 201)
+        self.assertEqual(
+            self.client.post("/api/patients/?allow_duplicates=true", typo, format="json").status_code, 201
+        )
+
+    def test_import_skips_duplicates_of_existing_and_earlier_rows(self):
+        rows = [
+            {"first_name": "Mila", "last_name": "Ilić", "phone": "0641112233"},
+            {"first_name": "Dorde", "last_name": "Golovic", "phone": "060 123 4567"},
+            {"first_name": "Milla", "last_name": "Ilic", "phone": "+381 64 111 2233"},
+            {"first_name": ""},
+        ]
+        response = self.client.post("/api/patients/import/", rows, format="json")
+        self.assertEqual(len(response.data["created"]), 1)
+        self.assertEqual([row["row"] for row in response.data["duplicates"]], [1, 2])
+        self.assertEqual(response.data["duplicates"][1]["candidates"][0]["id"], response.data["created"][0])
+        self.assertEqual([row["row"] for row in response.data["errors"]], [3])
+
+    def test_merge_moves_history_in_one_step(self):
+        duplicate = Patient.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            first_name="Djordje", last_name="Golovic", email="dg@mail.test", medical_history="Penicillin allergy"
+        )
+        appointment = Appointment.objects.create(
+            patient=duplicate, doctor=self.doctor, date_time=timezone.now(), tenant_id=DEFAULT_CLINIC_ID
+        )
+        Report.objects.create(
+            patient=duplicate, doctor=self.doctor, appointment=appointment, diagnosis="Flu", tenant_id=DEFAULT_CLINIC_ID
+        )
+
+        response = self.client.post(
+            f"/api/patients/{self.existing.id}/merge/", {"duplicate_id": duplicate.id}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["medical_history"], "Asthma\n\nPenicillin allergy")
+        self.assertFalse(Patient.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(Appointment.objects.get().patient_id, self.existing.id)
+        self.assertEqual(Report.objects.get().patient_id, self.existing.id)
+        self.assertEqual(Patient.objects.get(pk=self.existing.pk).email, "dg@mail.test")
+
+
+class AttachmentTests(APITestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        storage = override_settings(
+            ATTACHMENT_STORAGE_BACKEND="main_app.attachments.LocalAttachmentStorage",
+            ATTACHMENT_ROOT=self.root, ATTACHMENT_CHUNK_SIZE=4,
+        )
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.addCleanup(audit.flush)
+
+        self.doctor = make_user("files.dr@clinic.test", "DOCTOR")
+        self.patient = Patient.objects.create(
+            first_name="F", last_name="Iles", doctor=self.doctor, tenant_id=DEFAULT_CLINIC_ID
+        )
+        self.client.force_authenticate(self.doctor)
+        self.content = b"0123456789"
+
+    def start(self):
+        response = self.client.post("/api/attachments/", {
+            "patient": self.patient.id, "filename": "scan.txt", "content_type": "text/plain",
+            "size": len(self.content), "sha256": hashlib.sha256(self.content).hexdigest(),
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def put(self, pk, offset, chunk, checksum=None):
+        return self.client.put(
+            f"/api/attachments/{pk}/content/", chunk, content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset), HTTP_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest(),
+        )
+
+    def test_resumable_upload_and_range_download(self):
+        pk = self.start()
+        self.assertEqual(self.put(pk, 0, b"0123").data["received"], 4)
+
+        corrupt = self.put(pk, 4, b"4567", checksum=hashlib.sha256(b"xxxx").hexdigest())
+        self.assertEqual((corrupt.status_code, corrupt.data["received"]), (422, 4))
+        skipped = self.put(pk, 8, b"89")
+        self.assertEqual((skipped.status_code, skipped.data["received"]), (409, 4))
+        self.assertEqual(self.client.get(f"/api/attachments/{pk}/download/").status_code, 409)
+
+        self.put(pk, 4, b"4567")
+        done = self.put(pk, 8, b"89")
+        self.assertEqual(done.data["status"], Attachment.Status.COMPLETE)
+        self.assertEqual(self.put(pk, 8, b"89").status_code, 409)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(self.root)), 1)
+
+        full = self.client.get(f"/api/attachments/{pk}/download/", HTTP_ACCEPT="text/plain")
+        self.assertEqual((full.status_code, full.getvalue()), (200, self.content))
+        part = self.client.get(f"/api/attachments/{pk}/download/", HTTP_RANGE="bytes=2-5")
+        self.assertEqual((part.status_code, part.getvalue()), (206, b"2345"))
+        self.assertEqual(part["Content-Range"], "bytes 2-5/10")
+        tail = self.client.get(f"/api/attachments/{pk}/download/", HTTP_RANGE="bytes=-3")
+        self.assertEqual(tail.getvalue(), b"789")
+        outside = self.client.get(f"/api/attachments/{pk}/download/", HTTP_RANGE="bytes=10-")
+        self.assertEqual((outside.status_code, outside["Content-Range"]), (416, "bytes */10"))
+
+    def test_chunk_limits_and_visibility(self):
+        pk = self.start()
+        self.assertEqual(self.put(pk, 0, b"01234").status_code, 400)
+        self.assertEqual(self.client.put(f"/api/attachments/{pk}/content/", b"0123",
+                                         content_type="application/octet-stream").status_code, 400)
+        self.assertEqual(self.client.put(f"/api/attachments/{pk}/content/", b"0123",
+                                         content_type="application/octet-stream", CONTENT_LENGTH="four",
+                                         HTTP_UPLOAD_OFFSET="0", HTTP_CHUNK_SHA256="x").status_code, 400)
+
+        self.client.force_authenticate(make_user("files.other@clinic.test", "DOCTOR"))
+        self.assertEqual(self.client.get(f"/api/attachments/{pk}/").status_code, 404)
+        other = self.client.post("/api/attachments/", {
+            "patient": self.patient.id, "filename": "x.txt", "size": 1,
+        }, format="json")
+        self.assertEqual(other.status_code, 400)
+
+    def test_uploads_are_refused_without_a_configured_storage(self):
+        with override_settings(ATTACHMENT_STORAGE_BACKEND=""):
+            response = self.client.post("/api/attachments/", {
+                "patient": self.patient.id, "filename": "scan.txt", "size": 1,
+            }, format="json")
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_merge_keeps_the_duplicates_files(self):
+        pk = self.start()
+        self.put(pk, 0, b"0123")
+        duplicate = self.patient
+        self.patient = Patient.objects.create(
+            first_name="F", last_name="Iles", doctor=self.doctor, tenant_id=DEFAULT_CLINIC_ID
+        )
+        self.client.force_authenticate(make_user("files.admin@clinic.test", "ADMIN"))
+
+        response = self.client.post(
+            f"/api/patients/{self.patient.id}/merge/", {"duplicate_id": duplicate.id}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Attachment.objects.get(pk=pk).patient_id, self.patient.id)
+        self.assertEqual(self.put(pk, 4, b"4567").data["received"], 8)
+
+
+@skipUnless(analytics.available(), "NumPy is not installed")
+class AnalyticsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = make_user("stats.admin@clinic.test", "ADMIN")
+        self.doctor = make_user("stats.dr@clinic.test", "DOCTOR")
+        self.client.force_authenticate(self.admin)
+        monday = timezone.make_aware(datetime(2024, 3, 4, 9, 0))
+        for days, status in [(0, "completed"), (0, "cancelled"), (7, "scheduled"), (8, "completed")]:
+            Appointment.objects.create(
+                doctor=self.doctor, date_time=monday + timedelta(days=days), status=status, tenant_id=DEFAULT_CLINIC_ID
+            )
+
+    def get(self):
+        return self.client.get("/api/analytics/", {"from": "2024-03", "to": "2024-04"})
+
+    def test_rates_heatmap_and_utilization(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        totals = response.data["totals"]
+        self.assertEqual((totals["appointments"], totals["completed"], totals["no_show"]), (4, 2, 1))
+        self.assertEqual((totals["cancellation_rate"], totals["no_show_rate"]), (0.25, 0.3333))
+
+        self.assertEqual(response.data["heatmap"]["booked"][0][9], 2)
+        self.assertEqual(response.data["heatmap"]["cancelled"][0][9], 1)
+        self.assertEqual(response.data["heatmap"]["no_show_rate"][1][9], 0.0)
+
+        doctor, = response.data["doctors"]
+        self.assertEqual((doctor["slots"], doctor["booked"]), (61 * 24, 3))
+        self.assertEqual(len(response.data["trend"]["dates"]), 61)
+        self.assertEqual(response.data["trend"]["rolling_no_show_rate"][11], 0.3333)
+
+    def test_months_are_cached_until_an_appointment_changes(self):
+        self.get()
+        with CaptureQueriesContext(connection) as queries:
+            self.get()
+        self.assertFalse([q for q in queries if "main_app_appointment" in q["sql"]])
+
+        Appointment.objects.create(
+            doctor=self.doctor, date_time=timezone.make_aware(datetime(2024, 4, 1, 9, 0)), tenant_id=DEFAULT_CLINIC_ID
+        )
+        self.assertEqual(self.get().data["totals"]["appointments"], 5)
+        self.client.force_authenticate(self.doctor)
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_moving_an_appointment_refreshes_both_months(self):
+        march = {"from": "2024-03", "to": "2024-03"}
+        self.get()
+        moved = Appointment.objects.get(status="scheduled")
+        moved.date_time = timezone.make_aware(datetime(2024, 4, 2, 9, 0))
+        moved.save()
+        self.assertEqual(self.client.get("/api/analytics/", march).data["totals"]["appointments"], 3)
+        self.assertEqual(self.get().data["totals"]["appointments"], 4)
+
+
+class BatchTests(APITestCase):
+    def setUp(self):
+        audit.flush()
+        self.addCleanup(audit.flush)
+        self.doctor = make_user("batch.dr@clinic.test", "DOCTOR")
+        self.patient = Patient.objects.create(
+            first_name="B", last_name="Atch", doctor=self.doctor, tenant_id=DEFAULT_CLINIC_ID
+        )
+        self.client.force_authenticate(self.doctor)
+
+    def batch(self, requests, **extra):
+        return self.client.post("/api/batch/", {"requests": requests, **extra}, format="json")
+
+    def test_sub_requests_run_against_the_api_views(self):
+        response = self.batch([
+            "/api/me/", "/api/patients/?page=1", "/api/reports/999/", "/api/nothing/", "/admin/", "/api/batch/",
+        ])
+        self.assertEqual(response.status_code, 200)
+        statuses = [sub["status"] for sub in response.data["responses"]]
+        self.assertEqual(statuses, [200, 200, 404, 404, 400, 400])
+        me, patients = response.data["responses"][:2]
+        self.assertEqual(me["body"]["email"], self.doctor.email)
+        self.assertEqual([row["id"] for row in patients["body"]], [self.patient.id])
+
+        parallel = self.batch(["/api/me/", "/api/me/"], parallel=True)
+        self.assertEqual([sub["status"] for sub in parallel.data["responses"]], [200, 200])
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_limits_and_authentication(self):
+        self.assertEqual(self.batch(["/api/me/"] * 3).status_code, 400)
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.batch(["/api/me/"]).status_code, 401)
+
+
+class ParallelBatchTests(APITransactionTestCase):
+    """Committed rows, so the pool threads' own connections see them."""
+
+    def setUp(self):
+        self.addCleanup(audit.flush)
+        clinic = Clinic.objects.create(name="Batch", slug="batch")
+        self.doctor = make_user("parallel.dr@clinic.test", "DOCTOR", tenant=clinic)
+        for i in range(3):
+            patient = Patient.objects.create(first_name=f"P{i}", last_name="Parallel", doctor=self.doctor, tenant=clinic)
+            Appointment.objects.create(patient=patient, doctor=self.doctor, date_time=timezone.now(), tenant=clinic)
+        self.client.force_authenticate(self.doctor)
+
+    def test_parallel_batches_match_sequential_ones(self):
+        paths = ["/api/patients/", "/api/appointments/", "/api/me/today/", "/api/me/patients/"]
+        sequential = self.client.post("/api/batch/", {"requests": paths}, format="json")
+        for _ in range(3):
+            parallel = self.client.post("/api/batch/", {"requests": paths, "parallel": True}, format="json")
+            self.assertEqual(parallel.data, sequential.data)
+        self.assertEqual([len(sub["body"]) for sub in sequential.data["responses"]], [3, 3, 3, 3])
+
+
+class RenderingTests(APITestCase):
+    def test_orjson_renderer_matches_stdlib_output(self):
+        data = {"when": timezone.make_aware(datetime(2030, 1, 7, 9, 30)), "status": Appointment.Status.SCHEDULED}
+        self.assertEqual(ORJSONRenderer().render(data), b'{"when":"2030-01-07T09:30:00Z","status":"scheduled"}')
+
+    @override_settings(API_COMPRESSION_MIN_SIZE=10)
+    def test_large_responses_are_gzipped_when_accepted(self):
+        doctor = make_user("gzip.dr@clinic.test", "DOCTOR")
+        for i in range(5):
+            Patient.objects.create(
+                first_name=f"P{i}", last_name="Gzip", doctor=doctor, tenant_id=DEFAULT_CLINIC_ID
+            )
+        self.client.force_authenticate(doctor)
+
+        plain = self.client.get("/api/patients/")
+        compressed = self.client.get("/api/patients/", HTTP_ACCEPT_ENCODING="gzip;q=1, br;q=0")
+
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+    @override_settings(API_COMPRESSION_MIN_SIZE=10)
+    def test_html_pages_are_never_compressed(self):
+        self.client.force_login(make_user("html.admin@clinic.test", "ADMIN", is_staff=True, is_superuser=True))
+        response = self.client.get("/admin/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response)
+
+
+class WarmUpTests(TestCase):
+    def test_every_step_runs_cleanly(self):
+        with self.assertNoLogs("main_app.warmup", level="ERROR"):
+            timings = warm_up()
+        self.assertEqual(list(timings), [name for name, _ in STEPS])
+
+
+@override_settings(REPORT_SNAPSHOT_INTERVAL=3)
+class ReportHistoryTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_user("history.dr@clinic.test", "DOCTOR")
+        patient = Patient.objects.create(first_name="H", last_name="P", tenant_id=DEFAULT_CLINIC_ID)
+        appointment = Appointment.objects.create(
+            tenant_id=DEFAULT_CLINIC_ID,
+            patient=patient, doctor=self.doctor, date_time=timezone.now()
+        )
+        self.client.force_authenticate(self.doctor)
+        response = self.client.post(
+            "/api/reports/", {"appointment_id": appointment.id, "diagnosis": "Flu"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.report = Report.objects.get(pk=response.data["id"])
+        self.url = f"/api/reports/{self.report.id}/"
+
+    def autosave(self, base_version, ops):
+        return self.client.patch(self.url + "draft/", {"base_version": base_version, "ops": ops}, format="json")
+
+    def test_every_version_is_reconstructable(self):
+        texts = ["Flu"]
+        self.assertEqual(self.autosave(1, [[3, 3, " with fever"]]).data["version"], 2)
+        texts.append("Flu with fever")
+        self.client.patch(self.url, {"diagnosis": "Seasonal flu with high fever"}, format="json")
+        texts.append("Seasonal flu with high fever")
+        self.assertEqual(self.autosave(3, [[0, 9, ""], [28, 28, "."]]).data["version"], 4)
+        texts.append("flu with high fever.")
+
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.diagnosis, texts[-1])
+        for number, text in enumerate(texts, start=1):
+            self.assertEqual(text_at(self.report, number), text)
+        kinds = list(self.report.versions.order_by("number").values_list("kind", flat=True))
+        self.assertEqual(kinds, ["snapshot", "delta", "delta", "snapshot"])
+
+    def test_stale_autosave_conflicts_and_final_reports_are_locked(self):
+        self.assertEqual(self.autosave(0, [[0, 0, "x"]]).status_code, 409)
+        self.client.post(self.url + "finalize/")
+        self.assertEqual(self.autosave(1, [[0, 0, "x"]]).status_code, 400)
+        response = self.client.patch(self.url, {"diagnosis": "Changed"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_the_author_can_edit_the_full_text(self):
+        self.client.force_authenticate(make_user("history.nurse@clinic.test", "NURSE"))
+        response = self.client.patch(self.url, {"diagnosis": "Rewritten by nurse"}, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.report.refresh_from_db()
+        self.assertEqual((self.report.diagnosis, self.report.version), ("Flu", 1))
+
+    def test_full_text_edit_of_a_stale_copy_appends_the_next_version(self):
+        stale = Report.objects.get(pk=self.report.pk)
+        self.autosave(1, [[3, 3, " with fever"]])
+        report = replace_text(stale, "Influenza", author=self.doctor)
+        self.assertEqual(report.version, 3)
+        self.assertEqual(text_at(report, 2), "Flu with fever")
+        self.assertEqual(text_at(report, 3), "Influenza")
+
+        response = self.client.patch(self.url, {"diagnosis": "Influenza"}, format="json")
+        self.assertEqual((response.status_code, response.data["version"]), (200, 3))
+
+
+class AuditTests(APITestCase):
+    def setUp(self):
+        audit.flush()
+        self.addCleanup(audit.flush)
+        self.admin = make_user("audit.admin@clinic.test", "ADMIN")
+        self.patients = [
+            Patient.objects.create(first_name=f"A{i}", last_name="Audit", tenant_id=DEFAULT_CLINIC_ID) for i in range(4)
+        ]
+        self.client.force_authenticate(self.admin)
+
+    def test_list_read_is_one_event_with_id_ranges(self):
+        self.client.get("/api/patients/")
+        self.client.get(f"/api/patients/{self.patients[1].id}/")
+        self.assertEqual(audit.flush(), 2)
+
+        listed, viewed = AuditEvent.objects.order_by("id")
+        first, last = self.patients[0].id, self.patients[-1].id
+        self.assertEqual((listed.action, listed.object_ranges), ("list", [[first, last]]))
+        self.assertEqual((listed.patient_min, listed.patient_max), (first, last))
+        self.assertEqual((viewed.action, viewed.patient_id), ("retrieve", self.patients[1].id))
+
+        for patient in self.patients:
+            expected = 2 if patient == self.patients[1] else 1
+            self.assertEqual(audit.events_for_patient(patient.id).count(), expected)
+        self.assertEqual(audit.events_for_user(self.admin.id).count(), 2)
+
+    def test_events_are_append_only(self):
+        self.client.get("/api/patients/")
+        audit.flush()
+        event = AuditEvent.objects.get()
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_sparse_fields_and_personal_views_still_record_the_patient(self):
+        doctor = make_user("audit.doctor@clinic.test", "DOCTOR")
+        patient = self.patients[2]
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, date_time=timezone.now(), tenant_id=DEFAULT_CLINIC_ID
+        )
+        self.client.get("/api/appointments/?fields=id,date_time")
+        self.client.force_authenticate(doctor)
+        self.client.get("/api/me/today/")
+        self.assertEqual(audit.flush(), 2)
+
+        for event in AuditEvent.objects.order_by("id"):
+            self.assertEqual(event.object_ranges, [[appointment.id, appointment.id]])
+            self.assertEqual(event.patient_id, patient.id)
@@ -6,10 +6,19 @@ from .views import (
     PatientViewSet,
     AppointmentViewSet,
     ReportViewSet,
+    AttachmentViewSet,
+    WaitlistEntryViewSet,
+    WorkingHoursViewSet,
+    ScheduleExceptionViewSet,
     AvailableDoctorsView,
     MyTokenObtainPairView,
     MeView,
+    MyPatientsView,
+    MyDayView,
     AvailableDoctorSlotsView,
+    FindSlotsView,
+    AnalyticsView,
+    BatchView,
 )
 
 router = DefaultRouter()
@@ -17,10 +26,16 @@ router.register(r'users', UserViewSet, basename='user')
 router.register(r'patients', PatientViewSet, basename='patient')
 router.register(r'appointments', AppointmentViewSet, basename='appointment')
 router.register(r'reports', ReportViewSet, basename='report')
+router.register(r'attachments', AttachmentViewSet, basename='attachment')
+router.register(r'waitlist', WaitlistEntryViewSet, basename='waitlist')
+router.register(r'working-hours', WorkingHoursViewSet, basename='working-hours')
+router.register(r'schedule-exceptions', ScheduleExceptionViewSet, basename='schedule-exception')
 
 urlpatterns = [
     path('api/login/', MyTokenObtainPairView.as_view(), name='login'),
     path('api/me/', MeView.as_view()),
+    path('api/me/patients/', MyPatientsView.as_view(), name='my-patients'),
+    path('api/me/today/', MyDayView.as_view(), name='my-day'),
     path('api/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/available-doctors/', AvailableDoctorsView.as_view()),
     path(
@@ -28,6 +43,9 @@ urlpatterns = [
         AvailableDoctorSlotsView.as_view(),
         name='available-slots',
     ),
+    path('api/appointments/find-slots/', FindSlotsView.as_view(), name='find-slots'),
+    path('api/analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('api/batch/', BatchView.as_view(), name='batch'),
     
     path('api/', include(router.urls)),
 ]
@@ -1,23 +1,57 @@
-from rest_framework import viewsets, permissions,status
+from rest_framework import viewsets, mixins, permissions,status
+from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
-from .models import User, Patient, Appointment, Report
+from django.conf import settings
+from django.db import transaction
+from .models import User, Patient, Appointment, Report, WaitlistEntry, WorkingHours, ScheduleException, Attachment
 from .serializers import (
     UserSerializer,
     UserCreateSerializer,
     PatientSerializer,
+    PatientListSerializer,
     AppointmentSerializer,
     ReportSerializer,
+    ReportListSerializer,
     AvailableDoctorSerializer,
-    MyTokenObtainPairSerializer
+    MyTokenObtainPairSerializer,
+    WaitlistEntrySerializer,
+    WorkingHoursSerializer,
+    ScheduleExceptionSerializer,
+    ReportAutosaveSerializer,
+    ReportVersionSerializer,
+    AttachmentSerializer,
+    BatchSerializer,
 )
+from .waitlist import backfill_slot, accept_offer
+from .report_history import autosave, text_at, ReportLocked, VersionConflict
+from .renderers import ORJSONRenderer, AnyMediaRenderer
+from .fastlist import FastListMixin, serialize_list
+from .audit import AuditMixin
+from .idempotency import IdempotentCreateMixin
+from .tenancy import TenantCreateMixin, scope
+from .attachments import (
+    OFFSET_HEADER,
+    CHECKSUM_HEADER,
+    OffsetMismatch,
+    ChecksumMismatch,
+    get_storage,
+    storage_configured,
+    new_storage_key,
+    receive_chunk,
+    download_response,
+)
+from .duplicates import find_duplicates, describe, import_patients, merge_patients
+from . import analytics, audit, batch
+from .scheduling import find_slots, free_doctors_at, free_doctor_slots
 from rest_framework_simplejwt.views import TokenObtainPairView
-from datetime import datetime, time, timedelta
+from datetime import datetime, timedelta
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(TenantCreateMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     
     def get_serializer_class(self):
@@ -51,49 +85,423 @@ class AvailableDoctorsView(APIView):
         if not date_time:
             return Response({"error": "Invalid date_time format"}, status=400)
 
-       
-        if not (8 <= date_time.hour < 20):
-            return Response({"error": "Requested time is outside of working hours (8-20)"}, status=400)
+        if timezone.is_naive(date_time):
+            date_time = timezone.make_aware(date_time)
 
-     
-        all_doctors = User.objects.filter(role="DOCTOR")
+        all_doctors = scope(User.objects.filter(role="DOCTOR"), request.user)
 
-       
-        busy_doctors = Appointment.objects.filter(
-            doctor__role="DOCTOR",
-            date_time=date_time,
-            status="scheduled"
-        ).values_list('doctor_id', flat=True)
+        working, free = free_doctors_at(
+            list(all_doctors.values_list("id", flat=True)), date_time
+        )
+        if not working:
+            return Response({"error": "Requested time is outside of working hours"}, status=400)
 
-        
-        free_doctors = all_doctors.exclude(id__in=busy_doctors)
+        free_doctors = all_doctors.filter(id__in=free)
 
         serializer = AvailableDoctorSerializer(free_doctors, many=True)
         return Response(serializer.data)
 
 
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(AuditMixin, FastListMixin, TenantCreateMixin, viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
+    list_serializer_class = PatientListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    max_import = 1000
 
-    
+    def get_queryset(self):
+        return Patient.objects.for_user(self.request.user)
+
+    def allow_duplicates(self):
+        return self.request.query_params.get("allow_duplicates", "").lower() in ("1", "true", "yes")
+
+    def check_admin(self, message):
+        if self.request.user.role != "ADMIN":
+            raise PermissionDenied(message)
+
+    def create(self, request, *args, **kwargs):
+        """Refuses likely duplicates with 409 unless ``?allow_duplicates=true``."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not self.allow_duplicates():
+            matches = find_duplicates(Patient(**serializer.validated_data, tenant_id=request.user.tenant_id))
+            if matches:
+                return Response(
+                    {"error": "This patient may already exist.", "duplicates": describe(matches)},
+                    status=status.HTTP_409_CONFLICT,
+                )
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def bulk_import(self, request):
+        """Create a list of patients, skipping likely duplicates of existing patients or earlier rows."""
+        self.check_admin("Only admins can import patients.")
+        if not isinstance(request.data, list) or len(request.data) > self.max_import:
+            return Response(
+                {"error": f"Send a list of at most {self.max_import} patients."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
+        patients, rows, errors = [], [], []
+        for row, data in enumerate(request.data):
+            serializer = PatientSerializer(data=data, context=self.get_serializer_context())
+            if serializer.is_valid():
+                patients.append(Patient(**serializer.validated_data, tenant_id=request.user.tenant_id))
+                rows.append(row)
+            else:
+                errors.append({"row": row, "errors": serializer.errors})
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+        created, duplicates = import_patients(patients, self.allow_duplicates())
+        return Response({
+            "created": [patient.id for patient in created],
+            "duplicates": [
+                {"row": rows[index], "candidates": describe(matches)} for index, matches in duplicates
+            ],
+            "errors": errors,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"])
+    def merge(self, request, pk=None):
+        """Merge the patient ``duplicate_id`` into this one."""
+        self.check_admin("Only admins can merge patients.")
+        keep = self.get_object()
+        duplicate_id = str(request.data.get("duplicate_id", ""))
+        patients = self.filter_queryset(self.get_queryset())
+        duplicate = patients.filter(pk=duplicate_id).first() if duplicate_id.isdigit() else None
+        if duplicate is None:
+            return Response(
+                {"error": "duplicate_id must be an existing patient."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            keep = merge_patients(keep, duplicate)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        audit.record(request.user, "merge", "patient", [int(duplicate_id)], [int(duplicate_id)])
+        return Response(PatientSerializer(keep).data)
+
+
+class AppointmentViewSet(AuditMixin, FastListMixin, IdempotentCreateMixin, TenantCreateMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class ReportViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        return Appointment.objects.for_user(self.request.user).select_related("report")
+
+    def perform_update(self, serializer):
+        cancelling = serializer.validated_data.get("status") == Appointment.Status.CANCELLED
+        with transaction.atomic():
+            # As in ``cancel``: only the request that moves the row out of SCHEDULED backfills it.
+            cancelled = cancelling and Appointment.objects.filter(
+                pk=serializer.instance.pk, status=Appointment.Status.SCHEDULED
+            ).update(status=Appointment.Status.CANCELLED)
+            appointment = serializer.save()
+        if cancelled:
+            backfill_slot(appointment)
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        appointment = self.get_object()
+        cancelled = Appointment.objects.filter(
+            pk=appointment.pk, status=Appointment.Status.SCHEDULED
+        ).update(status=Appointment.Status.CANCELLED)
+        if not cancelled:
+            return Response(
+                {"error": "Only scheduled appointments can be cancelled."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        appointment.status = Appointment.Status.CANCELLED
+        entry = backfill_slot(appointment)
+        return Response({
+            "status": appointment.status,
+            "backfilled_by": entry.id if entry else None,
+        })
+
+
+class WaitlistEntryViewSet(viewsets.ModelViewSet):
+    queryset = WaitlistEntry.objects.all()
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    tenant_field = "patient__tenant"
+
+    @action(detail=True, methods=["post"])
+    def accept(self, request, pk=None):
+        appointment = accept_offer(self.get_object())
+        if appointment is None:
+            return Response(
+                {"error": "The offered slot is no longer available."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(AppointmentSerializer(appointment).data, status=status.HTTP_201_CREATED)
+
+class ReportViewSet(AuditMixin, FastListMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = Report.objects.all()
     serializer_class = ReportSerializer
+    list_serializer_class = ReportListSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
         
         serializer.save()
 
+    def check_author(self, report):
+        if report.doctor_id != self.request.user.id:
+            raise PermissionDenied("Only the report's doctor can change it.")
+
+    def perform_update(self, serializer):
+        self.check_author(serializer.instance)
+        serializer.save()
+
+    @action(detail=True, methods=["patch"])
+    def draft(self, request, pk=None):
+        """Autosave: apply splices made against ``base_version``."""
+        report = self.get_object()
+        self.check_author(report)
+        serializer = ReportAutosaveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            version, text = autosave(
+                report,
+                serializer.validated_data["base_version"],
+                serializer.validated_data["ops"],
+                author=request.user,
+            )
+        except ReportLocked:
+            return Response(
+                {"error": "Finalized reports cannot be edited."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except VersionConflict as exc:
+            return Response(
+                {"error": "Report was changed in the meantime.", "version": exc.current_version},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"version": version, "length": len(text)})
+
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, pk=None):
+        report = self.get_object()
+        self.check_author(report)
+        Report.objects.filter(pk=report.pk, status=Report.Status.DRAFT).update(
+            status=Report.Status.FINAL, finalized_at=timezone.now()
+        )
+        report.refresh_from_db()
+        return Response(self.get_serializer(report).data)
+
+    @action(detail=True, methods=["get"])
+    def versions(self, request, pk=None):
+        report = self.get_object()
+        versions = report.versions.order_by("number")
+        return Response(ReportVersionSerializer(versions, many=True).data)
+
+    @action(detail=True, methods=["get"], url_path=r"versions/(?P<number>\d+)")
+    def version(self, request, pk=None, number=None):
+        report = self.get_object()
+        text = text_at(report, int(number))
+        if text is None:
+            return Response({"error": "Version does not exist."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"number": int(number), "diagnosis": text})
+
+class AttachmentViewSet(
+    AuditMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    POST starts an upload, ``PUT <id>/content/`` sends one chunk and
+    ``GET <id>/download/`` serves the finished file, with ``Range`` support.
+    """
+    queryset = Attachment.objects.all()
+    serializer_class = AttachmentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    tenant_field = "patient__tenant"
+
+    def get_queryset(self):
+        queryset = Attachment.objects.for_user(self.request.user)
+        for field in ("patient", "report"):
+            value = self.request.query_params.get(field)
+            if value and value.isdigit():
+                queryset = queryset.filter(**{field: value})
+        return queryset.order_by("-created_at")
+
+    def create(self, request, *args, **kwargs):
+        if not storage_configured():
+            return Response(
+                {"error": "Attachment storage is not configured."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        attachment = serializer.save(uploaded_by=self.request.user, storage_key=new_storage_key())
+        get_storage().write(attachment.storage_key, 0, [])
+        if attachment.size == 0:
+            attachment.status = Attachment.Status.COMPLETE
+            attachment.completed_at = timezone.now()
+            attachment.save(update_fields=["status", "completed_at"])
+
+    @action(detail=True, methods=["put"])
+    def content(self, request, pk=None):
+        attachment = self.get_object()
+        offset = request.headers.get(OFFSET_HEADER, "")
+        checksum = request.headers.get(CHECKSUM_HEADER, "")
+        length = request.headers.get("Content-Length", "")
+        length = int(length) if length.isdigit() else 0
+        if not offset.isdigit() or not checksum:
+            return Response(
+                {"error": f"{OFFSET_HEADER} and {CHECKSUM_HEADER} headers are required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 0 < length <= settings.ATTACHMENT_CHUNK_SIZE:
+            return Response(
+                {"error": f"Chunks must be 1 to {settings.ATTACHMENT_CHUNK_SIZE} bytes."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if int(offset) + length > attachment.size:
+            return Response({"error": "Chunk goes past the end of the file."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            attachment = receive_chunk(attachment, int(offset), length, checksum, request.stream)
+        except OffsetMismatch as exc:
+            return Response(
+                {"error": "Upload is not at this offset.", "received": exc.received},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except ChecksumMismatch as exc:
+            return Response(
+                {"error": "Checksum does not match.", "received": exc.received},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(self.get_serializer(attachment).data)
+
+    @action(detail=True, methods=["get"], renderer_classes=[ORJSONRenderer, AnyMediaRenderer])
+    def download(self, request, pk=None):
+        attachment = self.get_object()
+        if attachment.status != Attachment.Status.COMPLETE:
+            return Response(
+                {"error": "Upload is not complete."},
+                status=status.HTTP_409_CONFLICT,
+                content_type="application/json",
+            )
+        return download_response(request, attachment)
+
+
+class DoctorScheduleViewSet(viewsets.ModelViewSet):
+    """Admins manage every schedule of their clinic, doctors only their own."""
+    permission_classes = [permissions.IsAuthenticated]
+    tenant_field = "doctor__tenant"
+
+    def get_queryset(self):
+        queryset = self.queryset.all()
+        doctor_id = self.request.query_params.get("doctor_id")
+        if doctor_id:
+            queryset = queryset.filter(doctor_id=doctor_id)
+        return queryset
+
+    def check_can_edit(self, doctor):
+        user = self.request.user
+        if user.role != "ADMIN" and doctor != user:
+            raise PermissionDenied("Only admins or the doctor can change this schedule.")
+        if doctor.tenant_id != user.tenant_id and not user.is_superuser:
+            raise PermissionDenied("The doctor belongs to a different clinic.")
+
+    def perform_create(self, serializer):
+        self.check_can_edit(serializer.validated_data["doctor"])
+        serializer.save()
+
+    def perform_update(self, serializer):
+        self.check_can_edit(serializer.instance.doctor)
+        self.check_can_edit(serializer.validated_data.get("doctor", serializer.instance.doctor))
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        self.check_can_edit(instance.doctor)
+        instance.delete()
+
+
+class WorkingHoursViewSet(DoctorScheduleViewSet):
+    queryset = WorkingHours.objects.all()
+    serializer_class = WorkingHoursSerializer
+
+
+class ScheduleExceptionViewSet(DoctorScheduleViewSet):
+    queryset = ScheduleException.objects.all()
+    serializer_class = ScheduleExceptionSerializer
+
+
+class AnalyticsView(APIView):
+    """
+    Admin analytics for whole months. Query params:
+    - from=YYYY-MM, to=YYYY-MM (default: the last 12 months)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def parse_month(self, value):
+        try:
+            parsed = datetime.strptime(value, "%Y-%m")
+        except ValueError:
+            return None
+        return parsed.year, parsed.month
+
+    def get(self, request):
+        if request.user.role != "ADMIN":
+            raise PermissionDenied("Only admin can see analytics.")
+        if not analytics.available():
+            return Response(
+                {"error": "Analytics need NumPy installed."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        today = timezone.localdate()
+        last = (today.year, today.month)
+        first = analytics.month_range((today.year - 1, today.month), last)[1]
+        if "from" in request.query_params:
+            first = self.parse_month(request.query_params["from"])
+        if "to" in request.query_params:
+            last = self.parse_month(request.query_params["to"])
+        if first is None or last is None:
+            return Response({"error": "Months must be given as YYYY-MM."}, status=400)
+
+        months = analytics.month_index(last) - analytics.month_index(first) + 1
+        if not 0 < months <= settings.ANALYTICS_MAX_MONTHS:
+            return Response(
+                {"error": f"Choose between 1 and {settings.ANALYTICS_MAX_MONTHS} months."},
+                status=400,
+            )
+        return Response(analytics.summary(request.user.tenant_id, first, last))
+
+
+class BatchView(APIView):
+    """
+    GET several API paths in one request:
+    {"requests": ["/api/me/", "/api/patients/?page=2"], "parallel": false}
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        responses = batch.run_all(
+            request,
+            serializer.validated_data["requests"],
+            serializer.validated_data["parallel"],
+        )
+        return Response({"responses": responses})
+
+
 class MeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -101,6 +509,39 @@ class MeView(APIView):
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
 
+class MyPatientsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        patients = Patient.objects.for_user(request.user).order_by("last_name", "first_name")
+        rows = serialize_list(PatientListSerializer, patients)
+        ids = [row["id"] for row in rows]
+        audit.record(request.user, "list", "patient", ids, ids)
+        return Response(rows)
+
+
+class MyDayView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        today = timezone.localdate()
+        start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+        appointments = (
+            Appointment.objects.for_user(request.user)
+            .filter(date_time__gte=start, date_time__lt=start + timedelta(days=1))
+            .order_by("date_time")
+        )
+        rows = serialize_list(AppointmentSerializer, appointments)
+        audit.record(
+            request.user,
+            "list",
+            "appointment",
+            [row["id"] for row in rows],
+            [row["patient"] for row in rows if row["patient"] is not None],
+        )
+        return Response(rows)
+
+
 class AvailableDoctorSlotsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -115,7 +556,7 @@ class AvailableDoctorSlotsView(APIView):
             )
 
         try:
-            doctor = User.objects.get(id=doctor_id, role="DOCTOR")
+            doctor = scope(User.objects.filter(role="DOCTOR"), request.user).get(id=doctor_id)
         except User.DoesNotExist:
             return Response(
                 {"error": "Doktor ne postoji"},
@@ -130,22 +571,60 @@ class AvailableDoctorSlotsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        existing = Appointment.objects.filter(
-            doctor=doctor,
-            date_time__date=target_date,
-            status=Appointment.Status.SCHEDULED,
-        ).values_list("date_time", flat=True)
+        slots = [
+            slot.strftime("%H:%M") for slot in free_doctor_slots(doctor.id, target_date)
+        ]
+
+        return Response(slots, status=status.HTTP_200_OK)
+
+
+class FindSlotsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    max_days = 31
+    max_count = 50
 
-        taken_times = {dt.time() for dt in existing}
+    def get(self, request):
+        """
+        Query params:
+        - specialization (optional)
+        - date_from=YYYY-MM-DD (default: today)
+        - date_to=YYYY-MM-DD (default: date_from + 13 days)
+        - count (default: 5)
+        - with_room=true to also require a free room
+        """
+        params = request.query_params
+        try:
+            date_from = (
+                datetime.strptime(params["date_from"], "%Y-%m-%d").date()
+                if params.get("date_from") else timezone.localdate()
+            )
+            date_to = (
+                datetime.strptime(params["date_to"], "%Y-%m-%d").date()
+                if params.get("date_to") else date_from + timedelta(days=13)
+            )
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        start = time(8, 0)
-        end = time(20, 0)
-        current_dt = datetime.combine(target_date, start)
+        if date_to < date_from or (date_to - date_from).days >= self.max_days:
+            return Response(
+                {"error": f"date_to must be within {self.max_days} days after date_from."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        slots = []
-        while current_dt.time() < end:
-            if current_dt.time() not in taken_times:
-                slots.append(current_dt.strftime("%H:%M"))
-            current_dt += timedelta(minutes=30)
+        try:
+            count = min(int(params.get("count", 5)), self.max_count)
+        except ValueError:
+            return Response({"error": "count must be a number"}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(slots, status=status.HTTP_200_OK)
\ No newline at end of file
+        slots = find_slots(
+            request.user.tenant_id,
+            date_from,
+            date_to,
+            count=count,
+            specialization=params.get("specialization"),
+            with_room=params.get("with_room", "").lower() in ("1", "true", "yes"),
+        )
+        return Response(slots, status=status.HTTP_200_OK)
@@ -0,0 +1,121 @@
+"""
+Waitlist backfill.
+
+When a scheduled appointment is cancelled its slot goes to the longest-waiting
+patient who asked either for that doctor or for any doctor with the same
+specialization. Both queues are read from their head through partial indexes,
+and the chosen entry is locked with SKIP LOCKED so concurrent cancellations
+never hand one patient two slots.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Appointment, WaitlistEntry
+from .reminders import notify_patient
+from .scheduling import booking_end, overlaps
+
+
+def queue_heads(doctor):
+    waiting = (
+        WaitlistEntry.objects.filter(status=WaitlistEntry.Status.WAITING)
+        .select_for_update(skip_locked=True, of=("self",))
+        .order_by("created_at", "id")
+    )
+    heads = [waiting.filter(doctor=doctor).first()]
+    if doctor.specialization:
+        # Only patients of the doctor's own clinic can take the slot.
+        heads.append(
+            waiting.filter(
+                doctor__isnull=True, specialization=doctor.specialization, patient__tenant=doctor.tenant_id
+            ).first()
+        )
+    return [entry for entry in heads if entry is not None]
+
+
+def slot_is_free(doctor_id, date_time):
+    return not Appointment.objects.filter(
+        doctor_id=doctor_id,
+        date_time=date_time,
+        status=Appointment.Status.SCHEDULED,
+    ).exists()
+
+
+def book_entry(entry, doctor, nurse, date_time):
+    """Book ``entry`` into the slot; a nurse booked elsewhere meanwhile is left off for the clinic to replace."""
+    end = booking_end(doctor.id, date_time)
+    if nurse is not None and overlaps(Appointment.objects.filter(nurse=nurse), date_time, end):
+        nurse = None
+    entry.appointment = Appointment.objects.create(
+        tenant_id=entry.patient.tenant_id,
+        patient=entry.patient,
+        doctor=doctor,
+        nurse=nurse,
+        date_time=date_time,
+    )
+    entry.status = WaitlistEntry.Status.BOOKED
+    entry.save(update_fields=["appointment", "status"])
+    return entry.appointment
+
+
+def backfill_slot(appointment):
+    """Offer or book the slot freed by ``appointment``; returns the waitlist entry used, if any."""
+    doctor = appointment.doctor
+    if doctor is None or appointment.date_time <= timezone.now():
+        return None
+
+    with transaction.atomic():
+        if not slot_is_free(doctor.id, appointment.date_time):
+            return None
+
+        heads = queue_heads(doctor)
+        if not heads:
+            return None
+        entry = min(heads, key=lambda e: (e.created_at, e.id))
+
+        if entry.auto_book:
+            book_entry(entry, doctor, appointment.nurse, appointment.date_time)
+        else:
+            entry.status = WaitlistEntry.Status.OFFERED
+            entry.offered_doctor = doctor
+            entry.offered_nurse = appointment.nurse
+            entry.offered_date_time = appointment.date_time
+            entry.save(update_fields=[
+                "status", "offered_doctor", "offered_nurse", "offered_date_time"
+            ])
+
+    when = timezone.localtime(appointment.date_time).strftime("%d.%m.%Y %H:%M")
+    doctor_name = f"Dr. {doctor.first_name} {doctor.last_name}"
+    if entry.status == WaitlistEntry.Status.BOOKED:
+        body = f"A slot opened up: you are booked with {doctor_name} on {when}."
+    else:
+        body = f"A slot with {doctor_name} on {when} is available. Contact the clinic to confirm."
+    transaction.on_commit(lambda: notify_patient(entry.patient, "Appointment slot available", body))
+    return entry
+
+
+def accept_offer(entry):
+    """
+    Book an offered slot. If it was taken in the meantime the entry goes back
+    to the queue and ``None`` is returned.
+    """
+    with transaction.atomic():
+        entry = WaitlistEntry.objects.select_for_update().get(pk=entry.pk)
+        if entry.status != WaitlistEntry.Status.OFFERED:
+            return None
+
+        if (
+            entry.offered_date_time > timezone.now()
+            and slot_is_free(entry.offered_doctor_id, entry.offered_date_time)
+        ):
+            return book_entry(
+                entry, entry.offered_doctor, entry.offered_nurse, entry.offered_date_time
+            )
+
+        entry.status = WaitlistEntry.Status.WAITING
+        entry.offered_doctor = None
+        entry.offered_nurse = None
+        entry.offered_date_time = None
+        entry.save(update_fields=[
+            "status", "offered_doctor", "offered_nurse", "offered_date_time"
+        ])
+        return None
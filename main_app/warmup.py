@@ -0,0 +1,89 @@
+"""
+Worker warm-up.
+
+Everything a cold worker would otherwise do lazily on its first requests:
+importing the API modules, populating the URL resolver, building serializer
+fields and fast-path plans, loading DRF/JWT settings, opening the database
+connection and filling the schedule cache. Called from gunicorn's
+``post_worker_init`` hook (see ``gunicorn.conf.py``) before the worker
+accepts traffic.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def import_api():
+    from main_app import serializers, views  # noqa: F401
+
+
+def populate_urls():
+    from django.urls import get_resolver, reverse
+
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver._populate()
+    reverse("login")
+
+
+def build_serializers():
+    from rest_framework.settings import api_settings
+
+    from main_app.fastlist import get_plan
+    from main_app.urls import router
+
+    api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    api_settings.DEFAULT_RENDERER_CLASSES
+    api_settings.DEFAULT_PARSER_CLASSES
+
+    for _, viewset, _ in router.registry:
+        viewset().get_authenticators()
+        for name in ("serializer_class", "list_serializer_class"):
+            serializer_class = getattr(viewset, name, None)
+            if serializer_class is not None:
+                serializer_class().fields
+                get_plan(serializer_class)
+
+
+def open_connections():
+    from django.db import connections
+
+    for connection in connections.all():
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+
+def prime_caches():
+    from main_app.models import User
+    from main_app.scheduling import get_schedules
+
+    get_schedules(User.objects.filter(role="DOCTOR", is_active=True).values_list("id", flat=True))
+
+
+STEPS = (
+    ("import_api", import_api),
+    ("populate_urls", populate_urls),
+    ("build_serializers", build_serializers),
+    ("open_connections", open_connections),
+    ("prime_caches", prime_caches),
+)
+
+
+def warm_up():
+    """Run every warm-up step and return ``{step: seconds}``. Failures are logged, not raised."""
+    timings = {}
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warm-up step %s failed", name)
+        timings[name] = time.perf_counter() - start
+    logger.info(
+        "Worker warmed up in %.0f ms (%s)",
+        sum(timings.values()) * 1000,
+        ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items()),
+    )
+    return timings